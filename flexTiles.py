@@ -36,12 +36,21 @@ with this program.  If not, see <http://www.gnu.org/licenses/>.
 ------------------------------------------------------------------------
 """
 
-from sys import argv
+from sys import argv, exit
 from os import getcwd, path, mkdir
 from glob import glob
 from copy import copy
 from random import randint
-from time import time
+from time import time, perf_counter
+from threading import Thread
+from queue import Queue
+
+if __name__ == '__main__' and len(argv) > 1 and argv[1].startswith('--'):
+# headless command line tools (see modFTCLI) don't need wxPython;
+#   run them before importing it
+    from modFTCLI import runCLI
+    runCLI(argv[1:])
+    exit()
 
 import wx, wx.adv
 #from wx.lib.wordwrap import wordwrap
@@ -52,6 +61,12 @@ from modFFC import GNU_notice, get_time_stamp, getWXFonts, stopAllTimers
 from modFFC import updateFrameSize, add2gbs, receiveDataFromQueue
 from modFFC import set_img_for_btn, load_img, setupStaticText
 import modFTAnalysis as ftA
+from modFTCache import AnalysisCache
+from modFTNull import NullDistCache
+from modFTSession import saveWorker, ClickJournal, recoverFromJournal
+from modFTSession import findInterruptedJournals, removeJournalFile
+from modFTSession import loadSessionCSV
+from modFTKandinsky import KDisplayList, KUndoStack, drawKShape
 
 DEBUG = False 
 __version__ = "0.1.1"
@@ -100,14 +115,32 @@ class FlexTilesFrame(wx.Frame):
         self.gbs = {} # for GridBagSizer
         self.panel = {} # panels
         self.timer = {} # timers
+        self.timer["save"] = None
+        self.th = {} # threads
+        self.th["save"] = None
+        self.q = {} # queues
+        self.q["save"] = Queue() # saving jobs to the saving thread
+        self.q["saveRslt"] = Queue() # results from the saving thread
+        self.savingFNs = [] # file names (without ext.) being saved
+        self.flagSaveNPZ = True # also save binary session file (.npz)
         self.csvFP = "" # CSV file path
         self.outputPath = path.join(CWD, "output") # output file path
         if not path.isdir(self.outputPath): mkdir(self.outputPath)
-        self.ani = None # to store animation info. to run
+        self.ani = None # to store zoomIn/Out animation info. to run
+        self.rotAni = {} # tiles in rotate animation; (row, column) -> 
+          # dict(sAng=start angle, tAng=target angle, ang=current angle,
+          #      t0=start time)
+        ### one timer for all animations; 
+        ###   started when there's something to animate
+        self.timer["ani"] = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER,
+                  lambda event: self.onTimer(event, "ani"),
+                  self.timer["ani"])
         self.kD = None # to store drawing info. (used when in Kandinsky mode)
         self.colors = {} # some preset colors
         self.colors["ftBGCol"] = "#111111" # background color of FlexTiles panel
         self.colors["highlightedTile"] = "#eeee33" # for highlighting a tile
+        self.colors["liveMetrics"] = "#cccccc" # text of live analysis values
         self.nRows = 8 # number of rows in FlexTiles
         self.nCols = 8 # number of columns in FlexTiles
         self.tileSz = 75 # size in pixels
@@ -119,16 +152,23 @@ class FlexTilesFrame(wx.Frame):
         ### load initial tile image
         initTileImg = "tile_init.png"
         self.initTileImg = load_img(initTileImg)
-        # store initial (large) image for Kandinsky mode
-        self.tileImgLarge = self.initTileImg.Copy() 
+        # display list of drawings in Kandinsky mode on initial image
+        self.kDL = KDisplayList(self.initTileImg.Copy())
+        self.kUndo = KUndoStack(self.kDL) # undo/redo of drawings
         # store image for FlexTiles mode
-        self.tileImg = self.initTileImg.Copy() 
-        ### if size doesn't match with desired size, rescale it.
-        imgSz = self.tileImg.GetSize()
-        if imgSz[0] != self.tileSz or imgSz[1] != self.tileSz:
-            self.tileImg = self.tileImg.Rescale(self.tileSz, 
-                                                self.tileSz, 
-                                                wx.IMAGE_QUALITY_HIGH)
+        self.tileImg = self.kDL.getImage(self.tileSz)
+        self.tileBmps = None # bitmaps of tile image in 4 orientations
+          # (0, 90, 180, 270); made in getTileBmps
+        self.tileBmpsSz = None # tile size, when tileBmps was made
+        self.ftBuf = None # backbuffer bitmap of entire FlexTiles; 
+          # made in getFTBuf
+        self.ftBufSz = None # tile size, when ftBuf was made
+        self.aniRotStep = 10 # degree between frames of rotate animation
+        self.aniDur = dict(rotate=0.1, zoomIn=0.4, zoomOut=0.4) # duration 
+          # of animations in seconds
+        self.aniInterval = 16 # interval of animation timer in milliseconds
+        self.rotFrames = None # frames of rotate animation;
+          # degree -> (bitmap, offset); made in getRotFrame
         lX = int(self.wSz[0]/2 - (self.tileSz*self.nCols)/2)
         tY = int(self.wSz[1]/2 - (self.tileSz*self.nRows)/2)
         # store rect of entire FlexTiles
@@ -149,6 +189,15 @@ class FlexTilesFrame(wx.Frame):
                 d[ri].append([angle, click])
         self.ftArr = np.asarray(d, dtype=np.uint16) # store it as array
         self.ftSeq = [] # to store sequence of tile clicks
+        # analysis values, updated with each tile click
+        self.liveA = ftA.LiveAnalysis(self.ftArr[:,:,0])
+        self.flagLiveMetrics = False # whether to show live analysis values
+        self.liveMetricsRect = None # area of live analysis values
+        self.aCache = AnalysisCache(100) # cache of analysis results;
+          # used in the saving thread
+        # null distributions of analysis results (cached in output/null);
+        #   used in the saving thread
+        self.nullCache = NullDistCache(path.join(self.outputPath, "null"))
         self.progInitTime = time() # starting time of the program
         self.currMP = None # current mouse pointer position
         self.flagKandinsky = False # whether it's in Kandinsky mode
@@ -159,8 +208,11 @@ class FlexTilesFrame(wx.Frame):
         self.selectedFCol = "#cccccc" # selected filling color
         self.selectedSCol = "#0000ff" # selected stroke color
         self.selectedSThick = 1 # selected stroke thickness
+        self.fillTol = 16 # color tolerance of fill tool
         self.flagFreePencilDrawing = False # free drawing is on
         self.freePencilDrawingPts = [] # points for free pencil drawing
+        self.journal = None # journal of clicks (ClickJournal); 
+          # started in startJournal
         ##### [end] setting up attributes -----
         
         updateFrameSize(self, wSz)
@@ -280,6 +332,18 @@ class FlexTilesFrame(wx.Frame):
         kModeMenu = mainMenu.Append(wx.Window.NewControlId(), 
                                     item="Kandinsky drawing mode\tCTRL+K")
         self.Bind(wx.EVT_MENU, self.onKandinskyMode, kModeMenu)
+        liveMenu = mainMenu.Append(wx.Window.NewControlId(), 
+                                   item="Live metrics\tCTRL+M")
+        self.Bind(wx.EVT_MENU, self.onLiveMetrics, liveMenu)
+        undoMenu = mainMenu.Append(wx.Window.NewControlId(), 
+                                   item="Undo drawing\tCTRL+Z")
+        self.Bind(wx.EVT_MENU, self.onUndo, undoMenu)
+        redoMenu = mainMenu.Append(wx.Window.NewControlId(), 
+                                   item="Redo drawing\tCTRL+Y")
+        self.Bind(wx.EVT_MENU, self.onRedo, redoMenu)
+        openMenu = mainMenu.Append(wx.Window.NewControlId(), 
+                                   item="Open\tCTRL+O")
+        self.Bind(wx.EVT_MENU, self.openCSVFile, openMenu)
         saveMenu = mainMenu.Append(wx.Window.NewControlId(), 
                                    item="Save\tCTRL+S")
         self.Bind(wx.EVT_MENU, self.onSave, saveMenu)
@@ -291,19 +355,105 @@ class FlexTilesFrame(wx.Frame):
 
         ### keyboard binding
         kMode_btnId = wx.NewIdRef(count=1)
+        live_btnId = wx.NewIdRef(count=1)
+        undo_btnId = wx.NewIdRef(count=1)
+        redo_btnId = wx.NewIdRef(count=1)
+        open_btnId = wx.NewIdRef(count=1)
         save_btnId = wx.NewIdRef(count=1)
         exit_btnId = wx.NewIdRef(count=1)
         self.Bind(wx.EVT_MENU, self.onKandinskyMode, id=kMode_btnId)
+        self.Bind(wx.EVT_MENU, self.onLiveMetrics, id=live_btnId)
+        self.Bind(wx.EVT_MENU, self.onUndo, id=undo_btnId)
+        self.Bind(wx.EVT_MENU, self.onRedo, id=redo_btnId)
+        self.Bind(wx.EVT_MENU, self.openCSVFile, id=open_btnId)
         self.Bind(wx.EVT_MENU, self.onSave, id=save_btnId)
         self.Bind(wx.EVT_MENU, self.onClose, id=exit_btnId)
         accel_tbl = wx.AcceleratorTable([
                                     (wx.ACCEL_CMD,  ord('K'), kMode_btnId),
+                                    (wx.ACCEL_CMD,  ord('M'), live_btnId),
+                                    (wx.ACCEL_CMD,  ord('Z'), undo_btnId),
+                                    (wx.ACCEL_CMD,  ord('Y'), redo_btnId),
+                                    (wx.ACCEL_CMD,  ord('O'), open_btnId),
                                     (wx.ACCEL_CMD,  ord('S'), save_btnId),
                                     (wx.ACCEL_CMD,  ord('Q'), exit_btnId),
                                     ])
         self.SetAcceleratorTable(accel_tbl)
 
         self.Bind(wx.EVT_CLOSE, self.onClose)
+
+        # offer recovery of interrupted session, then start click journal
+        wx.CallAfter(self.recoverSession, 
+                     findInterruptedJournals(self.outputPath))
+     
+    #-------------------------------------------------------------------
+   
+    def recoverSession(self, fps):
+        """ Offer to recover the most recent interrupted session 
+        from its click journal, then start the click journal 
+        of this session.
+        
+        Args:
+            fps (list): File paths of interrupted click journals.
+        
+        Returns:
+            None
+        """
+        if DEBUG: print("FlexTilesFrame.recoverSession()")
+
+        sess = None
+        if len(fps) > 0:
+            try: sess = recoverFromJournal(fps[-1])
+            except Exception as e: print(str(e))
+        if sess != None and len(sess["ftSeq"]) > 0 and \
+          sess["ftArr"].shape[:2] == (self.nRows, self.nCols):
+            msg = "Previous session was not closed properly.\n"
+            msg += "Recover its %i clicks?"%(len(sess["ftSeq"]))
+            ret = wx.MessageBox(msg, "Recovery", wx.YES_NO|wx.ICON_QUESTION)
+            if ret == wx.YES:
+                self.ftArr = sess["ftArr"]
+                self.ftSeq = sess["ftSeq"]
+                # continue click-times from the last recovered click
+                self.progInitTime = time() - self.ftSeq[-1][2]
+                self.liveA = ftA.LiveAnalysis(self.ftArr[:,:,0])
+                self.ftBuf = None # backbuffer should be made again
+                self.panel["mp"].Refresh()
+        for fp in fps:
+            # remove interrupted journals; not to offer recovery again.
+            #   recovered clicks are written in the new journal.
+            try: removeJournalFile(fp)
+            except Exception as e: print(str(e))
+        
+        self.startJournal() # start click journal of this session
+     
+    #-------------------------------------------------------------------
+   
+    def startJournal(self):
+        """ Start a new click journal with clicks in ftSeq so far.
+        The current journal is closed and removed, if there is one.
+        
+        Args:
+            None
+        
+        Returns:
+            None
+        """
+        if DEBUG: print("FlexTilesFrame.startJournal()")
+
+        if self.journal != None: self.journal.close(flagRemove=True)
+        timestamp = get_time_stamp().replace("_","")[:14]
+        fp = path.join(self.outputPath, "journal_%s.ftj"%(timestamp))
+        cnt = 1
+        while path.isfile(fp):
+            fp = path.join(self.outputPath, 
+                           "journal_%s_%i.ftj"%(timestamp, cnt))
+            cnt += 1
+        self.journal = ClickJournal(fp, self.nRows, self.nCols, 
+                                    self.progInitTime)
+        ### write clicks so far in the journal
+        angles = np.zeros((self.nRows, self.nCols), dtype=np.uint16)
+        for ri, ci, clickTime in self.ftSeq:
+            angles[ri,ci] = (angles[ri,ci] + 90) % 360
+            self.journal.append(ri, ci, clickTime, angles[ri,ci])
      
     #-------------------------------------------------------------------
    
@@ -376,27 +526,31 @@ class FlexTilesFrame(wx.Frame):
                 set_img_for_btn("img_draw%s.png"%(_bl.capitalize()), obj)
         
     #-------------------------------------------------------------------
-    ''' 
-    def openCSVFile(self):
-        """ Open data CSV file. 
+    def openCSVFile(self, event):
+        """ Open a session CSV file, saved in output folder. 
         
         Args:
-            None
+            event (wx.Event)
         
         Returns:
             None 
         """
         if DEBUG: print("FlexTilesFrame.openCSVFile()")
 
+        if self.flagBlockUI or self.flagKandinsky: return
+
         ### choose result CSV file 
         wc = 'CSV files (*.csv)|*.csv' 
         dlg = wx.FileDialog(self, 
                             "Open CSV file", 
+                            defaultDir=self.outputPath,
                             wildcard=wc, 
                             style=wx.FD_OPEN|wx.FD_FILE_MUST_EXIST)
-        if dlg.ShowModal() == wx.ID_CANCEL: return
-        dlg.Destroy()
+        if dlg.ShowModal() == wx.ID_CANCEL:
+            dlg.Destroy()
+            return
         csvFP = dlg.GetPath()
+        dlg.Destroy()
         
         ### update CSV file path
         self.csvFP = csvFP
@@ -405,7 +559,8 @@ class FlexTilesFrame(wx.Frame):
     #-------------------------------------------------------------------
     
     def loadData(self):
-        """ load CSV data 
+        """ load CSV data and restore FlexTiles with it.
+        Clicks after this continue the loaded session.
 
         Args: None
         
@@ -413,19 +568,30 @@ class FlexTilesFrame(wx.Frame):
         """
         if DEBUG: print("FlexTilesFrame.loadData()")
 
-        csvTxt = self.stcCSV.GetText()
         try:
-            self.pgd.loadData(csvTxt) # load CSV data
-        except: # failed to load data
+            sess = loadSessionCSV(self.csvFP) # load CSV data
+            if sess["ftArr"].shape[:2] != (self.nRows, self.nCols):
+                msg = "Size of FlexTiles in the CSV file doesn't match."
+                raise ValueError(msg)
+        except Exception as e: # failed to load data
             self.csvFP = ""
-            self.pgd.csvFP = ""
-            self.stcCSV.SetEditable(True)
-            self.stcCSV.SetText("")
-            self.stcCSV.SetEditable(False) # CSV text is read-only
-            msg = "Failed to load CSV data"
+            msg = "Failed to load CSV data\n%s"%(str(e))
             wx.MessageBox(msg, "Error", wx.OK|wx.ICON_ERROR)
+            return
+        seq = sess["ftSeq"]
+        self.rotAni = {}
+        self.ftArr = sess["ftArr"]
+        self.ftSeq = [[int(r), int(c), float(t)] for r, c, t in zip(
+                                        seq["row"], seq["col"], seq["time"])]
+        lastT = 0.0
+        if len(self.ftSeq) > 0: lastT = self.ftSeq[-1][2]
+        # continue click-times from the last loaded click
+        self.progInitTime = time() - lastT
+        self.liveA = ftA.LiveAnalysis(self.ftArr[:,:,0])
+        self.ftBuf = None # backbuffer should be made again
+        self.startJournal()
         self.panel["mp"].Refresh() # draw FlexTiles 
-    ''' 
+
     #-------------------------------------------------------------------
     
     def onPaint(self, event):
@@ -445,15 +611,19 @@ class FlexTilesFrame(wx.Frame):
         if self.flagKandinsky:
             self.drawInKMode(dc)
         else:
-            self.draw(dc)
+            # draw only tiles in the area to be repainted
+            self.draw(dc, self.panel["mp"].GetUpdateRegion())
+            if self.flagLiveMetrics: self.drawLiveMetrics(dc)
     
     #-------------------------------------------------------------------
   
-    def draw(self, dc):
+    def draw(self, dc, region=None):
         """ Draw FlexTiles
         
         Args:
             dc (wx.PaintDC): PaintDC to draw on.
+            region (None/ wx.Region): Region to be repainted. 
+              Tiles outside of it are skipped. None means all tiles.
          
         Returns:
             None
@@ -465,63 +635,278 @@ class FlexTilesFrame(wx.Frame):
         ani = self.ani # animation
         ftR = self.ftR # FlexTile's rect
         tSz = self.tileSz # tile size
+        
+        if ani != None and ani["name"] in ["zoomIn", "zoomOut"]:
+            # tile size is changing; draw tiles directly
+            self.drawTiles(dc, ftR[0], ftR[1], region)
+        else:
+            ### copy FlexTiles from backbuffer
+            r = wx.Rect(ftR[0], ftR[1], ftR[2]-ftR[0], ftR[3]-ftR[1])
+            if region != None: r = r.Intersect(region.GetBox())
+            if not r.IsEmpty():
+                memDC = wx.MemoryDC(self.getFTBuf())
+                dc.Blit(r.x, r.y, r.width, r.height, 
+                        memDC, r.x-ftR[0], r.y-ftR[1])
+                memDC.SelectObject(wx.NullBitmap)
          
-        ### draw tile in rotate animation first
-        if ani != None and ani["name"] == "rotate":
-            ri = ani["ri"]
-            ci = ani["ci"]
+        ### draw tiles in rotate animation 
+        for (ri, ci) in self.rotAni.keys():
+            if not self.isInRegion(region, self.getTileRect(ri, ci)):
+                continue
             x = ftR[0] + (ci * tSz)
             y = ftR[1] + (ri * tSz)
-            deg = self.ftArr[ri,ci,0]
-            radian = np.deg2rad(-deg)
-            cx = x + tSz/2
-            cy = y + tSz/2
-            img = self.tileImg.Copy()
-            img = img.Rotate(radian, (cx, cy), interpolating=True)
-            imgSz = img.GetSize()
-            offset = int((imgSz[0]-tSz)/2)
-            dc.DrawBitmap(wx.Bitmap(img), x-offset, y-offset)
+            # rotating tile is larger than its cell;
+            #   clip it, so that it doesn't cover neighbouring tiles
+            dc.SetClippingRegion(x, y, tSz, tSz)
+            dc.SetPen(wx.Pen('#000000', 1, wx.TRANSPARENT))
+            dc.SetBrush(wx.Brush(self.colors["ftBGCol"]))
+            dc.DrawRectangle(x, y, tSz, tSz)
+            bmp, offset = self.getRotFrame(self.rotAni[(ri, ci)]["ang"])
+            dc.DrawBitmap(bmp, x-offset, y-offset)
+            dc.DestroyClippingRegion()
             
-        ### draw rest of tiles
-        imo = self.idxMouseOn # row, column indices of tile,
-          # where mouse pointer is currently on
-        dc.SetPen(wx.Pen(self.colors["highlightedTile"], 3))
-        dc.SetBrush(wx.Brush('#000000', wx.TRANSPARENT))
+        ### highlight tile, where mouse pointer is currently on 
+        ri, ci = self.idxMouseOn
+        if ri != None and 0 <= ri < self.nRows and 0 <= ci < self.nCols:
+            dc.SetPen(wx.Pen(self.colors["highlightedTile"], 3))
+            dc.SetBrush(wx.Brush('#000000', wx.TRANSPARENT))
+            dc.DrawRectangle(self.getTileRect(ri, ci)) 
+
+    #-------------------------------------------------------------------
+  
+    def drawTiles(self, dc, x0, y0, region=None):
+        """ Draw tiles of FlexTiles
+        
+        Args:
+            dc (wx.DC): DC to draw on.
+            x0 (int): X-coordinate of top-left corner of FlexTiles.
+            y0 (int): Y-coordinate of top-left corner of FlexTiles.
+            region (None/ wx.Region): Region to be repainted. 
+              Tiles outside of it are skipped. None means all tiles.
+         
+        Returns:
+            None
+        """ 
+        if DEBUG: print("FlexTilesFrame.drawTiles()")
+
+        ftR = self.ftR # FlexTile's rect
+        tSz = self.tileSz # tile size
+        tileBmps = self.getTileBmps()
         for ri in range(self.nRows):
-            y = ftR[1] + (ri * tSz)
-            if y >= ftR[3]: break # break if it's out of rect.
+            y = y0 + (ri * tSz)
+            if y-y0 >= ftR[3]-ftR[1]: break # break if it's out of rect.
             for ci in range(self.nCols):
-                if ani != None and ani["name"] == "rotate":
-                    if ani["ri"] == ri and ani["ci"] == ci: continue
-                x = ftR[0] + (ci * tSz)
-                if x >= ftR[2]: break # break if it's out of rect.
-                img = self.tileImg.Copy()
+                x = x0 + (ci * tSz)
+                if x-x0 >= ftR[2]-ftR[0]: break # break if it's out of rect.
+                if not self.isInRegion(region, wx.Rect(x, y, tSz, tSz)):
+                    continue
                 deg = self.ftArr[ri,ci,0]
-                if deg != 0:
-                    ### rotate tile
-                    n = int(deg / 90)
-                    for i in range(n): img = img.Rotate90()
-                dc.DrawBitmap(wx.Bitmap(img), x, y)
-                        
-                if imo == (ri, ci): # currently mouse pinter is on this tile
-                    # highlight this tile
-                    dc.DrawRectangle(x, y, tSz, tSz) 
-   
-        if ani != None and ani["name"] == "rotate": 
-            ### Cover outside of FlexTiles, when 
-            ###   rotating tile is occuring at the edge of FlexTiles
-            ###   (rotating tile is larger than other tiles 
-            ###    with black color bg.)
-            dc.SetPen(wx.Pen('#000000', 1, wx.TRANSPARENT))
-            dc.SetBrush(wx.Brush(self.colors["ftBGCol"]))
-            if ani["ci"] == 0: # left side
-                dc.DrawRectangle(ftR[0]-tSz, 0, tSz, self.wSz[1])
-            elif ani["ci"] == self.nCols-1: # right side
-                dc.DrawRectangle(ftR[2], 0, tSz, self.wSz[1])
-            if ani["ri"] == 0: # top side
-                dc.DrawRectangle(0, ftR[1]-tSz, self.wSz[0], tSz)
-            elif ani["ri"] == self.nRows-1: # bottom side
-                dc.DrawRectangle(0, ftR[3], self.wSz[0], tSz)
+                dc.DrawBitmap(tileBmps[int(deg/90)%4], x, y)
+
+    #-------------------------------------------------------------------
+  
+    def getFTBuf(self):
+        """ Return backbuffer bitmap of entire FlexTiles.
+        It's made again only when there's none yet (ftBuf is set to None, 
+        when tile bitmaps are made again) or when tile size has changed.
+        Otherwise, it's updated tile by tile in updateFTBuf.
+        
+        Args:
+            None
+         
+        Returns:
+            (wx.Bitmap): Backbuffer.
+        """ 
+        if DEBUG: print("FlexTilesFrame.getFTBuf()")
+
+        self.getTileBmps() # tile bitmaps should be up to date
+        if self.ftBuf == None or self.ftBufSz != self.tileSz:
+            ftR = self.ftR
+            self.ftBuf = wx.Bitmap(ftR[2]-ftR[0], ftR[3]-ftR[1], depth=-1)
+            memDC = wx.MemoryDC(self.ftBuf)
+            memDC.SetBackground(wx.Brush(self.colors["ftBGCol"]))
+            memDC.Clear()
+            self.drawTiles(memDC, 0, 0)
+            memDC.SelectObject(wx.NullBitmap)
+            self.ftBufSz = self.tileSz
+        return self.ftBuf
+
+    #-------------------------------------------------------------------
+  
+    def updateFTBuf(self, ri, ci):
+        """ Draw a tile with its current angle in backbuffer.
+        
+        Args:
+            ri (int): Row index of tile.
+            ci (int): Column index of tile.
+         
+        Returns:
+            None
+        """ 
+        if DEBUG: print("FlexTilesFrame.updateFTBuf()")
+
+        if self.ftBuf == None: return # it'll be made with all tiles anyway
+        tSz = self.tileSz
+        deg = self.ftArr[ri,ci,0]
+        memDC = wx.MemoryDC(self.ftBuf)
+        memDC.DrawBitmap(self.getTileBmps()[int(deg/90)%4], ci*tSz, ri*tSz)
+        memDC.SelectObject(wx.NullBitmap)
+
+    #-------------------------------------------------------------------
+  
+    def isInRegion(self, region, rect):
+        """ Whether the given rect is (at least partly) in the region.
+        
+        Args:
+            region (None/ wx.Region): Region to be repainted.
+              None means everything is to be repainted.
+            rect (wx.Rect): Rect to check.
+         
+        Returns:
+            (bool)
+        """ 
+        if region == None: return True
+        return region.Contains(rect) != wx.OutRegion
+
+    #-------------------------------------------------------------------
+  
+    def getTileRect(self, ri, ci, margin=0):
+        """ Return rect of a tile on the main panel.
+        
+        Args:
+            ri (int): Row index of tile.
+            ci (int): Column index of tile.
+            margin (int): Margin to add on each side.
+         
+        Returns:
+            (wx.Rect)
+        """ 
+        tSz = self.tileSz
+        x = self.ftR[0] + (ci * tSz)
+        y = self.ftR[1] + (ri * tSz)
+        return wx.Rect(x-margin, y-margin, tSz+margin*2, tSz+margin*2)
+
+    #-------------------------------------------------------------------
+  
+    def refreshTile(self, ri, ci, margin=2):
+        """ Refresh only the area of a tile on the main panel.
+        Default margin covers the highlighting rectangle.
+        
+        Args:
+            ri (None/ int): Row index of tile. Nothing happens, if None.
+            ci (None/ int): Column index of tile.
+            margin (int): Margin to add on each side.
+         
+        Returns:
+            None
+        """ 
+        if DEBUG: print("FlexTilesFrame.refreshTile()")
+
+        if ri == None: return
+        self.panel["mp"].RefreshRect(self.getTileRect(ri, ci, margin), 
+                                     eraseBackground=False)
+        if self.flagLiveMetrics and self.liveMetricsRect != None:
+            self.panel["mp"].RefreshRect(self.liveMetricsRect, 
+                                         eraseBackground=False)
+
+    #-------------------------------------------------------------------
+  
+    def getTileBmps(self):
+        """ Return bitmaps of the tile image, rotated by 0, 90, 180 and 
+        270 degrees. Bitmaps are made only when there're none yet 
+        (tileBmps is set to None when tile image is changed) or
+        when tile size has changed.
+        
+        Args:
+            None
+         
+        Returns:
+            (list): List of four wx.Bitmap.
+        """ 
+        if DEBUG: print("FlexTilesFrame.getTileBmps()")
+
+        if self.tileBmps == None or self.tileBmpsSz != self.tileSz:
+            img = self.tileImg
+            self.tileBmps = []
+            for i in range(4):
+                self.tileBmps.append(wx.Bitmap(img))
+                img = img.Rotate90()
+            self.tileBmpsSz = self.tileSz
+            self.ftBuf = None # backbuffer should be made again
+            self.rotFrames = None # rotation frames should be made again
+        return self.tileBmps
+
+    #-------------------------------------------------------------------
+  
+    def getRotFrame(self, deg):
+        """ Return a frame of rotate animation; tile image rotated by 
+        the given degree. Frames are made all at once, when there're 
+        none yet (rotFrames is set to None when tile bitmaps are made 
+        again). Interpolated rotation is done only for frames between 
+        0 and 90 degrees, other frames are rotated by 90 degrees 
+        from them.
+        
+        Args:
+            deg (int): Degree of rotation (clockwise).
+         
+        Returns:
+            (tuple): wx.Bitmap of rotated tile and its offset 
+              (from the tile position to the top-left of the bitmap).
+        """ 
+        if DEBUG: print("FlexTilesFrame.getRotFrame()")
+
+        self.getTileBmps() # tile bitmaps should be up to date
+        aStep = self.aniRotStep
+        if self.rotFrames == None:
+            self.rotFrames = {}
+            tSz = self.tileSz
+            for d in range(0, 90, aStep):
+                img = self.tileImg.Copy()
+                img = img.Rotate(np.deg2rad(-d), (tSz/2, tSz/2), 
+                                 interpolating=True)
+                offset = int((img.GetSize()[0]-tSz)/2)
+                for i in range(4):
+                    self.rotFrames[d+i*90] = (wx.Bitmap(img), offset)
+                    img = img.Rotate90()
+        # degree of the closest frame
+        deg = int(round(deg/float(aStep))) * aStep % 360
+        return self.rotFrames[deg]
+
+    #-------------------------------------------------------------------
+  
+    def drawLiveMetrics(self, dc):
+        """ Draw analysis values of the current FlexTiles 
+        at the top-left corner of the panel.
+        
+        Args:
+            dc (wx.PaintDC): PaintDC to draw on.
+         
+        Returns:
+            None
+        """ 
+        if DEBUG: print("FlexTilesFrame.drawLiveMetrics()")
+
+        v = self.liveA.getValues()
+        lines = []
+        lines.append("Entropy: %.3f"%(v["entropy"]))
+        _r = "/".join(["%.3f"%(x) for x in v["orientationRatio"]])
+        lines.append("Orientation ratio [0/90/180/270]: %s"%(_r))
+        _s = "/".join(["%.3f"%(x) for x in v["symmetries"]])
+        lines.append("Symmetries [hor/ver/1dia/2dia]: %s"%(_s))
+        lines.append("Translational symmetry: %.3f"%(
+                                                v["translationalSymmetry"]))
+        _s = "/".join(["%.3f"%(x) for x in v["rotationalSymmetries"]])
+        lines.append("Rotational symmetries [180/90]: %s"%(_s))
+        dc.SetFont(self.fonts[1])
+        dc.SetTextForeground(self.colors["liveMetrics"])
+        lineH = dc.GetTextExtent("0")[1] + 4
+        w = 0
+        for i in range(len(lines)):
+            dc.DrawText(lines[i], 10, 10 + lineH*i)
+            w = max(w, dc.GetTextExtent(lines[i])[0])
+        # store area of text to repaint it when values change
+        #   (with some room for longer numbers)
+        self.liveMetricsRect = wx.Rect(0, 0, w+60, 20+lineH*len(lines))
 
     #-------------------------------------------------------------------
   
@@ -536,113 +921,103 @@ class FlexTilesFrame(wx.Frame):
         """ 
         if DEBUG: print("FlexTilesFrame.drawInKMode()")
         
-        img = self.tileImgLarge.Copy()
         ftR = self.ftR # rect of FlexTiles area
-        
-        ##### [begin] drawing
         sz = self.tileSz 
-        bmp = wx.Bitmap(sz, sz, depth=-1)
-        memDC = wx.MemoryDC()
-        memDC.SelectObject(bmp)
-        
-        ### draw existing tile image
-        if img.GetSize()[0] != sz:
-            img = img.Rescale(sz, sz, wx.IMAGE_QUALITY_HIGH)
-        memDC.DrawBitmap(wx.Bitmap(img), 0, 0)
-        
-        isTempDrawing = False # temporary drawing is for some cases
-          # such as line drawing (x1,y1 is determined but not x2, y2)
-        
-        ### make new drawings, if available
-        if self.kD != None:
-            memDC.SetPen(wx.Pen(self.selectedSCol, self.selectedSThick))
-            memDC.SetBrush(wx.Brush(self.selectedFCol))
-            kD = self.kD
-            
-            if kD["name"] == "fill":
-                memDC.SetBackground(wx.Brush(self.selectedFCol))
-                memDC.Clear()
-                self.kD = None
-            
-            elif kD["name"] in ["line", "rectangle", "circle"]:
-            # can be drawn with two points
-                if kD["x1"] != None:
-                    x1 = kD["x1"]
-                    y1 = kD["y1"]
-                    if kD["x2"] == None:
-                        x2 = self.currMP[0] - ftR[0]
-                        y2 = self.currMP[1] - ftR[1]
-                        isTempDrawing = True
-                    else:
-                        x2 = kD["x2"]
-                        y2 = kD["y2"]
-                        self.kD = None
-                    if kD["name"] == "line":
-                        memDC.DrawLine(x1, y1, x2, y2)
-                    elif kD["name"] == "rectangle":
-                        memDC.DrawRectangle(x1, y1, (x2-x1), (y2-y1))
-                    elif kD["name"] == "circle":
-                        rad = int(np.sqrt((x2-x1)**2 + (y2-y1)**2))
-                        memDC.DrawCircle(x1, y1, rad)
-            
-            elif kD["name"] == "curvyline": # curvy line drawing
-                if kD["x1"] != None:
-                    pen = wx.Pen(self.selectedSCol, self.selectedSThick)
-                    x1 = kD["x1"]
-                    y1 = kD["y1"]
-                    if kD["x2"] == None:
-                        x2 = self.currMP[0] - ftR[0]
-                        y2 = self.currMP[1] - ftR[1]
-                        memDC.DrawLine(x1, y1, x2, y2)
-                        isTempDrawing = True
-                    else:
-                        x2 = kD["x2"]
-                        y2 = kD["y2"]
-                        gc = wx.GraphicsContext.Create(memDC)
-                        gc.SetPen(wx.Pen(self.selectedSCol, 
-                                         self.selectedSThick))
-                        path = gc.CreatePath() 
-                        path.MoveToPoint(x1, y1)
-                        if kD["x3"] == None:
-                            x3 = self.currMP[0] - ftR[0]
-                            y3 = self.currMP[1] - ftR[1]
-                            path.AddCurveToPoint(x1, y1, x2, y2, x3, y3)
-                            isTempDrawing = True
-                        else:
-                            x3 = kD["x3"]
-                            y3 = kD["y3"]
-                            path.AddCurveToPoint(x1, y1, x2, y2, x3, y3)
-                            self.kD = None
-                        gc.StrokePath(path)
-            
-            elif kD["name"] == "polygon":
-                pts = copy(kD["pts"])
-                if not kD["isClosed"]: # when it's not complete
-                    # add current mouse pointer position to the point list
-                    pts.append((self.currMP[0]-ftR[0], self.currMP[1]-ftR[1]))
-                if len(pts) == 2: # not polygon yet
-                    # draw as line
-                    memDC.DrawLine(pts[0][0], pts[0][1], pts[1][0], pts[1][1])
-                    isTempDrawing = True
-                elif len(pts) > 2:
-                    if kD["isClosed"]: self.kD = None
-                    else: isTempDrawing = True
-                    memDC.DrawPolygon(pts) # draw polygon
-            
-            elif kD["name"] == "pencil":
-                pts = self.freePencilDrawingPts
-                l = len(pts)
-                if l > 1:
-                    memDC.DrawLines(pts)
-                    self.freePencilDrawingPts = [copy(pts[-1])]
-        memDC.SelectObject(wx.NullBitmap)
-        ##### [end] drawing
         
-        # draw tile on the given DC 
-        dc.DrawBitmap(bmp, ftR[0], ftR[1])
-        if not isTempDrawing:
-            # update tile image
-            self.tileImgLarge = bmp.ConvertToImage()
+        # draw tile with committed drawings
+        dc.DrawBitmap(self.getKCanvas(), ftR[0], ftR[1])
+
+        ### draw preview of drawing in progress (such as line drawing, 
+        ###   where x1,y1 is determined but not x2,y2) with current 
+        ###   mouse pointer position 
+        kD = self.kD
+        if kD == None or self.currMP == None: return
+        mx = self.currMP[0] - ftR[0]
+        my = self.currMP[1] - ftR[1]
+        pD = None # shape to preview
+        if kD["name"] in ["line", "rectangle", "circle"]:
+            if kD["x1"] != None and kD["x2"] == None:
+                pD = dict(kD, x2=mx, y2=my)
+        elif kD["name"] == "curvyline":
+            if kD["x1"] != None:
+                if kD["x2"] == None: # draw as line
+                    pD = dict(kD, x2=mx, y2=my)
+                elif kD["x3"] == None:
+                    pD = dict(kD, x3=mx, y3=my)
+        elif kD["name"] == "polygon":
+            if not kD["isClosed"]:
+                pD = dict(kD, pts=kD["pts"]+[(mx, my)])
+        elif kD["name"] == "pencil":
+            if self.flagFreePencilDrawing:
+                pD = dict(kD, pts=self.freePencilDrawingPts)
+        if pD != None:
+            dc.SetClippingRegion(ftR[0], ftR[1], sz, sz)
+            drawKShape(dc, self.getKStyled(pD), 1.0, ftR[0], ftR[1])
+            dc.DestroyClippingRegion()
+     
+    #-------------------------------------------------------------------
+  
+    def getKCanvas(self):
+        """ Return canvas bitmap of Kandinsky mode, which has 
+        the tile image with committed drawings. 
+        It's the cached bitmap of the display list at the current 
+        tile size.
+        
+        Args:
+            None
+         
+        Returns:
+            (wx.Bitmap): Canvas.
+        """ 
+        if DEBUG: print("FlexTilesFrame.getKCanvas()")
+
+        return self.kDL.getBitmap(self.tileSz)
+
+    #-------------------------------------------------------------------
+  
+    def getKStyled(self, kD):
+        """ Return drawing info. with selected colors and 
+        stroke thickness.
+        
+        Args:
+            kD (dict): Drawing info.
+         
+        Returns:
+            (dict): Drawing info. to draw with modFTKandinsky.drawKShape
+        """ 
+        return dict(kD, fCol=self.selectedFCol, sCol=self.selectedSCol, 
+                    sThick=self.selectedSThick)
+
+    #-------------------------------------------------------------------
+  
+    def commitKDrawing(self):
+        """ Draw the current drawing on canvas of Kandinsky mode, 
+        if all its points are determined.
+        
+        Args:
+            None
+         
+        Returns:
+            (bool): Whether the drawing was committed.
+        """ 
+        if DEBUG: print("FlexTilesFrame.commitKDrawing()")
+
+        kD = self.kD
+        if kD == None: return False
+        name = kD["name"]
+        if name == "fill": isComplete = True
+        elif name in ["line", "rectangle", "circle"]:
+            isComplete = kD["x2"] != None
+        elif name == "curvyline": isComplete = kD["x3"] != None
+        elif name == "polygon": isComplete = kD["isClosed"]
+        else: isComplete = False
+        if not isComplete: return False
+        self.getKCanvas() # canvas should exist to be drawn on
+        # record it in display list (with undo step), 
+        #   which draws it on canvas 
+        self.kUndo.add(self.getKStyled(kD), self.tileSz)
+        self.kD = None
+        return True
      
     #-------------------------------------------------------------------
 
@@ -660,58 +1035,108 @@ class FlexTilesFrame(wx.Frame):
 
         if flag == "ani":
         # animation is running
+            # animations are drawn by elapsed time, not by number of
+            #   timer events, so that they take the same time, 
+            #   even when timer events are delayed (frames are dropped)
+            now = perf_counter()
             
-            ### set some parameters
-            if self.ani["name"] == "rotate":
-                aStep = 10 # degree to rotate for 'rotate' 
-            else:
-                # size of tile to increase/decrease for 'zoomIn/Out'
-                tStep = max(5, int(abs(self.tileSz-self.ani["targetSz"])/10))
-            
-            isAniEnded = False
-            if self.ani["name"] == "rotate":
-            # rotating tile
-                ri = self.ani["ri"]
-                ci = self.ani["ci"]
-                tAng = self.ani["tAng"]
-                if self.ftArr[ri,ci,0] < tAng:
-                    self.ftArr[ri,ci,0] += aStep 
-                else: # reached target angle
-                    if self.ftArr[ri,ci,0] == 360: self.ftArr[ri,ci,0] = 0
-                    isAniEnded = True
-             
-            elif self.ani["name"] == "zoomIn":
-            # zooming in (when Kandinsky mode is turned on)
-                tSz = self.ani["targetSz"]
-                if self.tileSz < tSz:
-                    self.tileSz += tStep 
-                else: # reached target tile size
-                    isAniEnded = True
-            
-            elif self.ani["name"] == "zoomOut":
-            # zooming out (when Kandinsky mode is turned off)
-                tSz = self.ani["targetSz"]
-                if self.tileSz > tSz:
-                    self.tileSz -= tStep 
-                else: # reached target tile size
-                    isAniEnded = True
-             
-            if isAniEnded: # animation ended
-                self.timer["ani"].Stop()
-                self.timer["ani"] = None
-                self.flagBlockUI = False
-                if self.ani["name"] == "zoomIn":
-                    self.flagKandinsky = True
-                    self.panel["lp"].Show() 
-                    if self.selectedDBtn != "":
-                    # if there's a selected drawing button
-                        # de-select it
-                        self.onButtonPressDown(
+            ### rotating tiles
+            for (ri, ci) in list(self.rotAni.keys()):
+                rA = self.rotAni[(ri, ci)]
+                p = self.calcEasedProgress(rA["t0"], self.aniDur["rotate"], 
+                                           now)
+                rA["ang"] = rA["sAng"] + (rA["tAng"]-rA["sAng"]) * p
+                if p == 1.0: # reached target angle
+                    del self.rotAni[(ri, ci)]
+                # redraw only the area of rotating tile
+                self.refreshTile(ri, ci)
+
+            if self.ani != None:
+            # zooming in/out (when Kandinsky mode is turned on/off)
+                ani = self.ani
+                p = self.calcEasedProgress(ani["t0"], 
+                                           self.aniDur[ani["name"]], now)
+                self.tileSz = int(round(ani["startSz"] + \
+                                        (ani["targetSz"]-ani["startSz"]) * p))
+                if p == 1.0: # animation ended
+                    self.flagBlockUI = False
+                    if ani["name"] == "zoomIn":
+                        self.flagKandinsky = True
+                        self.panel["lp"].Show() 
+                        if self.selectedDBtn != "":
+                        # if there's a selected drawing button
+                            # de-select it
+                            self.onButtonPressDown(
                                 None, 
                                 "draw%s_btn"%(self.selectedDBtn.capitalize())
                                 )
-                self.ani = None
-            self.panel["mp"].Refresh() # redraw FlexTiles
+                    self.ani = None
+                self.panel["mp"].Refresh() # redraw FlexTiles
+
+            if self.ani == None and len(self.rotAni) == 0 and \
+              self.timer["ani"] != None:
+                self.timer["ani"].Stop() # nothing to animate
+
+        elif flag == "save":
+        # check results from the saving thread
+            rData = receiveDataFromQueue(self.q["saveRslt"])
+            if rData == None: return
+            fn = path.basename(rData["csvFP"])[:-4]
+            if fn in self.savingFNs: self.savingFNs.remove(fn)
+            # stop timer while message box is shown
+            self.timer["save"].Stop()
+            if rData["error"] == "":
+                msg = "Saved\n"
+                msg += path.basename(rData["imgFP"]) + "\n"
+                msg += path.basename(rData["csvFP"]) + "\n"
+                if rData["npzFP"] != "":
+                    msg += path.basename(rData["npzFP"]) + "\n"
+                msg += " in output folder."
+                if self.journal != None and \
+                  rData["nClicks"] == len(self.ftSeq):
+                # all clicks are saved; journal is not needed anymore
+                    self.journal.close(flagRemove=True)
+                    self.journal = None
+                wx.MessageBox(msg, "Info.", wx.OK|wx.ICON_INFORMATION)
+            else:
+                msg = "Failed to save %s\n%s"%(fn, rData["error"])
+                wx.MessageBox(msg, "Error", wx.OK|wx.ICON_ERROR)
+            if len(self.savingFNs) > 0 and self.timer["save"] != None:
+                self.timer["save"].Start(100) # other jobs are being saved
+    
+    #-------------------------------------------------------------------
+    
+    def calcEasedProgress(self, t0, duration, now):
+        """ Calculate progress of an animation with ease-in-out.
+        
+        Args:
+            t0 (float): Start time of animation (time.perf_counter).
+            duration (float): Duration of animation in seconds.
+            now (float): Current time (time.perf_counter).
+        
+        Returns:
+            (float): Progress between 0.0 and 1.0.
+        """
+        p = min(1.0, max(0.0, (now-t0) / duration))
+        return p * p * (3 - 2*p) # smoothstep
+    
+    #-------------------------------------------------------------------
+    
+    def startAniTimer(self):
+        """ Start the animation timer, if it's not running yet.
+        
+        Args:
+            None
+        
+        Returns:
+            None
+        """
+        if DEBUG: print("FlexTilesFrame.startAniTimer()") 
+
+        # timers are removed when the frame is closing
+        if self.timer["ani"] == None: return
+        if not self.timer["ani"].IsRunning():
+            self.timer["ani"].Start(self.aniInterval)
     
     #-------------------------------------------------------------------
     
@@ -759,7 +1184,8 @@ class FlexTilesFrame(wx.Frame):
             if sdBtn == "pencil":
                 self.kD = dict(name="pencil")
                 self.flagFreePencilDrawing = True
-        self.panel["mp"].Refresh() # re-draw FlexTiles
+                self.freePencilDrawingPts = [(mp[0]-self.ftR[0], 
+                                              mp[1]-self.ftR[1])]
 
     #-------------------------------------------------------------------
     
@@ -784,7 +1210,8 @@ class FlexTilesFrame(wx.Frame):
             sdBtn = self.selectedDBtn.lower()
             mp = (mp[0]-ftR[0], mp[1]-ftR[1])
             if sdBtn == "fill":
-                self.kD = dict(name="fill")
+                self.kD = dict(name="fill", x1=mp[0], y1=mp[1], 
+                               tol=self.fillTol)
             elif sdBtn in ["line", "rectangle", "circle"]:
             # things can be drawn with two points
                 if self.kD == None: # no coordinate info is available 
@@ -836,30 +1263,55 @@ class FlexTilesFrame(wx.Frame):
                         pts.append(mp)
                 self.kD = dict(name=sdBtn, pts=pts, isClosed=isClosed)
             elif sdBtn == "pencil":
+                if len(self.freePencilDrawingPts) > 1:
+                    # draw the stroke on canvas
+                    self.kUndo.add(self.getKStyled(dict(name="pencil", 
+                                            pts=self.freePencilDrawingPts)), 
+                                   self.tileSz)
                 self.flagFreePencilDrawing = False 
                 self.freePencilDrawingPts = []
+            self.commitKDrawing() # draw on canvas, if it's complete
         
         else:
         # FlexTiles mode
             ri, ci = self.calcIdxFromCoord(mp)
-            if ri != None:
+            if ri != None and ri < self.nRows and ci < self.nCols:
             # if clicked in FlexTiles
                 self.playSnd("leftClick")
-                self.flagBlockUI = True # temporarily block user input 
                 # store clicked tile index and time
-                self.ftSeq.append([ri, ci, time()-self.progInitTime]) 
+                clickTime = time() - self.progInitTime
+                self.ftSeq.append([ri, ci, clickTime]) 
                 # increase number of clicks for this tile
                 self.ftArr[ri,ci,1] += 1
-                targetAngle = self.ftArr[ri,ci,0] + 90
-                self.ani = dict(name="rotate", ri=ri, ci=ci, tAng=targetAngle)
-                ### set timer for rotating animation 
-                self.timer["ani"] = wx.Timer(self)
-                self.Bind(wx.EVT_TIMER,
-                          lambda event: self.onTimer(event, "ani"),
-                          self.timer["ani"])
-                self.timer["ani"].Start(5) 
+                ### rotate animation; 
+                ###   if the tile is already rotating, add another 90 degrees
+                ###   to its target angle.
+                prevAngle = int(self.ftArr[ri,ci,0])
+                if (ri, ci) in self.rotAni: 
+                    # continue from currently displayed angle
+                    rA = self.rotAni[(ri, ci)]
+                    rA["sAng"] = rA["ang"]
+                    rA["tAng"] += 90
+                    rA["t0"] = perf_counter()
+                else:
+                    self.rotAni[(ri, ci)] = dict(sAng=prevAngle, 
+                                                 tAng=prevAngle+90,
+                                                 ang=prevAngle,
+                                                 t0=perf_counter())
+                ### update the tile's angle right away
+                targetAngle = (prevAngle + 90) % 360
+                self.ftArr[ri,ci,0] = targetAngle
+                self.liveA.update(ri, ci, targetAngle)
+                if self.journal == None:
+                # removed after saving; new journal with all clicks
+                    self.startJournal()
+                else:
+                    self.journal.append(ri, ci, clickTime, targetAngle)
+                self.updateFTBuf(ri, ci)
+                self.startAniTimer()
+                self.refreshTile(ri, ci)
              
-        self.panel["mp"].Refresh() # re-draw FlexTiles
+        if self.flagKandinsky: self.panel["mp"].Refresh() # re-draw tile
     
     #-------------------------------------------------------------------
     
@@ -881,8 +1333,7 @@ class FlexTilesFrame(wx.Frame):
         if self.flagKandinsky:
         # Kandinsky drawing mode
             self.kD = None # cancel any drawing
-        
-        self.panel["mp"].Refresh() # re-draw FlexTiles
+            self.panel["mp"].Refresh() # re-draw tile
 
     #-------------------------------------------------------------------
     
@@ -904,20 +1355,33 @@ class FlexTilesFrame(wx.Frame):
        
         if self.flagKandinsky:
         # Kandinsky drawing mode
+            ftR = self.ftR
             if self.flagFreePencilDrawing:
-                x = mp[0] - self.ftR[0]
-                y = mp[1] - self.ftR[1]
-                self.freePencilDrawingPts.append((x,y))
-                if len(self.freePencilDrawingPts) > 10:
-                    self.panel["mp"].Refresh() # re-drawing 
-            else:
-                self.panel["mp"].Refresh() # re-drawing 
+                x = mp[0] - ftR[0]
+                y = mp[1] - ftR[1]
+                pts = self.freePencilDrawingPts
+                pts.append((x,y))
+                if len(pts) > 1:
+                    ### re-draw area of the new line segment
+                    m = self.selectedSThick + 2 # margin
+                    (x1, y1), (x2, y2) = pts[-2:]
+                    r = wx.Rect(ftR[0]+min(x1, x2)-m, ftR[1]+min(y1, y2)-m,
+                                abs(x2-x1)+m*2, abs(y2-y1)+m*2)
+                    self.panel["mp"].RefreshRect(r, eraseBackground=False)
+            elif self.kD != None:
+            # re-draw, only when there's a preview of drawing in progress
+                self.panel["mp"].RefreshRect(
+                        wx.Rect(ftR[0], ftR[1], self.tileSz, self.tileSz), 
+                        eraseBackground=False
+                        )
          
         else: # FlexTiles mode 
             ri, ci = self.calcIdxFromCoord(mp)
-            if ri == None: self.idxMouseOn = (None, None)
-            else: self.idxMouseOn = (ri, ci)
-            self.panel["mp"].Refresh() # re-drawing 
+            if (ri, ci) == self.idxMouseOn: return # no change
+            ### re-draw previously and newly highlighted tiles
+            self.refreshTile(self.idxMouseOn[0], self.idxMouseOn[1])
+            self.idxMouseOn = (ri, ci)
+            self.refreshTile(ri, ci)
     
     #-------------------------------------------------------------------
     
@@ -929,26 +1393,24 @@ class FlexTilesFrame(wx.Frame):
             None 
 
         Returns:
-            croppedImg (wx.Image): Screen image. 
+            (wx.Image): Image of FlexTiles (or Tile). 
         """
         if DEBUG: print("FlexTilesFrame.screenShot()") 
 
-        sz = self.pi["mp"]["sz"]
-        bmp = wx.Bitmap(sz[0], sz[1], depth=-1)
-        memDC = wx.MemoryDC()
-        memDC.SelectObject(bmp)
-        if self.flagKandinsky: self.drawInKMode(memDC) # draw tile
-        else: self.draw(memDC) # draw FlexTiles
-        memDC.SelectObject(wx.NullBitmap)
-        img = bmp.ConvertToImage()
-        r = self.ftR
-        croppedImg = img.GetSubImage((r[0], r[1], r[2]-r[0], r[3]-r[1]))
-        return croppedImg
+        if not self.flagKandinsky:
+            # backbuffer has FlexTiles without highlighting
+            return self.getFTBuf().ConvertToImage()
+
+        # tile with committed drawings in Kandinsky mode
+        return self.getKCanvas().ConvertToImage()
     
     #-------------------------------------------------------------------
     
     def onSave(self, event):
-        """ Save the current FlexTiles 
+        """ Save the current FlexTiles.
+        Image, analysis results and click sequence are saved 
+        (in CSV and, if flagSaveNPZ is True, binary session file)
+        in the saving thread; the result is shown when it's finished.
 
         Args:
             event (wx.Event)
@@ -962,132 +1424,43 @@ class FlexTilesFrame(wx.Frame):
         
         ### file names to write
         timestamp = get_time_stamp().replace("_","")[:14]
-        imgFN = "ft_%s.png"%(timestamp)
-        imgFP = path.join(self.outputPath, imgFN)
-        csvFN = imgFN.replace(".png", ".csv")
-        csvFP = path.join(self.outputPath, csvFN)
-         
-        ### save FlexTiles image 
-        croppedImg = self.screenShot() 
-        croppedImg.SaveFile(imgFP, wx.BITMAP_TYPE_PNG) # save as file
-        
-        ##### [begin] saving CSV
-        arr = self.ftArr
-        rows, cols, __ = arr.shape
-        fh = open(csvFP, 'w')
-        
-        ### writing final states of tiles 
-        analysis_list = []
-        fh.write("# Final state of each tile\n")
-        fh.write("# - rows and columns match with FlexTiles shown in UI\n")
-        fh.write("# -----------------------------------------------------\n")
-        for ri in range(rows):
-            for ci in range(cols):
-                # write FT data (degree of rotation of each tile)
-                #   as a blank padded number, such as ' 90', '180', ...
-                deg = arr[ri,ci,0]
-                fh.write(str(deg).rjust(3, ' '))
-                if ci < cols-1: fh.write(", ")
-                analysis_list.append(deg)
-            fh.write("\n")
-        fh.write("\n")
-
-        ### writing number of clicks in each tile
-        fh.write("# Number of clicks in each tile\n")
-        fh.write("# - rows and columns match with FlexTiles shown in UI\n")
-        fh.write("# -----------------------------------------------------\n")
-        for ri in range(rows):
-            for ci in range(cols):
-                nClicks = arr[ri,ci,1]
-                fh.write(str(nClicks).rjust(3, ' '))
-                if ci < cols-1: fh.write(", ")
-            fh.write("\n")
-        fh.write("\n")
-
-        ### prep. final-state data
-        nStates = 4 # number of possible states (90, 180, 270, 360)
-        binaryFlag = False
-        # create array for sum over the states, starting with 0
-        # the final result represents the probability P of occurrence
-        analysis_x = [0.0 for i in range(nStates)]
-        for i in range(len(analysis_list)):
-            stateIdx = int(analysis_list[i] / (360/nStates))
-            # add the state to the array
-            analysis_x[stateIdx] += 1
-        # divide by the overall sum of entries
-        analysis_x = [x/len(analysis_list) for x in analysis_x]
-        if rows == cols:
-            flexTileWidth = 0 # If it's square FlexTiles, 
-              # width (n of columns) will be calculated in other functions
-        else:
-            flexTileWidth = cols
-        ### calculates analysis values
-        entropyValue = round(ftA.Entropy(analysis_x), 3)
-        symmetryValues = ftA.roundArray(
-                            ftA.getSymmetryValues(analysis_list,
-                                                  binaryFlag,
-                                                  flexTileWidth),
-                            3)
-        rotationalSymmetries = ftA.roundArray(
-                                ftA.getRotationalSymmetries(analysis_list,
-                                                            binaryFlag,
-                                                            flexTileWidth),
-                                3)
-        translationalSymmetry = round((1-(entropyValue)/2), 3)
-        tileMakerSymmetry = round(ftA.getTileMakerSymmetry(
-                                    analysis_list, 
-                                    False, 
-                                    flexTileWidth
-                                    ), 3) 
-        
-        ### writing analysis results 
-        fh.write("# Analysis results\n")
-        fh.write("# -----------------------------------------------------\n")
-        fh.write("The Entropy of this final state, %s\n"%str(entropyValue))
-        fh.write("Orientation ratio ")
-        fh.write("[0/90/180/270], [")
-        tmpStr = ''
-        for i in range(len(analysis_x)):
-            tmpStr += str(analysis_x[i]) + "/"
-        tmpStr = tmpStr.rstrip("/")
-        fh.write(tmpStr + "]")
-        fh.write('\n')
-        fh.write("Symmetries [hor/ver/1dia/2dia], [")
-        tmpStr = ''
-        for i in range(len(symmetryValues)):
-            tmpStr += str(symmetryValues[i]) + "/"
-        tmpStr = tmpStr.rstrip("/")
-        fh.write(tmpStr + "]\n")
-        fh.write("Translational Symmetry, %s\n"%str(translationalSymmetry))
-        fh.write("Tile Maker Symmetry, "+ str(tileMakerSymmetry) + '\n')
-        fh.write("Rotational Symmetries [180/90], [")
-        tmpStr = ''
-        for i in range(len(rotationalSymmetries)):
-            tmpStr += str(rotationalSymmetries[i]) + "/"
-        tmpStr = tmpStr.rstrip("/")
-        fh.write(tmpStr + "]\n")
-        fh.write("\n")
-        
-        ### writing the sequnce of tile-clicks
-        fh.write("# Sequence of FlexTile-Clicks\n")
-        fh.write("# - click-time is seconds after program-start-time.\n")
-        fh.write("# [sequence], [row-index], [column-index], [click-time]\n")
-        fh.write("# -----------------------------------------------------\n")
+        fn = "ft_%s"%(timestamp)
         cnt = 1
-        for i in range(len(self.ftSeq)):
-            ri, ci, eT = self.ftSeq[i]
-            fh.write("%i, %i, %i, %.3f\n"%(cnt, ri, ci, eT))
+        while path.isfile(path.join(self.outputPath, fn+".csv")) or \
+          fn in self.savingFNs:
+        # saved or being saved in the same second
+            fn = "ft_%s_%i"%(timestamp, cnt)
             cnt += 1
-        fh.write("\n")
-        fh.close()
-        ##### [end] saving CSV
-        
-        msg = "Finished saving"
-        msg += 'Saved\n'
-        msg += imgFN + "\n"
-        msg += csvFN + "\n"
-        msg += " in output folder."
-        wx.MessageBox(msg, "Info.", wx.OK|wx.ICON_INFORMATION)
+        self.savingFNs.append(fn)
+        imgFP = path.join(self.outputPath, fn+".png")
+        csvFP = path.join(self.outputPath, fn+".csv")
+        npzFP = ""
+        if self.flagSaveNPZ: npzFP = path.join(self.outputPath, fn+".npz")
+         
+        ### start saving thread, if it's not running
+        if self.th["save"] == None:
+            self.th["save"] = Thread(target=saveWorker, 
+                                     args=(self.q["save"], 
+                                           self.q["saveRslt"], 
+                                           self.aCache,
+                                           self.nullCache))
+            self.th["save"].start()
+
+        ### send snapshot of the current FlexTiles to the saving thread;
+        ###   PNG encoding, analysis and CSV writing are done there.
+        job = dict(img=self.screenShot(), imgType=wx.BITMAP_TYPE_PNG,
+                   imgFP=imgFP, csvFP=csvFP, ftArr=self.ftArr.copy(), 
+                   ftSeq=[list(x) for x in self.ftSeq], npzFP=npzFP,
+                   meta=dict(tileSz=self.tileSz, version=__version__))
+        self.q["save"].put(job, True, None)
+
+        ### set timer to check results from the saving thread
+        if self.timer["save"] == None:
+            self.timer["save"] = wx.Timer(self)
+            self.Bind(wx.EVT_TIMER,
+                      lambda event: self.onTimer(event, "save"),
+                      self.timer["save"])
+        if not self.timer["save"].IsRunning(): self.timer["save"].Start(100)
     
     #-------------------------------------------------------------------
     
@@ -1121,30 +1494,93 @@ class FlexTilesFrame(wx.Frame):
         if self.flagBlockUI: return
         
         self.flagBlockUI = True # temporarily block user input 
+        self.rotAni = {} # finish rotate animations (angles are already set)
        
         if self.flagKandinsky: # zooming out from Kandinsky mode
             self.panel["lp"].Hide()
             self.flagKandinsky = False
-            self.tileImg = self.tileImgLarge.Copy()
+            self.kD = None # cancel drawing in progress
             tSz = self.initTileSz
-            if self.tileImg.GetSize()[0] != tSz:
-                self.tileImg = self.tileImg.Rescale(
-                                            tSz,
-                                            tSz, 
-                                            wx.IMAGE_QUALITY_HIGH
-                                            ) # resize
-            self.ani = dict(name="zoomOut", targetSz=tSz)
+            # make tile image with drawings at tile size of FlexTiles
+            self.tileImg = self.kDL.getImage(tSz)
+            self.tileBmps = None # tile bitmaps should be made again
+            self.ani = dict(name="zoomOut", startSz=self.tileSz, 
+                            targetSz=tSz, t0=perf_counter())
         else: # zooming into a tile for Kandinsky mode
             tSz = int(self.wSz[1] * 0.75)
             self.initTileSz = copy(self.tileSz) # store original tile size 
-            self.ani = dict(name="zoomIn", targetSz=tSz)
+            self.ani = dict(name="zoomIn", startSz=self.tileSz, 
+                            targetSz=tSz, t0=perf_counter())
         
-        ### set & start timer for animation 
-        self.timer["ani"] = wx.Timer(self)
-        self.Bind(wx.EVT_TIMER,
-                  lambda event: self.onTimer(event, "ani"),
-                  self.timer["ani"])
-        self.timer["ani"].Start(10) 
+        self.startAniTimer() # start timer for animation 
+
+    #-------------------------------------------------------------------
+
+    def onLiveMetrics(self, event):
+        """ Toggle showing live analysis values.
+        
+        Args: event (wx.Event)
+        
+        Returns: None
+        """
+        if DEBUG: print("FlexTilesApp.onLiveMetrics()")
+
+        self.flagLiveMetrics = not self.flagLiveMetrics
+        self.panel["mp"].Refresh()
+
+    #-------------------------------------------------------------------
+
+    def onUndo(self, event):
+        """ Undo the last drawing in Kandinsky mode.
+        Drawing in progress is cancelled first, if there is one.
+        
+        Args: event (wx.Event)
+        
+        Returns: None
+        """
+        if DEBUG: print("FlexTilesApp.onUndo()")
+
+        self.undoRedoKDrawing("undo")
+
+    #-------------------------------------------------------------------
+
+    def onRedo(self, event):
+        """ Redo the last undone drawing in Kandinsky mode.
+        
+        Args: event (wx.Event)
+        
+        Returns: None
+        """
+        if DEBUG: print("FlexTilesApp.onRedo()")
+
+        self.undoRedoKDrawing("redo")
+
+    #-------------------------------------------------------------------
+
+    def undoRedoKDrawing(self, flag):
+        """ Undo or redo a drawing in Kandinsky mode 
+        and re-draw the changed area.
+        
+        Args: 
+            flag (str): 'undo' or 'redo'.
+        
+        Returns: 
+            None
+        """
+        if DEBUG: print("FlexTilesApp.undoRedoKDrawing()")
+
+        if self.flagBlockUI or not self.flagKandinsky: return
+        if self.flagFreePencilDrawing: return
+        if self.kD != None and self.kD["name"] != "pencil":
+            self.kD = None # cancel drawing in progress
+            self.panel["mp"].Refresh()
+            return
+        if flag == "undo": r = self.kUndo.undo(self.tileSz)
+        else: r = self.kUndo.redo(self.tileSz)
+        if r != None:
+            r = wx.Rect(r)
+            r.Offset(self.ftR[0], self.ftR[1])
+            self.panel["mp"].RefreshRect(r, eraseBackground=False)
 
     #-------------------------------------------------------------------
 
@@ -1193,7 +1629,20 @@ class FlexTilesFrame(wx.Frame):
         """
         if DEBUG: print("FlexTilesApp.onClose()")
 
+        self.flagBlockUI = True # no more user input until it's destroyed
         stopAllTimers(self.timer)
+        if self.journal != None:
+            # closed properly; no recovery at the next start
+            self.journal.close(flagRemove=True)
+            self.journal = None
+        if self.th["save"] != None:
+            # finish queued saving jobs and end the saving thread;
+            #   without making null distributions, not to keep the user
+            #   waiting (files are saved without null model results)
+            self.nullCache.cancel()
+            self.q["save"].put(None, True, None)
+            self.th["save"].join()
+            self.th["save"] = None
         wx.CallLater(100, self.Destroy)
 
     #-------------------------------------------------------------------
@@ -26,6 +26,7 @@ with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
 import sys, errno
+from bisect import bisect_left, bisect_right
 from os import path, strerror
 from datetime import datetime
 
@@ -669,6 +670,82 @@ def rot_pt(pt, ct, deg):
 
 #-----------------------------------------------------------------------
 
+def flood_fill(arr, seed, color, tol=0):
+    """ Fill connected (4-neighbours) region of pixels, which have 
+    similar color to the color at the seed point, with the given color.
+    Runs of similar pixels in each row are found with Numpy, 
+    then runs are connected with their overlapping runs 
+    in the rows above and below (scanline algorithm).
+
+    Args:
+        arr (numpy.ndarray): Image array (height x width x 3), 
+          changed in place.
+        seed (tuple): x, y coordinates of the seed point.
+        color (tuple): Color to fill with; (R, G, B).
+        tol (int): Tolerance; maximum difference in each color channel 
+          from the color at the seed point.
+
+    Returns:
+        (None/ tuple): Rect of filled pixels; (x, y, width, height).
+          None, if the seed point is out of the image.
+
+    Examples:
+        >>> arr = np.zeros((10, 10, 3), dtype=np.uint8)
+        >>> arr[:,5] = 255 # vertical line
+        >>> flood_fill(arr, (0, 0), (255, 0, 0))
+        (0, 0, 5, 10)
+    """ 
+    if DEBUG: print("fFuncNClasses.flood_fill()")
+
+    h, w = arr.shape[:2]
+    x, y = seed
+    if not (0 <= x < w and 0 <= y < h): return None
+    sCol = arr[y,x,:3].astype(np.int16)
+    mask = np.all(np.abs(arr[:,:,:3].astype(np.int16)-sCol) <= tol, axis=2)
+
+    ### find runs of similar pixels in each row
+    pad = np.zeros((h, 1), dtype=np.int8)
+    d = np.diff(np.hstack([pad, mask.astype(np.int8), pad]), axis=1)
+    rows, starts = np.nonzero(d == 1) # runs are sorted by row & start
+    ends = np.nonzero(d == -1)[1] # end (exclusive) of each run
+    rowIdx = np.searchsorted(rows, np.arange(h+1)).tolist() # index of 
+      # the first run in each row
+    rowsL = rows.tolist()
+    startsL = starts.tolist()
+    endsL = ends.tolist()
+
+    ### connect runs, starting from the run of the seed point
+    filled = np.zeros(len(startsL), dtype=bool)
+    k = bisect_right(endsL, x, rowIdx[y], rowIdx[y+1])
+    filled[k] = True
+    stack = [k]
+    while len(stack) > 0:
+        k = stack.pop()
+        r = rowsL[k]; s = startsL[k]; e = endsL[k]
+        for nr in [r-1, r+1]:
+            if nr < 0 or nr >= h: continue
+            a = rowIdx[nr]; b = rowIdx[nr+1]
+            # runs in the row, overlapping with [s, e)
+            i1 = bisect_right(endsL, s, a, b)
+            i2 = bisect_left(startsL, e, a, b)
+            for j in range(i1, i2):
+                if not filled[j]:
+                    filled[j] = True
+                    stack.append(j)
+
+    ### fill pixels of connected runs
+    rows = rows[filled]; starts = starts[filled]; ends = ends[filled]
+    y1 = rows.min(); y2 = rows.max() + 1
+    x1 = starts.min(); x2 = ends.max()
+    fm = np.zeros((y2-y1, x2-x1+1), dtype=np.int16)
+    np.add.at(fm, (rows-y1, starts-x1), 1)
+    np.add.at(fm, (rows-y1, ends-x1), -1)
+    fm = np.cumsum(fm, axis=1)[:,:-1] > 0
+    arr[y1:y2,x1:x2,:3][fm] = color
+    return (int(x1), int(y1), int(x2-x1), int(y2-y1))
+
+#-----------------------------------------------------------------------
+
 def receiveDataFromQueue(q, logFile=''):
     """ Receive data from a queue.
 
@@ -4,7 +4,9 @@ Created on Jul 4, 2011
 @author: Martin Vegi Kysel
 '''
 
-import math,re
+import math,re,hashlib
+
+import numpy as np
 
 
 def isprime(n):
@@ -497,6 +499,247 @@ def getSymmetryValues(s, binaryFlag = False, flexTileWidth = 0):
     return values
 
 
+def toAngleArr(a):
+    '''
+    @param a: angle layer of ftArr (rows x columns) or a stack of them (n x rows x columns)
+    @return: the same values as a signed integer numpy array
+    @summary: ftArr is stored as uint16, where (90-x) would wrap around instead of going negative.
+                All array based functions work on the values returned here.
+    '''
+    a = np.asarray(a)
+    if a.ndim < 2:
+        print("toAngleArr ERROR: at least 2 dimensions (rows x columns) are required")
+        return -1
+    return a.astype(np.int32)
+
+
+def invertByAxisArr(a, axis):
+    '''
+    @param a: signed integer array of angles, any shape
+    @param axis: axis of rotation, same definition as in invertByAxis
+    @return: inverted array
+    @summary: array version of invertByAxis
+    '''
+    axis = int(axis)
+    if axis%4==0:
+        return (90-a)%360
+    if axis%4==2:
+        return (270-a)%360
+    if axis%4==1:
+        return (180-a)%360
+    return (-a)%360
+
+
+def getMirrorPartsArr(a, axis):
+    '''
+    @param a: array of values (rows x columns), or a stack of them (n x rows x columns)
+    @param axis: tested axis of symmetry, same definition as in invertByAxis
+    @return: two arrays of the same shape; tiles of one half and their mirrored partners (values not inverted)
+    @summary: array version of the palindrome selection in getHorizontalSymmetry, getVerticalSymmetry,
+                getFirstDiagonalSymmetry and getSecondDiagonalSymmetry.
+                Middle row/column/diagonal is ignored. Diagonal axes require a square matrix.
+    '''
+    rows, cols = a.shape[-2:]
+    
+    # partner of each tile on the other side of the axis;
+    # only the half of the matrix selected by the mask is counted
+    if axis==2:
+        half = int(rows/2)
+        part1 = a[...,0:half,:]
+        part2 = a[...,::-1,:][...,0:half,:]
+    elif axis==0:
+        half = int(cols/2)
+        part1 = a[...,:,0:half]
+        part2 = a[...,:,::-1][...,:,0:half]
+    else:
+        idx = np.arange(rows)
+        if axis==1:
+            # lines parallel to the 1st diagonal, mirrored at their middle
+            mask = np.add.outer(idx,idx) < rows-1
+            part2 = np.swapaxes(a[...,::-1,::-1],-1,-2)[...,mask]
+        else:
+            # lines parallel to the 2nd diagonal, mirrored at their middle
+            mask = np.subtract.outer(idx,idx) > 0
+            part2 = np.swapaxes(a,-1,-2)[...,mask]
+        part1 = a[...,mask]
+    return part1, part2
+
+
+def getMirrorErrorsArr(a, axis, booleanFlag =False):
+    '''
+    @param a: signed integer array of angles (rows x columns), or a stack of them (n x rows x columns)
+    @param axis: tested axis of symmetry, same definition as in invertByAxis
+    @return: number of tiles which do not match their mirrored partner, one value per matrix
+    '''
+    part1, part2 = getMirrorPartsArr(a,axis)
+    if not booleanFlag:
+        part2 = invertByAxisArr(part2,axis)
+    
+    errors = (part1!=part2)
+    return errors.reshape(errors.shape[:a.ndim-2]+(-1,)).sum(axis=-1)
+
+
+def getSymmetryValuesArr(a, binaryFlag = False):
+    '''
+    @param a: angle layer of ftArr (rows x columns), or a stack of them (n x rows x columns)
+    @param binaryFlag: identifies a black-white/binary matrix, no angle aware invertion
+    @return: numpy array of symmetries, the last dimension is
+            [0]: horizontal
+            [1]: vertical
+            [2]: 1st diagonal
+            [3]: 2nd diagonal
+    @summary: array version of getSymmetryValues, computing a whole stack of matrices at once.
+                Diagonal symmetries of a non-square matrix are -1.
+    '''
+    a = toAngleArr(a)
+    if isinstance(a,int):
+        return -1
+    rows, cols = a.shape[-2:]
+    maxError = rows*cols/2.0
+    
+    values = np.empty(a.shape[:-2]+(4,))
+    values[...,0] = 1-getMirrorErrorsArr(a,2,binaryFlag)/maxError
+    values[...,1] = 1-getMirrorErrorsArr(a,0,binaryFlag)/maxError
+    if rows==cols:
+        values[...,2] = 1-getMirrorErrorsArr(a,1,binaryFlag)/maxError
+        values[...,3] = 1-getMirrorErrorsArr(a,3,binaryFlag)/maxError
+    else:
+        values[...,2:] = -1
+    
+    return values
+
+
+def getD4TransformsArr(a):
+    '''
+    @param a: angle layer of ftArr (rows x columns), or a stack of them (n x rows x columns)
+    @return: list of transformed arrays; identity, rotations by 90/180/270 degrees to the right,
+                then the same four after mirroring at the vertical axis
+    @summary: dihedral (D4) transforms of a matrix. Positions and values are rotated together, as in angleAwareRotate,
+                mirrored values are inverted as in invertByAxis (axis 0).
+                A non-square matrix has only 4 transforms keeping its shape; identity, 180, vertical and horizontal mirror.
+    '''
+    a = toAngleArr(a)
+    if isinstance(a,int):
+        return -1
+    rows, cols = a.shape[-2:]
+    mirrored = invertByAxisArr(a[...,:,::-1],0)
+    
+    transforms = []
+    for x in [a, mirrored]:
+        if rows==cols:
+            for i in range(0,4):
+                transforms.append((np.rot90(x,-i,axes=(-2,-1))+90*i)%360)
+        else:
+            transforms.append(x%360)
+            transforms.append((x[...,::-1,::-1]+180)%360)
+    return transforms
+
+
+def packOrientationArr(a):
+    '''
+    @param a: signed integer array of angles (rows x columns), or a stack of them (n x rows x columns)
+    @return: uint8 array, 4 tiles per byte, one row of bytes per matrix
+    @summary: compact encoding of orientations (2 bits per tile, first tile in the highest bits).
+                Comparing packed rows byte by byte orders them as comparing the tiles one by one.
+    '''
+    codes = ((a%360)//90).astype(np.uint8)
+    codes = codes.reshape(codes.shape[:a.ndim-2]+(-1,))
+    n = codes.shape[-1]
+    if n%4!=0:
+        pad = np.zeros(codes.shape[:-1]+(4-n%4,),dtype=np.uint8)
+        codes = np.concatenate((codes,pad),axis=-1)
+    codes = codes.reshape(codes.shape[:-1]+(-1,4))
+    return (codes[...,0]<<6)|(codes[...,1]<<4)|(codes[...,2]<<2)|codes[...,3]
+
+
+def getD4CanonicalArr(a):
+    '''
+    @param a: angle layer of ftArr (rows x columns), or a stack of them (n x rows x columns)
+    @return: packed canonical form (see packOrientationArr) and index of the transform (see getD4TransformsArr) producing it
+    @summary: the canonical form is the smallest packed encoding among all D4 transforms,
+                so matrices which are rotations/reflections of each other share it
+    '''
+    transforms = getD4TransformsArr(a)
+    if transforms==-1:
+        return -1
+    best = packOrientationArr(transforms[0])
+    bestIdx = np.zeros(best.shape[:-1],dtype=np.int8)
+    for i in range(1,len(transforms)):
+        x = packOrientationArr(transforms[i])
+        # lexicographic comparison; the first differing byte decides
+        diff = (x!=best)
+        first = np.argmax(diff,axis=-1)[...,None]
+        smaller = np.take_along_axis(x,first,-1) < np.take_along_axis(best,first,-1)
+        smaller = smaller[...,0] & diff.any(axis=-1)
+        best = np.where(smaller[...,None],x,best)
+        bestIdx[smaller] = i
+    return best, bestIdx
+
+
+def getD4Key(a):
+    '''
+    @param a: angle layer of ftArr (rows x columns), or a stack of them (n x rows x columns)
+    @return: bytes key (list of keys for a stack), equal for matrices which are rotations/reflections of each other
+    '''
+    a = np.asarray(a)
+    rows, cols = a.shape[-2:]
+    prefix = ("%ix%i:"%(rows,cols)).encode()
+    canonical = getD4CanonicalArr(a)[0]
+    if canonical.ndim==1:
+        return prefix+canonical.tobytes()
+    return [prefix+x.tobytes() for x in canonical.reshape(-1,canonical.shape[-1])]
+
+
+def getD4Hash(a):
+    '''
+    @param a: angle layer of ftArr (rows x columns), or a stack of them (n x rows x columns)
+    @return: hex digest of getD4Key (list of digests for a stack)
+    '''
+    keys = getD4Key(a)
+    if isinstance(keys,bytes):
+        return hashlib.blake2b(keys,digest_size=16).hexdigest()
+    return [hashlib.blake2b(x,digest_size=16).hexdigest() for x in keys]
+
+
+def getFinalStateAnalysis(a, binaryFlag = False):
+    '''
+    @param a: angle layer of ftArr (rows x columns)
+    @param binaryFlag: identifies a black-white/binary matrix, no angle aware invertion
+    @return: dictionary of analysis results
+            orientationRatio: ratio of [0,90,180,270] orientations
+            entropy: entropy of the orientation ratio
+            symmetries: [hor,ver,1dia,2dia]
+            translationalSymmetry
+            tileMakerSymmetry
+            rotationalSymmetries: [180,90]
+    @summary: computes every analysis value FlexTiles saves with a final state, rounded to three decimal places
+    '''
+    a = np.asarray(a)
+    rows, cols = a.shape
+    s = [int(x) for x in a.ravel()]
+    
+    # If it's a square matrix, width (number of columns) will be computed in the other functions
+    flexTileWidth = 0
+    if rows!=cols:
+        flexTileWidth = cols
+    
+    # sum over the 4 possible states, representing the probability P of occurrence
+    nStates = 4
+    orientationRatio = [0.0 for i in range(nStates)]
+    for current in s:
+        orientationRatio[int(current/(360/nStates))] += 1
+    orientationRatio = [x/len(s) for x in orientationRatio]
+    
+    results = {}
+    results["orientationRatio"] = orientationRatio
+    results["entropy"] = round(Entropy(orientationRatio),3)
+    results["symmetries"] = roundArray(getSymmetryValuesArr(a,binaryFlag).tolist(),3)
+    results["translationalSymmetry"] = round(1-results["entropy"]/2,3)
+    results["tileMakerSymmetry"] = round(float(getTileMakerSymmetryArr(a)),3)
+    results["rotationalSymmetries"] = roundArray(getRotationalSymmetriesArr(a,binaryFlag).tolist(),3)
+    return results
+
+
 def getTileMakerSymmetry(s, binaryFlag = False,flexTileWidth=0):
     '''
     @param s: input matrix in string format
@@ -619,6 +862,57 @@ def getTileMakerSymmetry(s, binaryFlag = False,flexTileWidth=0):
     return bestFind/maxFinds
     
 
+def getTileMakerSymmetryArr(a):
+    '''
+    @param a: angle layer of ftArr (rows x columns), or a stack of them (n x rows x columns)
+    @return: ratio of tile makers symmetry (array of ratios for a stack)
+    @summary: array version of getTileMakerSymmetry.
+                Every tile becomes a 3 bit code (0-3 for 0/90/180/270, 4 for any other value, which never matches).
+                Each 2x2 block is packed into one 12 bit code, each pair of neighbouring tiles at the boundaries
+                into a 6 bit code, so all 4 orientations of the default matrix are matched in a single comparison.
+    '''
+    a = toAngleArr(a)
+    if isinstance(a,int):
+        return -1
+    rows, cols = a.shape[-2:]
+    n = int(np.prod(a.shape[:-2]))
+    q = np.where((a>=0)&(a<360)&(a%90==0),a//90,4).reshape((n,rows,cols))
+    
+    # full matches inside the matrix, 2x2 submatrices as views shifted by one row/column
+    full = (q[:,:-1,:-1]<<9)|(q[:,:-1,1:]<<6)|(q[:,1:,:-1]<<3)|q[:,1:,1:]
+    # half matches at the boundaries
+    firstRow = (q[:,0,:-1]<<3)|q[:,0,1:]
+    lastRow = (q[:,-1,:-1]<<3)|q[:,-1,1:]
+    firstCol = (q[:,:-1,0]<<3)|q[:,1:,0]
+    lastCol = (q[:,:-1,-1]<<3)|q[:,1:,-1]
+    
+    # codes of the default tilemaker matrix and its rotations, same order as in getTileMakerSymmetry
+    #     0     90
+    #     270   180
+    defaults = np.array([[0,1,3,2],[3,0,2,1],[2,3,1,0],[1,2,0,3]])
+    tl, tr, bl, br = defaults[:,0], defaults[:,1], defaults[:,2], defaults[:,3]
+    
+    def countCodes(codes, refs):
+        return (codes.reshape((n,-1,1))==refs).sum(axis=1)
+    
+    finds = countCodes(full,(tl<<9)|(tr<<6)|(bl<<3)|br).astype(float)
+    # boundary pairs must match the opposite row/column of the default matrix
+    finds += 0.5*countCodes(firstRow,(bl<<3)|br)
+    finds += 0.5*countCodes(lastRow,(tl<<3)|tr)
+    finds += 0.5*countCodes(firstCol,(tr<<3)|br)
+    finds += 0.5*countCodes(lastCol,(tl<<3)|bl)
+    # quarter matches, corners must match the opposite corner of the default matrix
+    finds += 0.25*(q[:,0,0][:,None]==br)
+    finds += 0.25*(q[:,0,-1][:,None]==bl)
+    finds += 0.25*(q[:,-1,0][:,None]==tr)
+    finds += 0.25*(q[:,-1,-1][:,None]==tl)
+    
+    # the maximal number of possible matches. Half and quarter finds possible
+    maxFinds = (cols/2.0)*(rows/2.0)
+    ratio = finds.max(axis=1)/maxFinds
+    return ratio.reshape(a.shape[:-2])[()]
+
+
 def getRotationalSymmetries(s, binaryFlag =False, flexTileWidth=0):
     '''
     @param s: input matrix
@@ -705,6 +999,225 @@ def getRotationalSymmetries(s, binaryFlag =False, flexTileWidth=0):
     
     return values
 
+def getRotationalComparisons(rows, cols, binaryFlag =False):
+    '''
+    @param rows, cols: size of the matrix
+    @param binaryFlag: identifies a black-white/binary matrix, no angle aware rotation
+    @return: list of comparisons and a 2 x len(comparisons) array of weights
+                comparison: [positionsX, positionsY, valueOffset]
+                    the comparison fails (ratio -1) if positionsX is None
+                weights: ratio of rotational symmetry [180,90] is the weighted sum of the comparison ratios
+    @summary: positions compared by getRotationalSymmetries, found by running its own
+                position handling (divideMatrixIntoTwoTimesTwo, rotate) on a list of position indices.
+                Position i of X with value rotated by valueOffset is compared with position i of Y.
+    '''
+    isSquare = rows==cols
+    flexTileWidth = 0
+    if not isSquare:
+        flexTileWidth = cols
+    submatrices = divideMatrixIntoTwoTimesTwo(list(range(rows*cols)),flexTileWidth)
+    if isinstance(submatrices,int):
+        # no possible division (such as 1xN with a prime N); all comparisons fail,
+        # so both values are -1 as getRotationalSymmetries returns -1
+        return [[None,None,0],[None,None,0]], np.full((2,2),0.5)
+    
+    def compare(x,y,rotation):
+        # same position handling as getRatioOfEquivalenceByRotation
+        if len(x)!=len(y) or len(x)==0:
+            return [None,None,0]
+        rotation = int(rotation/90)
+        isSquareSub = math.sqrt(len(x))%1==0.0
+        if isSquareSub and rotation==1:
+            x = rotate(x)
+        elif rotation==2:
+            x = x[::-1]
+        offset = 0
+        if not binaryFlag:
+            for _ in range(0,rotation):
+                if isSquareSub:
+                    x = rotate(x)
+            offset = 90*rotation
+        return [np.array(x),np.array(y),offset]
+    
+    comparisons = []
+    comparisons.append(compare(submatrices[0],submatrices[3],180))
+    comparisons.append(compare(submatrices[1],submatrices[2],180))
+    weights180 = [0.5,0.5]
+    weights90 = []
+    if isSquare:
+        comparisons.append(compare(submatrices[0],submatrices[1],90))
+        comparisons.append(compare(submatrices[1],submatrices[3],90))
+        comparisons.append(compare(submatrices[3],submatrices[2],90))
+        comparisons.append(compare(submatrices[2],submatrices[0],90))
+        weights90 = [1,1,1,1,1,1]
+        if len(submatrices[4])!=0:
+            impact = 1.0/(rows/2)
+            comparisons.append(compare(submatrices[4],submatrices[5],90))
+            comparisons.append(compare(submatrices[5],submatrices[6],90))
+            comparisons.append(compare(submatrices[6],submatrices[7],90))
+            comparisons.append(compare(submatrices[7],submatrices[4],90))
+            comparisons.append(compare(submatrices[4],submatrices[6],180))
+            comparisons.append(compare(submatrices[5],submatrices[7],180))
+            weights90 += [impact for i in range(0,6)]
+        weights90 = [w/sum(weights90) for w in weights90]
+    
+    weights = np.zeros((2,len(comparisons)))
+    weights[0,0:2] = weights180
+    weights[1,0:len(weights90)] = weights90
+    return comparisons, weights
+
+
+def getRotationalSymmetriesArr(a, binaryFlag =False):
+    '''
+    @param a: angle layer of ftArr (rows x columns), or a stack of them (n x rows x columns)
+    @param binaryFlag: identifies a black-white/binary matrix, no angle aware rotation
+    @return: numpy array of rotational symmetries, the last dimension is [180,90]
+    @summary: array version of getRotationalSymmetries. 90 is -1 for a non-square matrix.
+    '''
+    a = toAngleArr(a)
+    if isinstance(a,int):
+        return -1
+    rows, cols = a.shape[-2:]
+    flat = a.reshape(a.shape[:-2]+(rows*cols,))
+    comparisons, weights = getRotationalComparisons(rows,cols,binaryFlag)
+    
+    ratios = np.empty(a.shape[:-2]+(len(comparisons),))
+    for i in range(0,len(comparisons)):
+        x, y, offset = comparisons[i]
+        if x is None:
+            ratios[...,i] = -1
+            continue
+        valuesX = flat[...,x]
+        if not binaryFlag:
+            valuesX = (valuesX+offset)%360
+        ratios[...,i] = 1-(valuesX!=flat[...,y]).sum(axis=-1)/float(len(x))
+    
+    values = ratios.dot(weights.T)
+    if rows!=cols:
+        values[...,1] = -1
+    return values
+
+
+class LiveAnalysis:
+    '''
+    @summary: running counts behind entropy, orientation ratio, mirror symmetries and rotational symmetries of a matrix.
+                Each tile is compared with a fixed set of partners (its mirrored tiles and its tiles in the rotational comparisons),
+                so changing one tile only re-checks these pairs instead of analysing the whole matrix again.
+    '''
+    
+    def __init__(self, a, binaryFlag =False):
+        '''
+        @param a: angle layer of ftArr (rows x columns)
+        @param binaryFlag: identifies a black-white/binary matrix, no angle aware invertion/rotation
+        '''
+        a = np.asarray(a)
+        self.rows, self.cols = a.shape
+        self.binaryFlag = binaryFlag
+        self.s = [int(x) for x in a.ravel()]
+        n = len(self.s)
+        positions = np.arange(n).reshape((self.rows,self.cols))
+        
+        # groups of compared pairs; [positions i, positions j, sign, value offset]
+        # a pair fails if s[i] differs from (sign*s[j]+offset)%360;
+        # mirrored values are inverted as in invertByAxis, rotated values are shifted
+        axisOffsets = {0:90, 2:270, 1:180, 3:0}
+        self.groups = []
+        for axis in [2,0,1,3]:
+            if axis in [1,3] and self.rows!=self.cols:
+                continue
+            part1, part2 = getMirrorPartsArr(positions,axis)
+            self.groups.append([part1.ravel().tolist(),part2.ravel().tolist(),-1,axisOffsets[axis]])
+        self.nMirrorGroups = len(self.groups)
+        comparisons, self.rotWeights = getRotationalComparisons(self.rows,self.cols,binaryFlag)
+        for x, y, offset in comparisons:
+            if x is None:
+                self.groups.append([[],[],1,0])
+            else:
+                self.groups.append([y.tolist(),x.tolist(),1,offset])
+        
+        # pairs each tile takes part in; [group index, pair index]
+        self.partners = [[] for i in range(0,n)]
+        for g in range(0,len(self.groups)):
+            posI, posJ = self.groups[g][0:2]
+            for k in range(0,len(posI)):
+                self.partners[posI[k]].append((g,k))
+                self.partners[posJ[k]].append((g,k))
+        
+        self.counts = [0,0,0,0]
+        for current in self.s:
+            self.counts[self.stateIdx(current)] += 1
+        self.errors = [0 for g in self.groups]
+        for g in range(0,len(self.groups)):
+            for k in range(0,len(self.groups[g][0])):
+                self.errors[g] += self.isError(g,k)
+    
+    def stateIdx(self, angle):
+        '''
+        @param angle: angle of a tile
+        @return: index of the state in the orientation ratio [0,90,180,270]
+        '''
+        return int((angle%360)/90)
+    
+    def isError(self, g, k):
+        '''
+        @param g: group index
+        @param k: pair index in the group
+        @return: 1 if the pair does not match, otherwise 0
+        '''
+        posI, posJ, sign, offset = self.groups[g]
+        x = self.s[posI[k]]
+        y = self.s[posJ[k]]
+        if not self.binaryFlag:
+            y = (sign*y+offset)%360
+        return int(x!=y)
+    
+    def update(self, ri, ci, angle):
+        '''
+        @param ri, ci: row and column index of the changed tile
+        @param angle: new angle of the tile
+        @summary: updates running counts, touching only the pairs of this tile
+        '''
+        p = ri*self.cols+ci
+        angle = int(angle)
+        partners = self.partners[p]
+        for g, k in partners:
+            self.errors[g] -= self.isError(g,k)
+        self.counts[self.stateIdx(self.s[p])] -= 1
+        self.s[p] = angle
+        self.counts[self.stateIdx(angle)] += 1
+        for g, k in partners:
+            self.errors[g] += self.isError(g,k)
+    
+    def getValues(self):
+        '''
+        @return: dictionary of analysis values with the same keys as getFinalStateAnalysis
+                (without tileMakerSymmetry), not rounded
+        '''
+        n = float(len(self.s))
+        values = {}
+        values["orientationRatio"] = [x/n for x in self.counts]
+        values["entropy"] = Entropy(values["orientationRatio"])
+        values["translationalSymmetry"] = 1-values["entropy"]/2
+        
+        symmetries = [1-self.errors[g]/(n/2) for g in range(0,self.nMirrorGroups)]
+        if self.rows!=self.cols:
+            symmetries += [-1,-1]
+        values["symmetries"] = symmetries
+        
+        ratios = []
+        for g in range(self.nMirrorGroups,len(self.groups)):
+            nPairs = len(self.groups[g][0])
+            if nPairs==0:
+                ratios.append(-1)
+            else:
+                ratios.append(1-self.errors[g]/float(nPairs))
+        rotational = self.rotWeights.dot(ratios).tolist()
+        if self.rows!=self.cols:
+            rotational[1] = -1
+        values["rotationalSymmetries"] = rotational
+        return values
+
+
 def getRatioOfEquivalenceByRotation(x,y,rotation, binaryFlag = False):
     '''
     @param x: input matrix
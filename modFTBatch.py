@@ -0,0 +1,197 @@
+# coding: UTF-8
+"""
+Headless batch analysis of saved FlexTiles sessions (ft_*.csv).
+Every session file in a folder is parsed and its final state is
+analyzed again with modFTAnalysis, using a pool of processes.
+Results are written in one CSV table.
+
+Dependency:
+    Numpy (1.17),
+
+------------------------------------------------------------------------
+Copyright (C) 2020 Jinook Oh & Tecumseh Fitch
+- Contact: jinook0707@gmail.com, tecumseh.fitch@univie.ac.at
+
+This program is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by the
+Free Software Foundation, either version 3 of the License, or (at your
+option) any later version.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program.  If not, see <http://www.gnu.org/licenses/>.
+------------------------------------------------------------------------
+"""
+
+from os import path, cpu_count
+from glob import glob
+from time import time, strftime
+from multiprocessing import Pool
+
+from modFTSession import readSessionCSV
+from modFTCache import AnalysisCache
+import modFTAnalysis as ftA
+
+DEBUG = False
+CACHE = None # AnalysisCache of this process, set in initWorker
+
+# columns of the result table
+COLUMNS = ["file", "rows", "cols", "nClicks",
+           "entropy", "ratio0", "ratio90", "ratio180", "ratio270",
+           "symHor", "symVer", "sym1Dia", "sym2Dia",
+           "translationalSym", "tileMakerSym", "rotSym180", "rotSym90",
+           "d4Hash", "error"]
+
+#-----------------------------------------------------------------------
+
+def initWorker(cacheFP=""):
+    """ Initialize a worker process with its own analysis cache.
+    The persistent cache file is only read in workers;
+    new results are written by the main process.
+
+    Args:
+        cacheFP (str): File path of persistent cache.
+          Empty string means memory only.
+
+    Returns:
+        None
+    """
+    if DEBUG: print("modFTBatch.initWorker()")
+
+    global CACHE
+    CACHE = AnalysisCache(10000, cacheFP, readOnly=True)
+
+#-----------------------------------------------------------------------
+
+def analyzeSessionFile(fp):
+    """ Parse a session CSV file and analyze its final state.
+    This runs in worker processes of the pool.
+
+    Args:
+        fp (str): File path of the session CSV file.
+
+    Returns:
+        rslt (dict): One row of the result table (keys are in COLUMNS).
+
+    Examples:
+        >>> analyzeSessionFile('output/ft_20200501120000.csv')['rows']
+        8
+    """
+    if DEBUG: print("modFTBatch.analyzeSessionFile()")
+
+    rslt = dict(file=path.basename(fp), error="")
+    try:
+        sess = readSessionCSV(fp)
+        ftArr = sess["ftArr"]
+        if CACHE == None:
+            aRslt = ftA.getFinalStateAnalysis(ftArr[:,:,0])
+        else:
+            key = CACHE.makeKey("getFinalStateAnalysis", ftArr[:,:,0])
+            aRslt = CACHE.get(key)
+            if aRslt == None:
+                aRslt = ftA.getFinalStateAnalysis(ftArr[:,:,0])
+                CACHE.put(key, aRslt)
+                # to be stored by main process
+                rslt["newCacheItem"] = (key, aRslt)
+        rslt["rows"], rslt["cols"] = ftArr.shape[:2]
+        rslt["nClicks"] = sess["nSeq"]
+        rslt["entropy"] = aRslt["entropy"]
+        for i, deg in enumerate([0, 90, 180, 270]):
+            rslt["ratio%i"%(deg)] = aRslt["orientationRatio"][i]
+        for i, k in enumerate(["symHor", "symVer", "sym1Dia", "sym2Dia"]):
+            rslt[k] = aRslt["symmetries"][i]
+        rslt["translationalSym"] = aRslt["translationalSymmetry"]
+        rslt["tileMakerSym"] = aRslt["tileMakerSymmetry"]
+        rslt["rotSym180"], rslt["rotSym90"] = aRslt["rotationalSymmetries"]
+        # same for final states which are rotations/reflections of each other
+        rslt["d4Hash"] = ftA.getD4Hash(ftArr[:,:,0])
+    except Exception as e:
+        # row of a file, which can't be read or analyzed, 
+        #   has only its file name and error
+        rslt = dict(file=path.basename(fp))
+        rslt["error"] = str(e).replace(",", ";") # keep table columns
+    return rslt
+
+#-----------------------------------------------------------------------
+
+def analyzeDir(dirPath, nProc=None, outFP="", cacheFP=""):
+    """ Analyze all session CSV files in a folder and
+    write one CSV table of results.
+
+    Args:
+        dirPath (str): Folder containing ft_*.csv files.
+        nProc (None/ int): Number of processes.
+          None means number of CPU cores.
+        outFP (str, optional): File path of the result table.
+          If empty, 'analysis_[timestamp].csv' is written in dirPath.
+        cacheFP (str, optional): File path of persistent analysis cache.
+          Final states found in it are not analyzed again.
+
+    Returns:
+        outFP (str): File path of the written result table.
+
+    Examples:
+        >>> analyzeDir('output', 4)
+        'output/analysis_2020_05_01_12_00_00.csv'
+    """
+    if DEBUG: print("modFTBatch.analyzeDir()")
+
+    fps = sorted(glob(path.join(dirPath, "ft_*.csv")))
+    if nProc == None: nProc = cpu_count()
+    nProc = max(1, min(nProc, len(fps)))
+    if outFP == "":
+        ts = strftime("%Y_%m_%d_%H_%M_%S") # same as modFFC.get_time_stamp
+        outFP = path.join(dirPath, "analysis_%s.csv"%(ts))
+
+    startTime = time()
+    # cache in main process; creates the persistent file before workers
+    #   open it, and stores results calculated in workers
+    cache = AnalysisCache(0, cacheFP)
+    rows = []
+    if len(fps) > 0:
+        # a few chunks per process; large enough to keep IPC small,
+        #   small enough to balance the load between processes
+        chunkSz = max(1, int(len(fps) / (nProc*4)))
+        if nProc == 1:
+            initWorker(cacheFP)
+            rows = [analyzeSessionFile(fp) for fp in fps]
+        else:
+            pool = Pool(nProc, initWorker, (cacheFP,))
+            rows = list(pool.imap(analyzeSessionFile, fps, chunkSz))
+            pool.close()
+            pool.join()
+    nAnalyzed = 0
+    for rslt in rows:
+        if "newCacheItem" in rslt:
+            cache.put(rslt["newCacheItem"][0], rslt["newCacheItem"][1])
+            nAnalyzed += 1
+    cache.close()
+
+    ### write result table
+    lines = [", ".join(COLUMNS)]
+    for rslt in rows:
+        lines.append(", ".join([str(rslt.get(k, "")) for k in COLUMNS]))
+    fh = open(outFP, 'w')
+    fh.write("\n".join(lines) + "\n")
+    fh.close()
+
+    nErr = len([r for r in rows if r["error"] != ""])
+    nDistinct = len(set([r["d4Hash"] for r in rows if r["error"] == ""]))
+    msg = "Analyzed %i session files (%i failed) "%(len(rows), nErr)
+    msg += "with %i processes in %.3f seconds.\n"%(nProc, time()-startTime)
+    msg += "%i final states were analyzed, "%(nAnalyzed)
+    msg += "others were found in the analysis cache.\n"
+    msg += "%i distinct final states, "%(nDistinct)
+    msg += "up to rotation and reflection.\n"
+    msg += "Results were written in %s"%(outFP)
+    print(msg)
+    return outFP
+
+#-----------------------------------------------------------------------
+
+if __name__ == '__main__':
+    pass
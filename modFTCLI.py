@@ -0,0 +1,125 @@
+# coding: UTF-8
+"""
+Headless command line tools of FlexTiles; batch analysis,
+session catalogue and null distributions.
+This module doesn't import wxPython, so the tools run without it.
+flexTiles.py dispatches its '--' options here before importing
+wxPython; this module can be also run directly.
+
+Usage:
+    python modFTCLI.py --analyze [folder] [number of processes]
+      [cache file]
+    python modFTCLI.py --null [rows] [columns] [number of boards]
+    python modFTCLI.py --enumerate [rows] [columns] [number of processes]
+    python modFTCLI.py --index [folder] [index file]
+    python modFTCLI.py --query "symHor > 0.9 AND nClicks > 200"
+      [index file]
+
+Dependency:
+    Numpy (1.17),
+
+------------------------------------------------------------------------
+Copyright (C) 2020 Jinook Oh & Tecumseh Fitch
+- Contact: jinook0707@gmail.com, tecumseh.fitch@univie.ac.at
+
+This program is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by the
+Free Software Foundation, either version 3 of the License, or (at your
+option) any later version.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program.  If not, see <http://www.gnu.org/licenses/>.
+------------------------------------------------------------------------
+"""
+
+from sys import argv
+from os import getcwd, path
+
+DEBUG = False
+USAGE = __doc__[__doc__.index("Usage:"):__doc__.index("Dependency:")]
+
+#-----------------------------------------------------------------------
+
+def runCLI(args):
+    """ Run a command line tool.
+
+    Args:
+        args (list): Command line arguments without the program name;
+          the first one is the option such as '--analyze'.
+
+    Returns:
+        None
+    """
+    if DEBUG: print("modFTCLI.runCLI()")
+
+    if len(args) == 0:
+        print(USAGE)
+        return
+    if args[0] == '--analyze':
+    # headless analysis of saved sessions;
+    #   --analyze [folder] [number of processes] [persistent cache file]
+        import modFTBatch
+        if len(args) > 1: dirPath = args[1]
+        else: dirPath = path.join(getcwd(), "output")
+        nProc = None
+        if len(args) > 2: nProc = int(args[2])
+        cacheFP = ""
+        if len(args) > 3: cacheFP = args[3]
+        modFTBatch.analyzeDir(dirPath, nProc, "", cacheFP)
+    elif args[0] == '--null':
+    # precompute null distribution of a grid size with all cores;
+    #   --null [rows] [columns] [number of boards]
+        import modFTNull
+        rows = int(args[1])
+        cols = int(args[2])
+        n = 100000
+        if len(args) > 3: n = int(args[3])
+        dirPath = path.join(getcwd(), "output", "null")
+        modFTNull.precomputeNullDist(dirPath, rows, cols, n)
+    elif args[0] == '--enumerate':
+    # exact table of analysis values of a small grid;
+    #   --enumerate [rows] [columns] [number of processes]
+        import modFTEnum
+        rows = int(args[1])
+        cols = int(args[2])
+        nProc = None
+        if len(args) > 3: nProc = int(args[3])
+        dirPath = path.join(getcwd(), "output", "null")
+        try: modFTEnum.writeExactTable(dirPath, rows, cols, nProc)
+        except ValueError as e: print(str(e)) # grid can't be enumerated
+    elif args[0] == '--index':
+    # create/update SQLite catalogue of saved sessions;
+    #   --index [folder] [index file]
+        import modFTIndex
+        if len(args) > 1: dirPath = args[1]
+        else: dirPath = path.join(getcwd(), "output")
+        dbFP = ""
+        if len(args) > 2: dbFP = args[2]
+        modFTIndex.indexDir(dirPath, dbFP)
+    elif args[0] == '--query':
+    # query the catalogue;
+    #   --query "symHor > 0.9 AND nClicks > 200" [index file]
+        if len(args) < 2:
+            print(USAGE)
+            return
+        import sqlite3
+        import modFTIndex
+        if len(args) > 2: dbFP = args[2]
+        else: dbFP = path.join(getcwd(), "output", modFTIndex.INDEX_FN)
+        try: modFTIndex.queryIndex(args[1], dbFP)
+        except sqlite3.Error as e:
+        # wrong condition or index file
+            print("Query failed (%s): %s\n"%(dbFP, str(e)))
+            print(USAGE)
+    else:
+        print(USAGE)
+
+#-----------------------------------------------------------------------
+
+if __name__ == '__main__':
+    runCLI(argv[1:])
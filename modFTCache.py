@@ -0,0 +1,322 @@
+# coding: UTF-8
+"""
+Memoizing cache for modFTAnalysis results.
+Results are keyed by a hash of the angle layer (shape and values) of
+a final state, kept in memory with LRU eviction, and optionally
+in a persistent SQLite file, so that repeated batch runs
+skip analysis of final states they have already seen.
+
+Dependency:
+    Numpy (1.17),
+
+------------------------------------------------------------------------
+Copyright (C) 2020 Jinook Oh & Tecumseh Fitch
+- Contact: jinook0707@gmail.com, tecumseh.fitch@univie.ac.at
+
+This program is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by the
+Free Software Foundation, either version 3 of the License, or (at your
+option) any later version.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program.  If not, see <http://www.gnu.org/licenses/>.
+------------------------------------------------------------------------
+"""
+
+import json, sqlite3, hashlib
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+import modFTAnalysis as ftA
+
+DEBUG = False
+
+#-----------------------------------------------------------------------
+
+def getAnalysisVersion():
+    """ Version of analysis results; hash of the modFTAnalysis file,
+    so that cached results are not used after analysis is changed.
+
+    Args: None
+
+    Returns:
+        (str): Hex digest.
+    """
+    fh = open(ftA.__file__, 'rb')
+    h = hashlib.blake2b(fh.read(), digest_size=8)
+    fh.close()
+    return h.hexdigest()
+
+ANALYSIS_VERSION = getAnalysisVersion() # part of cache keys
+
+#=======================================================================
+
+class AnalysisCache:
+    """ LRU cache around modFTAnalysis entry points.
+    Keys include ANALYSIS_VERSION; results of a previous version 
+    in the SQLite file are removed, when it's opened for writing.
+
+    Args:
+        maxSize (int): Maximum number of results kept in memory.
+        dbFP (str, optional): File path of SQLite file for
+          persistent cache. Empty string means memory only.
+        readOnly (bool, optional): Only read from the SQLite file
+          (for worker processes sharing one file).
+
+    Attributes:
+        mem (OrderedDict): Results in memory, least recently used first.
+        db (None/ sqlite3.Connection): Persistent cache.
+        nHits, nDiskHits, nMisses (int): Counters of lookups.
+
+    Examples:
+        >>> cache = AnalysisCache(1000, 'output/analysis_cache.sqlite')
+        >>> rslt = cache.getFinalStateAnalysis(ftArr[:,:,0])
+        >>> cache.close()
+    """
+    def __init__(self, maxSize=10000, dbFP="", readOnly=False):
+        if DEBUG: print("AnalysisCache.__init__()")
+
+        self.maxSize = maxSize
+        self.mem = OrderedDict()
+        self.db = None
+        self.readOnly = readOnly
+        self.nPendingWrites = 0 # number of writes not committed yet
+        self.nHits = 0
+        self.nDiskHits = 0
+        self.nMisses = 0
+        if dbFP != "":
+            if readOnly:
+                # URI of the path, so that '?', '#' or '%' in it are escaped
+                uri = Path(dbFP).resolve().as_uri() + "?mode=ro"
+                self.db = sqlite3.connect(uri, uri=True)
+            else:
+                self.db = sqlite3.connect(dbFP)
+                self.db.execute("CREATE TABLE IF NOT EXISTS cache " + \
+                                "(key TEXT PRIMARY KEY, value TEXT)")
+                self.db.execute("CREATE TABLE IF NOT EXISTS meta " + \
+                                "(name TEXT PRIMARY KEY, value TEXT)")
+                row = self.db.execute("SELECT value FROM meta WHERE " + \
+                                      "name='analysisVersion'").fetchone()
+                if row == None or row[0] != ANALYSIS_VERSION:
+                # results of another analysis version can't be used
+                    self.db.execute("DELETE FROM cache")
+                    self.db.execute("INSERT OR REPLACE INTO meta " + \
+                                    "VALUES ('analysisVersion', ?)",
+                                    (ANALYSIS_VERSION,))
+                self.db.commit()
+
+    #-------------------------------------------------------------------
+
+    def makeKey(self, name, a, binaryFlag=False):
+        """ Make key for a result.
+
+        Args:
+            name (str): Name of the analysis function.
+            a (numpy.ndarray): Angle layer of ftArr (rows x columns).
+            binaryFlag (bool): Binary flag of the analysis function.
+
+        Returns:
+            (str): Hex digest of analysis version, name, flag, shape 
+              and values.
+        """
+        if DEBUG: print("AnalysisCache.makeKey()")
+
+        a = np.ascontiguousarray(a, dtype=np.int16)
+        h = hashlib.blake2b(digest_size=16)
+        h.update(("%s:%s:%i:%ix%i:"%(ANALYSIS_VERSION, name, binaryFlag,
+                                     a.shape[0], a.shape[1])).encode())
+        h.update(a.tobytes())
+        return h.hexdigest()
+
+    #-------------------------------------------------------------------
+
+    def get(self, key):
+        """ Get a cached result.
+
+        Args:
+            key (str): Key made by makeKey.
+
+        Returns:
+            (None/ any): Cached result or None.
+        """
+        if DEBUG: print("AnalysisCache.get()")
+
+        if key in self.mem:
+            self.mem.move_to_end(key)
+            self.nHits += 1
+            return self.mem[key]
+        if self.db != None:
+            row = self.db.execute("SELECT value FROM cache WHERE key=?",
+                                  (key,)).fetchone()
+            if row != None:
+                self.nDiskHits += 1
+                value = json.loads(row[0])
+                self.put(key, value, False)
+                return value
+        self.nMisses += 1
+        return None
+
+    #-------------------------------------------------------------------
+
+    def put(self, key, value, flagDisk=True):
+        """ Store a result.
+
+        Args:
+            key (str): Key made by makeKey.
+            value (any): JSON serializable result.
+            flagDisk (bool): Also store it in the SQLite file.
+
+        Returns:
+            None
+        """
+        if DEBUG: print("AnalysisCache.put()")
+
+        self.mem[key] = value
+        self.mem.move_to_end(key)
+        while len(self.mem) > self.maxSize:
+            self.mem.popitem(last=False) # evict least recently used
+        if flagDisk and self.db != None and not self.readOnly:
+            self.db.execute("INSERT OR REPLACE INTO cache VALUES (?,?)",
+                            (key, json.dumps(value)))
+            self.nPendingWrites += 1
+            if self.nPendingWrites >= 1000: self.commit()
+
+    #-------------------------------------------------------------------
+
+    def cached(self, name, a, binaryFlag, func):
+        """ Return cached result of func, calculate it if not cached.
+
+        Args:
+            name (str): Name of the analysis function.
+            a (numpy.ndarray): Angle layer of ftArr (rows x columns).
+            binaryFlag (bool): Binary flag of the analysis function.
+            func (function): Function to calculate the result with.
+
+        Returns:
+            (any): Result.
+        """
+        key = self.makeKey(name, a, binaryFlag)
+        value = self.get(key)
+        if value == None:
+            value = func()
+            self.put(key, value)
+        return value
+
+    #-------------------------------------------------------------------
+
+    def getSymmetryValues(self, a, binaryFlag=False):
+        """ Cached modFTAnalysis.getSymmetryValues
+
+        Args:
+            a (numpy.ndarray): Angle layer of ftArr (rows x columns).
+            binaryFlag (bool): Binary flag.
+
+        Returns:
+            (list): [hor, ver, 1dia, 2dia]
+        """
+        return self.cached("getSymmetryValues", a, binaryFlag,
+            lambda: ftA.getSymmetryValuesArr(a, binaryFlag).tolist())
+
+    #-------------------------------------------------------------------
+
+    def getRotationalSymmetries(self, a, binaryFlag=False):
+        """ Cached modFTAnalysis.getRotationalSymmetries
+
+        Args:
+            a (numpy.ndarray): Angle layer of ftArr (rows x columns).
+            binaryFlag (bool): Binary flag.
+
+        Returns:
+            (list): [180, 90]
+        """
+        return self.cached("getRotationalSymmetries", a, binaryFlag,
+            lambda: ftA.getRotationalSymmetriesArr(a, binaryFlag).tolist())
+
+    #-------------------------------------------------------------------
+
+    def getTileMakerSymmetry(self, a):
+        """ Cached modFTAnalysis.getTileMakerSymmetry
+
+        Args:
+            a (numpy.ndarray): Angle layer of ftArr (rows x columns).
+
+        Returns:
+            (float): Ratio of tile makers symmetry.
+        """
+        return self.cached("getTileMakerSymmetry", a, False,
+            lambda: float(ftA.getTileMakerSymmetryArr(a)))
+
+    #-------------------------------------------------------------------
+
+    def Entropy(self, a):
+        """ Cached modFTAnalysis.Entropy of the orientation ratio
+        of a final state.
+
+        Args:
+            a (numpy.ndarray): Angle layer of ftArr (rows x columns).
+
+        Returns:
+            (float): Entropy value in bits.
+        """
+        def calc():
+            counts = np.bincount((np.asarray(a).ravel()%360)//90,
+                                 minlength=4)
+            return ftA.Entropy((counts/float(counts.sum())).tolist())
+        return self.cached("Entropy", a, False, calc)
+
+    #-------------------------------------------------------------------
+
+    def getFinalStateAnalysis(self, a, binaryFlag=False):
+        """ Cached modFTAnalysis.getFinalStateAnalysis
+
+        Args:
+            a (numpy.ndarray): Angle layer of ftArr (rows x columns).
+            binaryFlag (bool): Binary flag.
+
+        Returns:
+            (dict): Analysis results.
+        """
+        return self.cached("getFinalStateAnalysis", a, binaryFlag,
+            lambda: ftA.getFinalStateAnalysis(a, binaryFlag))
+
+    #-------------------------------------------------------------------
+
+    def commit(self):
+        """ Commit pending writes to the SQLite file.
+
+        Args: None
+
+        Returns: None
+        """
+        if DEBUG: print("AnalysisCache.commit()")
+
+        if self.db != None and not self.readOnly: self.db.commit()
+        self.nPendingWrites = 0
+
+    #-------------------------------------------------------------------
+
+    def close(self):
+        """ Commit and close the SQLite file.
+
+        Args: None
+
+        Returns: None
+        """
+        if DEBUG: print("AnalysisCache.close()")
+
+        if self.db != None:
+            self.commit()
+            self.db.close()
+            self.db = None
+
+#=======================================================================
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,486 @@
+# coding: UTF-8
+"""
+Tools for working with a corpus of FlexTiles final states;
+an index of patterns (PatternIndex) and an on-disk,
+memory-mapped store of states and click sequences (CorpusStore).
+
+Dependency:
+    Numpy (1.17),
+
+------------------------------------------------------------------------
+Copyright (C) 2020 Jinook Oh & Tecumseh Fitch
+- Contact: jinook0707@gmail.com, tecumseh.fitch@univie.ac.at
+
+This program is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by the
+Free Software Foundation, either version 3 of the License, or (at your
+option) any later version.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program.  If not, see <http://www.gnu.org/licenses/>.
+------------------------------------------------------------------------
+"""
+
+import os, json
+from os import path
+
+import numpy as np
+
+import modFTAnalysis as ftA
+from modFTSession import SEQ_DTYPE, loadSessionCSV, loadSessionNPZ
+
+DEBUG = False
+STORE_VERSION = 1 # format version of CorpusStore
+# side table of CorpusStore; one row per state
+TABLE_DTYPE = np.dtype([("seqOffset", "<u8"), # offset into click sequences
+                        ("nClicks", "<u4"), # number of clicks
+                        ("duration", "<f8"), # time of the last click
+                        ("label", "S48")]) # such as file name
+
+#=======================================================================
+
+class PatternIndex:
+    """ Hash-based index of final states.
+    Patterns are grouped by their exact state and by their D4-canonical
+    form (modFTAnalysis.getD4Key), so finding duplicates or
+    rotated/reflected equivalents of a pattern is a dictionary lookup
+    instead of comparing it with every other pattern.
+
+    Args:
+        None
+
+    Attributes:
+        exact (dict): Exact state key -> list of labels.
+        classes (dict): D4-canonical key -> list of labels.
+        nPatterns (int): Number of added patterns.
+
+    Examples:
+        >>> pIdx = PatternIndex()
+        >>> pIdx.add(ftArr[:,:,0], 'ft_20200501120000.csv')
+        (True, True)
+        >>> pIdx.nDistinct()
+        1
+    """
+    def __init__(self):
+        if DEBUG: print("PatternIndex.__init__()")
+
+        self.exact = {}
+        self.classes = {}
+        self.nPatterns = 0
+
+    #-------------------------------------------------------------------
+
+    def exactKeys(self, arr):
+        """ Keys of exact states (shape and packed orientations).
+
+        Args:
+            arr (numpy.ndarray): Stack of angle layers
+              (n x rows x columns).
+
+        Returns:
+            (list): Bytes keys.
+        """
+        if DEBUG: print("PatternIndex.exactKeys()")
+
+        rows, cols = arr.shape[-2:]
+        prefix = ("%ix%i:"%(rows, cols)).encode()
+        packed = ftA.packOrientationArr(ftA.toAngleArr(arr))
+        return [prefix+x.tobytes() for x in packed]
+
+    #-------------------------------------------------------------------
+
+    def add(self, a, label=None):
+        """ Add a pattern to the index.
+
+        Args:
+            a (numpy.ndarray): Angle layer of ftArr (rows x columns).
+            label (optional): Anything identifying the pattern,
+              such as a file name. Defaults to the running number.
+
+        Returns:
+            (tuple): Whether the exact state was new and
+              whether its rotation/reflection class was new.
+        """
+        if DEBUG: print("PatternIndex.add()")
+
+        return self.addStack(np.asarray(a)[None], [label])[0]
+
+    #-------------------------------------------------------------------
+
+    def addStack(self, arr, labels=None):
+        """ Add a stack of patterns to the index.
+        Canonical forms of the whole stack are computed at once.
+
+        Args:
+            arr (numpy.ndarray): Stack of angle layers
+              (n x rows x columns).
+            labels (None/ list): Labels of patterns.
+
+        Returns:
+            isNew (list): (isNewExact, isNewClass) of each pattern.
+        """
+        if DEBUG: print("PatternIndex.addStack()")
+
+        arr = np.asarray(arr)
+        if labels == None: labels = [None] * len(arr)
+        isNew = []
+        eKeys = self.exactKeys(arr)
+        cKeys = ftA.getD4Key(arr)
+        for i in range(len(arr)):
+            label = labels[i]
+            if label == None: label = self.nPatterns
+            isNewExact = eKeys[i] not in self.exact
+            isNewClass = cKeys[i] not in self.classes
+            self.exact.setdefault(eKeys[i], []).append(label)
+            self.classes.setdefault(cKeys[i], []).append(label)
+            self.nPatterns += 1
+            isNew.append((isNewExact, isNewClass))
+        return isNew
+
+    #-------------------------------------------------------------------
+
+    def findDuplicates(self, a):
+        """ Labels of added patterns identical to the given pattern.
+
+        Args:
+            a (numpy.ndarray): Angle layer of ftArr (rows x columns).
+
+        Returns:
+            (list): Labels.
+        """
+        if DEBUG: print("PatternIndex.findDuplicates()")
+
+        key = self.exactKeys(np.asarray(a)[None])[0]
+        return list(self.exact.get(key, []))
+
+    #-------------------------------------------------------------------
+
+    def findEquivalents(self, a):
+        """ Labels of added patterns, which are the given pattern
+        or its rotation/reflection.
+
+        Args:
+            a (numpy.ndarray): Angle layer of ftArr (rows x columns).
+
+        Returns:
+            (list): Labels.
+        """
+        if DEBUG: print("PatternIndex.findEquivalents()")
+
+        return list(self.classes.get(ftA.getD4Key(a), []))
+
+    #-------------------------------------------------------------------
+
+    def nDistinct(self, upToD4=True):
+        """ Number of distinct patterns.
+
+        Args:
+            upToD4 (bool): Count rotations/reflections as the same.
+
+        Returns:
+            (int): Number of distinct patterns.
+        """
+        if DEBUG: print("PatternIndex.nDistinct()")
+
+        if upToD4: return len(self.classes)
+        else: return len(self.exact)
+
+#=======================================================================
+
+def toOrientationArr(a):
+    """ Orientation codes (0-3, angle/90) of angle layers.
+
+    Args:
+        a (numpy.ndarray): Angle layer of ftArr (rows x columns),
+          or a stack of them (n x rows x columns).
+
+    Returns:
+        (numpy.ndarray): uint8 array of the same shape.
+    """
+    return ((ftA.toAngleArr(a)%360)//90).astype(np.uint8)
+
+#-----------------------------------------------------------------------
+
+def toAngleStack(codes):
+    """ Angles of orientation codes, as the array based functions of
+    modFTAnalysis expect (signed integers).
+
+    Args:
+        codes (numpy.ndarray): Orientation codes (n x rows x columns).
+
+    Returns:
+        (numpy.ndarray): int32 array of angles.
+    """
+    return np.multiply(codes, 90, dtype=np.int32)
+
+#=======================================================================
+
+class CorpusStore:
+    """ On-disk corpus of final states, for more states than fit 
+    in memory. A store is a folder with
+        meta.json: grid size and format version,
+        states.u8: orientation codes, contiguous (N x rows x columns),
+        table.bin: side table (TABLE_DTYPE), one row per state,
+        seqs.bin: click sequences of all states (SEQ_DTYPE).
+    All binary files are opened with numpy.memmap, and grow by
+    appending chunks. The side table is written last, so the number of
+    states is the number of its complete rows; partly written data of 
+    an interrupted append is cut off when the store is opened again.
+
+    Args:
+        dirPath (str): Folder of the store.
+        rows (None/ int): Number of rows. Required for a new store.
+        cols (None/ int): Number of columns. Required for a new store.
+        mode (str): 'r' for reading, 'a' for reading and appending.
+
+    Attributes:
+        n (int): Number of stored states.
+
+    Examples:
+        >>> store = CorpusStore('output/corpus', 8, 8, 'a')
+        >>> store.appendSessionFiles(glob('output/ft_*.csv'))
+        >>> for i0, batch in store.iterBatches(100000):
+        ...     sym = ftA.getSymmetryValuesArr(toAngleStack(batch))
+    """
+    def __init__(self, dirPath, rows=None, cols=None, mode='r'):
+        if DEBUG: print("CorpusStore.__init__()")
+
+        self.dirPath = dirPath
+        self.mode = mode
+        self.fp = dict(meta=path.join(dirPath, "meta.json"),
+                       states=path.join(dirPath, "states.u8"),
+                       table=path.join(dirPath, "table.bin"),
+                       seqs=path.join(dirPath, "seqs.bin"))
+        if not path.isfile(self.fp["meta"]):
+            if mode != 'a' or rows == None or cols == None:
+                raise ValueError("No corpus store in %s"%(dirPath))
+            if not path.isdir(dirPath): os.makedirs(dirPath)
+            fh = open(self.fp["meta"], 'w')
+            json.dump(dict(rows=rows, cols=cols, version=STORE_VERSION), fh)
+            fh.close()
+            for k in ["states", "table", "seqs"]: open(self.fp[k], 'ab').close()
+        fh = open(self.fp["meta"], 'r')
+        meta = json.load(fh)
+        fh.close()
+        if rows != None and (rows, cols) != (meta["rows"], meta["cols"]):
+            msg = "Grid size of %s is %ix%i"%(dirPath, meta["rows"], 
+                                              meta["cols"])
+            raise ValueError(msg)
+        self.rows = meta["rows"]
+        self.cols = meta["cols"]
+        self.n = int(path.getsize(self.fp["table"]) / TABLE_DTYPE.itemsize)
+        self.mm = {} # memmaps; made again when n changes
+        self.mmN = -1 # n of the current memmaps
+        if mode == 'a': self.truncate()
+
+    #-------------------------------------------------------------------
+
+    def truncate(self):
+        """ Cut off data after the last complete state
+        (left by an interrupted append).
+
+        Args: None
+
+        Returns: None
+        """
+        if DEBUG: print("CorpusStore.truncate()")
+
+        table = self.table()
+        nSeq = 0
+        if self.n > 0: 
+            nSeq = int(table["seqOffset"][-1]) + int(table["nClicks"][-1])
+        sizes = dict(table=self.n*TABLE_DTYPE.itemsize,
+                     states=self.n*self.rows*self.cols,
+                     seqs=nSeq*SEQ_DTYPE.itemsize)
+        self.mm = {}
+        self.mmN = -1
+        for k in sizes:
+            if path.getsize(self.fp[k]) > sizes[k]:
+                os.truncate(self.fp[k], sizes[k])
+
+    #-------------------------------------------------------------------
+
+    def getMemmap(self, k, dtype, shape):
+        """ Read-only memmap of a binary file of the store.
+
+        Args:
+            k (str): Key of the file ('states', 'table' or 'seqs').
+            dtype (numpy.dtype): Data type.
+            shape (tuple): Shape.
+
+        Returns:
+            (numpy.memmap/ numpy.ndarray): Memmap; 
+              empty array, if shape has no element.
+        """
+        if DEBUG: print("CorpusStore.getMemmap()")
+
+        if self.mmN != self.n:
+            self.mm = {}
+            self.mmN = self.n
+        if not k in self.mm:
+            if np.prod(shape) == 0: 
+                self.mm[k] = np.zeros(shape, dtype=dtype)
+            else:
+                self.mm[k] = np.memmap(self.fp[k], dtype=dtype, mode='r',
+                                       shape=shape)
+        return self.mm[k]
+
+    #-------------------------------------------------------------------
+
+    def states(self):
+        """ All states as orientation codes (N x rows x columns).
+
+        Args: None
+
+        Returns:
+            (numpy.memmap): uint8 array.
+        """
+        return self.getMemmap("states", np.uint8, 
+                              (self.n, self.rows, self.cols))
+
+    #-------------------------------------------------------------------
+
+    def table(self):
+        """ Side table of all states.
+
+        Args: None
+
+        Returns:
+            (numpy.memmap): Array of TABLE_DTYPE.
+        """
+        return self.getMemmap("table", TABLE_DTYPE, (self.n,))
+
+    #-------------------------------------------------------------------
+
+    def getSeq(self, i):
+        """ Click sequence of a state.
+
+        Args:
+            i (int): Index of the state.
+
+        Returns:
+            (numpy.memmap): Array of SEQ_DTYPE.
+        """
+        if DEBUG: print("CorpusStore.getSeq()")
+
+        row = self.table()[i]
+        nSeq = int(path.getsize(self.fp["seqs"]) / SEQ_DTYPE.itemsize)
+        seqs = self.getMemmap("seqs", SEQ_DTYPE, (nSeq,))
+        offset = int(row["seqOffset"])
+        return seqs[offset:offset+int(row["nClicks"])]
+
+    #-------------------------------------------------------------------
+
+    def append(self, a, seqs=None, labels=None):
+        """ Append a chunk of states.
+
+        Args:
+            a (numpy.ndarray): Stack of angle layers 
+              (n x rows x columns).
+            seqs (None/ list): Click sequences of states; 
+              SEQ_DTYPE arrays or lists of [row, column, click-time].
+            labels (None/ list): Labels (str) of states.
+
+        Returns:
+            None
+        """
+        if DEBUG: print("CorpusStore.append()")
+
+        if self.mode != 'a': raise ValueError("Store is opened read-only")
+        a = np.asarray(a)
+        if a.shape[1:] != (self.rows, self.cols):
+            raise ValueError("Shape of states should be (n, %i, %i)"%(
+                                                        self.rows, self.cols))
+        nNew = len(a)
+        if nNew == 0: return
+        table = np.zeros(nNew, dtype=TABLE_DTYPE)
+        offset = int(path.getsize(self.fp["seqs"]) / SEQ_DTYPE.itemsize)
+        table["seqOffset"] = offset
+        chunks = []
+        if seqs != None:
+            for i in range(nNew):
+                seq = seqs[i]
+                if not isinstance(seq, np.ndarray):
+                    seq = np.array([(j+1, x[0], x[1], x[2]) for j, x in \
+                                    enumerate(seq)], dtype=SEQ_DTYPE)
+                table["seqOffset"][i] = offset
+                table["nClicks"][i] = len(seq)
+                if len(seq) > 0: table["duration"][i] = seq["time"][-1]
+                offset += len(seq)
+                chunks.append(seq)
+        if labels != None:
+            table["label"] = [x.encode()[:48] for x in labels]
+        ### write states and sequences first, table last
+        with open(self.fp["states"], 'ab') as fh:
+            fh.write(toOrientationArr(a).tobytes())
+        with open(self.fp["seqs"], 'ab') as fh:
+            for seq in chunks: fh.write(seq.astype(SEQ_DTYPE).tobytes())
+        with open(self.fp["table"], 'ab') as fh:
+            fh.write(table.tobytes())
+        self.n += nNew
+
+    #-------------------------------------------------------------------
+
+    def appendSessionFiles(self, fps, chunkSz=1000):
+        """ Append final states and click sequences of session files 
+        (ft_*.csv or ft_*.npz) in chunks. 
+        Files with another grid size are skipped.
+
+        Args:
+            fps (list): File paths of session files.
+            chunkSz (int): Number of sessions appended at once.
+
+        Returns:
+            nAppended (int): Number of appended sessions.
+        """
+        if DEBUG: print("CorpusStore.appendSessionFiles()")
+
+        nAppended = 0
+        for ci in range(0, len(fps), chunkSz):
+            a = []
+            seqs = []
+            labels = []
+            for fp in fps[ci:ci+chunkSz]:
+                if fp.endswith(".npz"): sess = loadSessionNPZ(fp)
+                else: sess = loadSessionCSV(fp)
+                if sess["ftArr"].shape[:2] != (self.rows, self.cols): continue
+                a.append(sess["ftArr"][:,:,0])
+                seqs.append(np.asarray(sess["ftSeq"]))
+                labels.append(path.basename(fp))
+            if len(a) == 0: continue
+            self.append(np.array(a), seqs, labels)
+            nAppended += len(a)
+        return nAppended
+
+    #-------------------------------------------------------------------
+
+    def iterBatches(self, batchSz=10000, start=0, stop=None):
+        """ Iterate states in batches. Batches are views of the memmap, 
+        not copies.
+
+        Args:
+            batchSz (int): Number of states in a batch.
+            start (int): Index of the first state.
+            stop (None/ int): Index after the last state.
+              None means the number of states.
+
+        Returns:
+            (generator): (Index of the first state, 
+              orientation codes (n x rows x columns)).
+        """
+        if DEBUG: print("CorpusStore.iterBatches()")
+
+        states = self.states()
+        if stop == None: stop = self.n
+        for i0 in range(start, stop, batchSz):
+            yield i0, states[i0:min(i0+batchSz, stop)]
+
+#=======================================================================
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,442 @@
+# coding: UTF-8
+"""
+Exact distributions of analysis values of small grids.
+Every final state of a small grid (4 orientations per tile) is
+counted, but analysis values are computed only for one
+representative of each set of states which are rotations/reflections
+of each other (D4 orbit); each representative is weighted by the size
+of its orbit (Burnside's lemma). Representatives are generated 
+directly; tiles are grouped by their orbits under the transforms, 
+so that about half of them (prefix) decide for most states whether 
+they can be representatives, and the rest (suffix) are checked with 
+a table made once per grid. Values which change between members
+of an orbit (such as horizontal and vertical symmetry of rotated
+states) are taken from the transformed representative.
+The result is a table of cumulative counts per analysis value, which
+is loaded with mmap by modFTNull.NullDistCache, so that percentiles
+and p-values are table lookups.
+
+The number of states is 4^(rows*columns); grids up to 16 tiles
+(4x4 has 4.3 billion states) are supported. A 5x5 grid has 4^25 states
+and about 1.4*10^14 orbits, which is out of reach even with the
+reduction; its null distribution is sampled (modFTNull).
+
+Dependency:
+    Numpy (1.17),
+
+------------------------------------------------------------------------
+Copyright (C) 2020 Jinook Oh & Tecumseh Fitch
+- Contact: jinook0707@gmail.com, tecumseh.fitch@univie.ac.at
+
+This program is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by the
+Free Software Foundation, either version 3 of the License, or (at your
+option) any later version.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program.  If not, see <http://www.gnu.org/licenses/>.
+------------------------------------------------------------------------
+"""
+
+import os
+from os import path, cpu_count
+from time import time
+from multiprocessing import Pool
+
+import numpy as np
+
+import modFTAnalysis as ftA
+from modFTNull import METRICS, getMetricsArr, roundArr
+from modFTNull import VALUE_OFFSET, N_VALUES, getExactTableFileName
+
+DEBUG = False
+MAX_TILES = 16 # maximum number of tiles of an enumerated grid
+ROT_METRICS = [METRICS.index("rotSym180"), METRICS.index("rotSym90")]
+SUFFIX_TABLES = {} # suffix tables of this process; (rows, columns) ->
+  # (see getSuffixTable)
+
+#-----------------------------------------------------------------------
+
+def getD4Perms(rows, cols):
+    """ D4 transforms as permutations of tiles and of orientation codes
+    (angle/90), in the order of modFTAnalysis.getD4TransformsArr.
+    Tile k of a transformed state is angleMap[state[pos[k]]].
+
+    Args:
+        rows (int): Number of rows.
+        cols (int): Number of columns.
+
+    Returns:
+        perms (list): (pos, angleMap) of each transform;
+          pos (numpy.ndarray): flat tile indices (rows*columns),
+          angleMap (numpy.ndarray): new code of each code (4).
+    """
+    idx = np.arange(rows*cols).reshape(rows, cols)
+    codes = np.arange(4)
+    perms = []
+    # mirroring at the vertical axis inverts angles (invertByAxis, axis 0)
+    for x, aMap in [(idx, codes), (idx[:,::-1], (1-codes)%4)]:
+        if rows == cols:
+            for i in range(4):
+                perms.append((np.rot90(x, -i).ravel(), (aMap+i)%4))
+        else:
+            perms.append((x.ravel(), aMap))
+            perms.append((x[::-1,::-1].ravel(), (aMap+2)%4))
+    return perms
+
+#-----------------------------------------------------------------------
+
+def getMetricPerms(rows, cols):
+    """ Which analysis value of a state is the analysis value of
+    its transformed state, for each D4 transform (see getD4Perms).
+    A quarter turn swaps horizontal and vertical axes and swaps 
+    the diagonals; mirroring at the vertical axis swaps the diagonals.
+    Transforms of a non-square grid keep all axes.
+    Rotational symmetries are not included; they are computed for
+    transformed states, because they are not always same in an orbit.
+
+    Args:
+        rows (int): Number of rows.
+        cols (int): Number of columns.
+
+    Returns:
+        perms (list): Indices of METRICS for each transform.
+    """
+    iHor, iVer, iD1, iD2 = [METRICS.index(k) for k in
+                            ["symHor", "symVer", "sym1Dia", "sym2Dia"]]
+    perms = []
+    for mi in range(2):
+        for i in range(4 if rows == cols else 2):
+            perm = list(range(len(METRICS)))
+            if rows == cols:
+                swapHV = (i%2 == 1)
+                swapD = (i%2 == 1) != (mi == 1)
+                if swapHV: perm[iHor], perm[iVer] = iVer, iHor
+                if swapD: perm[iD1], perm[iD2] = iD2, iD1
+            perms.append(perm)
+    return perms
+
+#-----------------------------------------------------------------------
+
+def decodeStates(start, stop, nTiles):
+    """ States of a range of state numbers; tile k is the k-th digit
+    (base 4, most significant first) of the state number.
+
+    Args:
+        start (int): First state number.
+        stop (int): State number after the last one.
+        nTiles (int): Number of tiles.
+
+    Returns:
+        (numpy.ndarray): Orientation codes (n x tiles), uint8.
+    """
+    num = np.arange(start, stop, dtype=np.int64)
+    shifts = 2 * np.arange(nTiles-1, -1, -1, dtype=np.int64)
+    return ((num[:,None] >> shifts) & 3).astype(np.uint8)
+
+#-----------------------------------------------------------------------
+
+def encodeStates(codes):
+    """ State numbers of states (inverse of decodeStates).
+
+    Args:
+        codes (numpy.ndarray): Orientation codes (n x tiles).
+
+    Returns:
+        (numpy.ndarray): State numbers, int64.
+    """
+    num = np.zeros(len(codes), dtype=np.int64)
+    for k in range(codes.shape[1]):
+        num <<= 2
+        num |= codes[:,k]
+    return num
+
+#-----------------------------------------------------------------------
+
+def getTileOrder(rows, cols):
+    """ Order of tiles as digits of state numbers in enumerateChunk.
+    Tiles are grouped by their orbits under D4 transforms (tiles which
+    are moved to each other's positions); orbits of about half of tiles
+    are the prefix, the others are the suffix. Transforms move prefix 
+    tiles only to prefix positions, so a state can be compared with 
+    its transformed state by prefix first, then by suffix.
+
+    Args:
+        rows (int): Number of rows.
+        cols (int): Number of columns.
+
+    Returns:
+        order (numpy.ndarray): Flat tile index of each digit.
+        nPrefix (int): Number of prefix digits.
+    """
+    perms = getD4Perms(rows, cols)
+    nTiles = rows*cols
+    orbits = []
+    found = np.zeros(nTiles, dtype=bool)
+    for k in range(nTiles):
+        if found[k]: continue
+        orbit = sorted(set([int(pos[k]) for pos, __ in perms]))
+        found[orbit] = True
+        orbits.append(orbit)
+    orbits.sort(key=len, reverse=True)
+    prefix = []
+    suffix = []
+    for orbit in orbits:
+        if len(prefix)+len(orbit) <= (nTiles+1)//2: prefix += orbit
+        else: suffix += orbit
+    return np.array(prefix+suffix), len(prefix)
+
+#-----------------------------------------------------------------------
+
+def getDigitPerms(rows, cols):
+    """ D4 transforms (see getD4Perms) as permutations of digits
+    in the order of getTileOrder. Digit k of a transformed state is
+    angleMap[digits[pos[k]]].
+
+    Args:
+        rows (int): Number of rows.
+        cols (int): Number of columns.
+
+    Returns:
+        perms (list): (pos, angleMap) of each transform.
+    """
+    order, __ = getTileOrder(rows, cols)
+    inv = np.argsort(order) # digit of each tile
+    return [(inv[pos[order]], aMap.astype(np.uint8)) for pos, aMap in \
+                                                    getD4Perms(rows, cols)]
+
+#-----------------------------------------------------------------------
+
+def getSuffixTable(rows, cols):
+    """ All suffixes of a grid and how they compare with their 
+    transformed suffixes. Made once per process (SUFFIX_TABLES).
+
+    Args:
+        rows (int): Number of rows.
+        cols (int): Number of columns.
+
+    Returns:
+        digits (numpy.ndarray): Suffix digits (4^suffix x suffix), uint8.
+        isLE (numpy.ndarray): transforms x suffixes, bool;
+          suffix number is less than or equal to transformed one.
+        isEQ (numpy.ndarray): transforms x suffixes, bool;
+          suffix is same as transformed one.
+    """
+    if not (rows, cols) in SUFFIX_TABLES:
+        __, nPre = getTileOrder(rows, cols)
+        nSuf = rows*cols - nPre
+        digits = decodeStates(0, 4**nSuf, nSuf)
+        num = np.arange(4**nSuf, dtype=np.int64)
+        isLE = []
+        isEQ = []
+        for pos, aMap in getDigitPerms(rows, cols):
+            tNum = encodeStates(aMap[digits[:,pos[nPre:]-nPre]])
+            isLE.append(num <= tNum)
+            isEQ.append(num == tNum)
+        SUFFIX_TABLES[(rows, cols)] = (digits, np.array(isLE), 
+                                       np.array(isEQ))
+    return SUFFIX_TABLES[(rows, cols)]
+
+#-----------------------------------------------------------------------
+
+def getRepresentatives(rows, cols, start, stop):
+    """ Orbit representatives, of which prefix numbers are in a range.
+    A state is the representative of its orbit, if its number 
+    (digits in the order of getTileOrder) is the smallest in the orbit.
+    A prefix larger than its transformed prefix can't begin any 
+    representative; a prefix smaller than it doesn't need the suffix
+    to be compared for that transform.
+
+    Args:
+        rows (int): Number of rows.
+        cols (int): Number of columns.
+        start (int): First prefix number.
+        stop (int): Prefix number after the last one.
+
+    Returns:
+        reps (numpy.ndarray): Orientation codes of representatives 
+          (n x tiles, flat tile index order), uint8.
+        orbitSz (numpy.ndarray): Orbit size of each representative.
+    """
+    order, nPre = getTileOrder(rows, cols)
+    perms = getDigitPerms(rows, cols)
+    sufDigits, sufLE, sufEQ = getSuffixTable(rows, cols)
+    pre = decodeStates(start, stop, nPre)
+    num = np.arange(start, stop, dtype=np.int64)
+
+    ### compare prefixes with transformed prefixes
+    isViable = np.ones(len(pre), dtype=bool)
+    eqMask = np.zeros(len(pre), dtype=np.int64) # transforms keeping prefix
+    for ti, (pos, aMap) in enumerate(perms):
+        tNum = encodeStates(aMap[pre[:,pos[:nPre]]])
+        isViable &= (num <= tNum)
+        eqMask |= (num == tNum).astype(np.int64) << ti
+
+    ### combine prefixes with suffixes; prefixes with same eqMask 
+    ###   have same valid suffixes
+    reps = []
+    orbitSz = []
+    for mask in np.unique(eqMask[isViable]):
+        tis = [ti for ti in range(len(perms)) if (mask >> ti) & 1]
+        sIdx = np.nonzero(sufLE[tis].all(axis=0))[0]
+        nStab = sufEQ[tis][:,sIdx].sum(axis=0) # size of stabilizer
+        pIdx = np.nonzero(isViable & (eqMask == mask))[0]
+        reps.append(np.concatenate([np.repeat(pre[pIdx], len(sIdx), axis=0),
+                                    np.tile(sufDigits[sIdx], (len(pIdx), 1))],
+                                   axis=1))
+        orbitSz.append(np.tile(len(perms) // nStab, len(pIdx)))
+    if len(reps) == 0:
+        return np.zeros((0, rows*cols), dtype=np.uint8), \
+               np.zeros(0, dtype=np.int64)
+    digits = np.concatenate(reps)
+    reps = np.empty_like(digits)
+    reps[:,order] = digits
+    return reps, np.concatenate(orbitSz)
+
+#-----------------------------------------------------------------------
+
+def enumerateChunk(args):
+    """ Weighted histograms of analysis values of orbit representatives
+    of a range of prefix numbers (see getRepresentatives).
+    This runs in worker processes of the pool.
+
+    Args:
+        args (tuple): rows, columns, first prefix number,
+          prefix number after the last one.
+
+    Returns:
+        hist (numpy.ndarray): len(METRICS) x N_VALUES, int64;
+          counts of analysis values (in thousandths + VALUE_OFFSET)
+          of states, multiplied by number of transforms.
+        nReps (int): Number of representatives in the range.
+    """
+    rows, cols, start, stop = args
+    perms = getD4Perms(rows, cols)
+    mPerms = getMetricPerms(rows, cols)
+    reps, orbitSz = getRepresentatives(rows, cols, start, stop)
+
+    ### histograms; each transform of a representative is weighted by
+    ###   its orbit size, so every state is counted len(perms) times
+    hist = np.zeros((len(METRICS), N_VALUES), dtype=np.int64)
+    if len(reps) == 0: return hist, 0
+    a = reps.reshape(-1, rows, cols).astype(np.int32) * 90
+    vals = np.round(getMetricsArr(a)*1000).astype(np.int64) + VALUE_OFFSET
+    ### rotational symmetries are kept by rotations, but mirroring
+    ###   can change them; computed for the first mirrored transform
+    iMirror = len(perms) // 2
+    pos, aMap = perms[iMirror]
+    t = aMap[reps[:,pos]].reshape(-1, rows, cols).astype(np.int32) * 90
+    rotSym = roundArr(ftA.getRotationalSymmetriesArr(t))
+    rotSym = np.round(rotSym*1000).astype(np.int64) + VALUE_OFFSET
+    for ti in range(len(perms)):
+        tVals = vals[:,mPerms[ti]]
+        if ti >= iMirror: tVals[:,ROT_METRICS] = rotSym
+        for mi in range(len(METRICS)):
+            hist[mi] += np.bincount(tVals[:,mi], orbitSz,
+                                    N_VALUES).astype(np.int64)
+    return hist, len(reps)
+
+#-----------------------------------------------------------------------
+
+def makeExactTable(rows, cols, nProc=None, chunkSz=2**18):
+    """ Enumerate all states of a grid and make the table of
+    cumulative counts of analysis values.
+
+    Args:
+        rows (int): Number of rows.
+        cols (int): Number of columns.
+        nProc (None/ int): Number of processes.
+          None means number of CPU cores.
+        chunkSz (int): Approximate number of states in a chunk;
+          chunks are ranges of prefixes (see getTileOrder).
+
+    Returns:
+        cdf (numpy.ndarray): len(METRICS) x N_VALUES, int64;
+          number of states with analysis value (in thousandths)
+          less than or equal to index - VALUE_OFFSET.
+          The last column is the number of states.
+        nReps (int): Number of orbit representatives (orbits).
+
+    Raises:
+        ValueError: When the grid has more than MAX_TILES tiles,
+          or has less than 2 rows or columns.
+    """
+    if DEBUG: print("modFTEnum.makeExactTable()")
+
+    nTiles = rows*cols
+    if rows < 2 or cols < 2:
+        msg = "%ix%i grid; at least 2 rows and 2 columns "%(rows, cols)
+        msg += "are needed for the analysis."
+        raise ValueError(msg)
+    if nTiles > MAX_TILES:
+        msg = "%ix%i grid has 4^%i states; "%(rows, cols, nTiles)
+        msg += "up to %i tiles can be enumerated."%(MAX_TILES)
+        raise ValueError(msg)
+    __, nPre = getTileOrder(rows, cols)
+    nPrefixes = 4**nPre
+    step = max(1, chunkSz // 4**(nTiles-nPre)) # prefixes in a chunk
+    args = [(rows, cols, s, min(s+step, nPrefixes)) for s in \
+                                            range(0, nPrefixes, step)]
+    if nProc == None: nProc = cpu_count()
+    nProc = max(1, min(nProc, len(args)))
+    hist = np.zeros((len(METRICS), N_VALUES), dtype=np.int64)
+    nReps = 0
+    if nProc == 1:
+        rslts = map(enumerateChunk, args)
+    else:
+        pool = Pool(nProc)
+        rslts = pool.imap_unordered(enumerateChunk, args)
+    for h, n in rslts:
+        hist += h
+        nReps += n
+    if nProc > 1:
+        pool.close()
+        pool.join()
+    nPerms = len(getD4Perms(rows, cols))
+    if (hist % nPerms).any():
+        raise RuntimeError("Counts are not multiples of %i"%(nPerms))
+    cdf = np.cumsum(hist // nPerms, axis=1)
+    return cdf, nReps
+
+#-----------------------------------------------------------------------
+
+def writeExactTable(dirPath, rows, cols, nProc=None):
+    """ Make the table of a grid and write it as a .npy file,
+    which modFTNull.NullDistCache uses instead of sampled
+    uniform null distribution.
+
+    Args:
+        dirPath (str): Folder of null distributions.
+        rows (int): Number of rows.
+        cols (int): Number of columns.
+        nProc (None/ int): Number of processes.
+
+    Returns:
+        fp (str): File path of the table.
+    """
+    if DEBUG: print("modFTEnum.writeExactTable()")
+
+    startTime = time()
+    if not path.isdir(dirPath): os.makedirs(dirPath)
+    cdf, nReps = makeExactTable(rows, cols, nProc)
+    fp = path.join(dirPath, getExactTableFileName(rows, cols))
+    tmpFP = fp + ".tmp"
+    fh = open(tmpFP, 'wb')
+    np.save(fh, cdf)
+    fh.close()
+    os.replace(tmpFP, fp) # complete files only
+    msg = "%i states (%i orbits) of %ix%i grid "%(cdf[0,-1], nReps,
+                                                   rows, cols)
+    msg += "were enumerated in %.3f seconds.\n%s"%(time()-startTime, fp)
+    print(msg)
+    return fp
+
+#-----------------------------------------------------------------------
+
+if __name__ == '__main__':
+    pass
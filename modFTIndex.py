@@ -0,0 +1,290 @@
+# coding: UTF-8
+"""
+SQLite catalogue of saved FlexTiles sessions (ft_*.csv).
+File path, timestamp, grid shape, number of clicks, analysis results
+and D4-canonical hash of each session are stored in one table.
+The catalogue is updated incrementally; only session files which are
+new or modified (by mtime) since the last update are parsed and
+analyzed, so queries over the corpus don't need to parse files.
+
+Dependency:
+    Numpy (1.17),
+
+------------------------------------------------------------------------
+Copyright (C) 2020 Jinook Oh & Tecumseh Fitch
+- Contact: jinook0707@gmail.com, tecumseh.fitch@univie.ac.at
+
+This program is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by the
+Free Software Foundation, either version 3 of the License, or (at your
+option) any later version.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program.  If not, see <http://www.gnu.org/licenses/>.
+------------------------------------------------------------------------
+"""
+
+import re, sqlite3
+from os import path, cpu_count
+from glob import glob
+from time import time
+from multiprocessing import Pool
+from pathlib import Path
+
+import modFTBatch
+
+DEBUG = False
+INDEX_FN = "session_index.sqlite" # default file name of the index
+
+# columns of sessions table (name, SQLite type);
+#   metric columns are same as in modFTBatch.COLUMNS
+COLUMNS = [("path", "TEXT PRIMARY KEY"), ("file", "TEXT"),
+           ("mtime", "REAL"), ("timestamp", "TEXT")]
+for _k in modFTBatch.COLUMNS:
+    if _k == "file": continue
+    if _k in ["rows", "cols", "nClicks"]: COLUMNS.append((_k, "INTEGER"))
+    elif _k in ["d4Hash", "error"]: COLUMNS.append((_k, "TEXT"))
+    else: COLUMNS.append((_k, "REAL"))
+COL_NAMES = [x[0] for x in COLUMNS]
+# columns with SQLite index for fast queries
+INDEXED_COLUMNS = ["d4Hash", "nClicks", "timestamp", "entropy",
+                   "symHor", "symVer", "sym1Dia", "sym2Dia"]
+
+#-----------------------------------------------------------------------
+
+def getSessionTimestamp(fn):
+    """ Timestamp of a session from its file name.
+
+    Args:
+        fn (str): File name such as ft_20200501120000.csv or
+          ft_20200501120000_1.csv
+
+    Returns:
+        (str): Timestamp such as '2020-05-01 12:00:00',
+          empty string if the file name doesn't have it.
+
+    Examples:
+        >>> getSessionTimestamp('ft_20200501120000_1.csv')
+        '2020-05-01 12:00:00'
+    """
+    m = re.match(r"ft_(\d{4})(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)", fn)
+    if m == None: return ""
+    return "%s-%s-%s %s:%s:%s"%m.groups()
+
+#=======================================================================
+
+class SessionIndex:
+    """ SQLite catalogue of session files in a folder.
+
+    Args:
+        dbFP (str): File path of the SQLite file.
+        readOnly (bool, optional): Open it only for queries.
+
+    Attributes:
+        db (sqlite3.Connection): Catalogue.
+
+    Examples:
+        >>> sIdx = SessionIndex('output/session_index.sqlite')
+        >>> sIdx.update('output')
+        >>> sIdx.query('symHor > ? AND nClicks > ?', (0.9, 200))
+        [{'path': '/.../output/ft_20200501120000.csv', ...}]
+        >>> sIdx.close()
+    """
+    def __init__(self, dbFP, readOnly=False):
+        if DEBUG: print("SessionIndex.__init__()")
+
+        self.dbFP = dbFP
+        self.readOnly = readOnly
+        if readOnly:
+            # URI of the path, so that '?', '#' or '%' in it are escaped
+            uri = Path(dbFP).resolve().as_uri() + "?mode=ro"
+            self.db = sqlite3.connect(uri, uri=True)
+        else:
+            self.db = sqlite3.connect(dbFP)
+            cols = ", ".join(["%s %s"%(k, t) for k, t in COLUMNS])
+            self.db.execute("CREATE TABLE IF NOT EXISTS sessions (%s)"%(cols))
+            for k in INDEXED_COLUMNS:
+                self.db.execute("CREATE INDEX IF NOT EXISTS " + \
+                                "idx_%s ON sessions (%s)"%(k, k))
+            self.db.commit()
+
+    #-------------------------------------------------------------------
+
+    def update(self, dirPath, nProc=None):
+        """ Update the catalogue with session files in a folder.
+        New or modified files are analyzed (with a pool of processes,
+        when there are many), rows of removed files are deleted.
+
+        Args:
+            dirPath (str): Folder containing ft_*.csv files.
+            nProc (None/ int): Number of processes.
+              None means number of CPU cores.
+
+        Returns:
+            nChanged (int): Number of analyzed (new or modified) files.
+            nRemoved (int): Number of removed rows.
+        """
+        if DEBUG: print("SessionIndex.update()")
+
+        fps = sorted(glob(path.join(path.abspath(dirPath), "ft_*.csv")))
+        mtimes = dict([(fp, path.getmtime(fp)) for fp in fps])
+        prefix = path.join(path.abspath(dirPath), "")
+        indexed = dict(self.db.execute("SELECT path, mtime FROM sessions " + \
+                    "WHERE substr(path, 1, ?)=?", (len(prefix), prefix)))
+        changed = [fp for fp in fps if indexed.get(fp) != mtimes[fp]]
+        removed = [fp for fp in indexed if not fp in mtimes]
+
+        ### analyze new or modified files
+        rows = []
+        if nProc == None: nProc = cpu_count()
+        # a process pool pays off only with many files to analyze
+        nProc = max(1, min(nProc, int(len(changed)/100)))
+        if len(changed) > 0:
+            if nProc == 1:
+                modFTBatch.initWorker()
+                rows = [modFTBatch.analyzeSessionFile(fp) for fp in changed]
+            else:
+                chunkSz = max(1, int(len(changed) / (nProc*4)))
+                pool = Pool(nProc, modFTBatch.initWorker)
+                rows = list(pool.imap(modFTBatch.analyzeSessionFile,
+                                      changed, chunkSz))
+                pool.close()
+                pool.join()
+
+        ### write rows
+        values = []
+        for fp, rslt in zip(changed, rows):
+            rslt["path"] = fp
+            rslt["mtime"] = mtimes[fp]
+            rslt["timestamp"] = getSessionTimestamp(rslt["file"])
+            values.append(tuple([rslt.get(k, None) for k in COL_NAMES]))
+        sql = "INSERT OR REPLACE INTO sessions VALUES (%s)"%(
+                                            ",".join(["?"]*len(COL_NAMES)))
+        self.db.executemany(sql, values)
+        self.db.executemany("DELETE FROM sessions WHERE path=?",
+                            [(fp,) for fp in removed])
+        self.db.commit()
+        return len(changed), len(removed)
+
+    #-------------------------------------------------------------------
+
+    def query(self, where="", params=(), columns=None, orderBy=""):
+        """ Query sessions in the catalogue.
+
+        Args:
+            where (str): SQL condition on columns (COL_NAMES),
+              such as 'symHor > 0.9 AND nClicks > 200'.
+              Empty string means all sessions.
+            params (tuple): Values for '?' in where.
+            columns (None/ list): Columns to return. None means all.
+            orderBy (str): SQL ordering, such as 'entropy DESC'.
+              Empty string means ordering by path.
+
+        Returns:
+            (list): Dictionaries of matched sessions.
+
+        Examples:
+            >>> sIdx.query('d4Hash=?', (ftA.getD4Hash(a),), ['file'])
+            [{'file': 'ft_20200501120000.csv'}]
+        """
+        if DEBUG: print("SessionIndex.query()")
+
+        if columns == None: columns = COL_NAMES
+        sql = "SELECT %s FROM sessions"%(", ".join(columns))
+        if where.strip() != "": sql += " WHERE %s"%(where)
+        if orderBy == "": orderBy = "path"
+        sql += " ORDER BY %s"%(orderBy)
+        cur = self.db.execute(sql, params)
+        names = [x[0] for x in cur.description]
+        return [dict(zip(names, row)) for row in cur.fetchall()]
+
+    #-------------------------------------------------------------------
+
+    def close(self):
+        """ Close the SQLite file.
+
+        Args: None
+
+        Returns: None
+        """
+        if DEBUG: print("SessionIndex.close()")
+
+        if self.db != None:
+            self.db.close()
+            self.db = None
+
+#=======================================================================
+
+def indexDir(dirPath, dbFP="", nProc=None):
+    """ Create or update the catalogue of a folder and print a summary.
+
+    Args:
+        dirPath (str): Folder containing ft_*.csv files.
+        dbFP (str, optional): File path of the SQLite file.
+          If empty, INDEX_FN in dirPath.
+        nProc (None/ int): Number of processes.
+
+    Returns:
+        dbFP (str): File path of the SQLite file.
+    """
+    if DEBUG: print("modFTIndex.indexDir()")
+
+    if dbFP == "": dbFP = path.join(dirPath, INDEX_FN)
+    startTime = time()
+    sIdx = SessionIndex(dbFP)
+    nChanged, nRemoved = sIdx.update(dirPath, nProc)
+    nTotal = sIdx.db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+    sIdx.close()
+    msg = "Indexed %i new or modified session files "%(nChanged)
+    msg += "and removed %i in %.3f seconds.\n"%(nRemoved, time()-startTime)
+    msg += "%i sessions in %s"%(nTotal, dbFP)
+    print(msg)
+    return dbFP
+
+#-----------------------------------------------------------------------
+
+def queryIndex(where, dbFP, columns=None):
+    """ Query the catalogue and print matched sessions as CSV lines.
+
+    Args:
+        where (str): SQL condition (see SessionIndex.query).
+        dbFP (str): File path of the SQLite file.
+        columns (None/ list): Columns to print.
+          None means file, rows, cols, nClicks and
+          columns used in the condition.
+
+    Returns:
+        rslt (list): Dictionaries of matched sessions.
+
+    Raises:
+        sqlite3.Error: When the condition is wrong or the SQLite file
+          can't be opened.
+    """
+    if DEBUG: print("modFTIndex.queryIndex()")
+
+    if columns == None:
+        columns = ["file", "rows", "cols", "nClicks"]
+        for k in COL_NAMES:
+            if not k in columns and re.search(r"\b%s\b"%(k), where):
+                columns.append(k)
+    startTime = time()
+    sIdx = SessionIndex(dbFP, readOnly=True)
+    try: rslt = sIdx.query(where, (), columns)
+    finally: sIdx.close() # also when the condition is wrong
+    lines = [", ".join(columns)]
+    for row in rslt:
+        lines.append(", ".join([str(row[k]) for k in columns]))
+    print("\n".join(lines))
+    print("%i sessions matched in %.3f seconds."%(len(rslt),
+                                                  time()-startTime))
+    return rslt
+
+#-----------------------------------------------------------------------
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,540 @@
+# coding: UTF-8
+"""
+Drawing of Kandinsky mode.
+Drawings on the tile are recorded in a display list with coordinates
+relative to the tile size, so that the tile image can be made at any
+size (Kandinsky mode canvas, tile of FlexTiles, exporting)
+from the initial tile image and the drawings,
+instead of rescaling pixels of a drawn image.
+
+Dependency:
+    wxPython (4.0),
+    Numpy (1.17),
+
+------------------------------------------------------------------------
+Copyright (C) 2020 Jinook Oh & Tecumseh Fitch
+- Contact: jinook0707@gmail.com, tecumseh.fitch@univie.ac.at
+
+This program is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by the
+Free Software Foundation, either version 3 of the License, or (at your
+option) any later version.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program.  If not, see <http://www.gnu.org/licenses/>.
+------------------------------------------------------------------------
+"""
+
+import zlib
+from collections import OrderedDict
+
+import wx
+import numpy as np
+
+from modFFC import flood_fill
+
+DEBUG = False
+
+#-----------------------------------------------------------------------
+
+def drawKShape(dc, kD, scale=1.0, ox=0, oy=0):
+    """ Draw a shape of Kandinsky mode.
+
+    Args:
+        dc (wx.DC): DC to draw on.
+        kD (dict): Drawing info. with all its coordinates,
+          fill color ('fCol'), stroke color ('sCol') and
+          stroke thickness ('sThick'). 'fill' has also 
+          color tolerance ('tol').
+        scale (float): Scale to multiply coordinates and thickness with.
+        ox (int): X-offset to add to coordinates (after scaling).
+        oy (int): Y-offset to add to coordinates (after scaling).
+
+    Returns:
+        (None/ wx.Rect): For 'fill', rect of changed pixels 
+          (empty rect, if nothing was filled). None for other shapes.
+
+    Examples:
+        >>> kD = dict(name="line", x1=0, y1=0, x2=10, y2=10,
+                      fCol="#cccccc", sCol="#0000ff", sThick=1)
+        >>> drawKShape(memDC, kD)
+    """
+    if DEBUG: print("modFTKandinsky.drawKShape()")
+
+    def xy(x, y): return (int(round(x*scale+ox)), int(round(y*scale+oy)))
+
+    thick = max(1, int(round(kD["sThick"]*scale)))
+    dc.SetPen(wx.Pen(kD["sCol"], thick))
+    dc.SetBrush(wx.Brush(kD["fCol"]))
+    name = kD["name"]
+
+    if name == "fill":
+        bmp = None
+        if isinstance(dc, wx.MemoryDC): bmp = dc.GetSelectedBitmap()
+        if kD.get("x1") == None or bmp == None or not bmp.IsOk():
+        # no seed point or no access to pixels
+            dc.SetBackground(wx.Brush(kD["fCol"]))
+            dc.Clear()
+            w, h = dc.GetSize()
+            return wx.Rect(0, 0, w, h)
+        else:
+            ### fill connected region under the seed point
+            w, h = bmp.GetSize()
+            arr = np.zeros((h, w, 3), dtype=np.uint8)
+            bmp.CopyToBuffer(arr)
+            col = wx.Colour(kD["fCol"])
+            r = flood_fill(arr, xy(kD["x1"], kD["y1"]), 
+                           (col.Red(), col.Green(), col.Blue()),
+                           kD.get("tol", 0))
+            if r == None: return wx.Rect() # seed point is out of bitmap
+            # draw only the rect of filled pixels
+            x, y, rw, rh = r
+            sub = np.ascontiguousarray(arr[y:y+rh,x:x+rw])
+            dc.DrawBitmap(wx.Bitmap.FromBuffer(rw, rh, sub), x, y)
+            return wx.Rect(x, y, rw, rh)
+
+    elif name in ["line", "rectangle", "circle"]:
+    # can be drawn with two points
+        x1, y1 = xy(kD["x1"], kD["y1"])
+        x2, y2 = xy(kD["x2"], kD["y2"])
+        if name == "line":
+            dc.DrawLine(x1, y1, x2, y2)
+        elif name == "rectangle":
+            dc.DrawRectangle(x1, y1, (x2-x1), (y2-y1))
+        elif name == "circle":
+            rad = int(np.sqrt((x2-x1)**2 + (y2-y1)**2))
+            dc.DrawCircle(x1, y1, rad)
+
+    elif name == "curvyline": # curvy line drawing
+        x1, y1 = xy(kD["x1"], kD["y1"])
+        x2, y2 = xy(kD["x2"], kD["y2"])
+        if kD["x3"] == None: # 3rd point is not determined yet
+            dc.DrawLine(x1, y1, x2, y2)
+        else:
+            x3, y3 = xy(kD["x3"], kD["y3"])
+            gc = wx.GraphicsContext.Create(dc)
+            gc.SetPen(wx.Pen(kD["sCol"], thick))
+            path = gc.CreatePath()
+            path.MoveToPoint(x1, y1)
+            path.AddCurveToPoint(x1, y1, x2, y2, x3, y3)
+            gc.StrokePath(path)
+
+    elif name in ["polygon", "pencil"]:
+        pts = [xy(x, y) for (x, y) in kD["pts"]]
+        if name == "pencil":
+            if len(pts) > 1: dc.DrawLines(pts)
+        elif len(pts) == 2: # not polygon yet
+            # draw as line
+            dc.DrawLine(pts[0][0], pts[0][1], pts[1][0], pts[1][1])
+        elif len(pts) > 2:
+            dc.DrawPolygon(pts) # draw polygon
+    return None
+
+#-----------------------------------------------------------------------
+
+def normalizeKShape(kD, sz):
+    """ Convert coordinates and stroke thickness of a shape
+    to values relative to the tile size.
+
+    Args:
+        kD (dict): Drawing info. (same as in drawKShape).
+        sz (int): Tile size, where the shape was drawn.
+
+    Returns:
+        op (dict): Drawing info. with relative values.
+    """
+    if DEBUG: print("modFTKandinsky.normalizeKShape()")
+
+    sz = float(sz)
+    op = {}
+    for k in kD.keys():
+        v = kD[k]
+        if v == None: op[k] = v
+        elif k[0] in ["x", "y"] and k[1:].isdigit(): op[k] = v/sz
+        elif k == "pts": op[k] = [(x/sz, y/sz) for (x, y) in v]
+        elif k == "sThick": op[k] = v/sz
+        else: op[k] = v
+    return op
+
+#-----------------------------------------------------------------------
+
+def getKShapeRect(kD, sz):
+    """ Bounding rect of pixels, which can be changed by drawing a shape.
+
+    Args:
+        kD (dict): Drawing info. with relative values
+          (see normalizeKShape).
+        sz (int): Tile size.
+
+    Returns:
+        (None/ wx.Rect): Bounding rect in the tile. Empty rect, if 
+          the shape is out of the tile. None for 'fill'; its rect is
+          known only after filling (see drawKShape).
+    """
+    if DEBUG: print("modFTKandinsky.getKShapeRect()")
+
+    tileR = wx.Rect(0, 0, sz, sz)
+    name = kD["name"]
+    if name == "fill": return None
+    if name in ["polygon", "pencil"]:
+        pts = kD["pts"]
+    else:
+        pts = []
+        for i in range(1, 4):
+            if kD.get("x%i"%(i)) != None:
+                pts.append((kD["x%i"%(i)], kD["y%i"%(i)]))
+    pts = np.asarray(pts, dtype=np.float64) * sz
+    if name == "circle":
+        rad = np.sqrt(np.sum((pts[1]-pts[0])**2))
+        pts = np.array([pts[0]-rad, pts[0]+rad])
+    # margin for stroke thickness and rounding
+    m = int(np.ceil(kD["sThick"]*sz/2.0)) + 2
+    x1, y1 = np.floor(pts.min(axis=0)).astype(int) - m
+    x2, y2 = np.ceil(pts.max(axis=0)).astype(int) + m
+    return wx.Rect(int(x1), int(y1), int(x2-x1), int(y2-y1)).Intersect(tileR)
+
+#-----------------------------------------------------------------------
+
+def getRegionData(bmp, r):
+    """ Get compressed RGB pixel data in a rect of a bitmap.
+
+    Args:
+        bmp (wx.Bitmap): Bitmap.
+        r (wx.Rect): Rect in the bitmap.
+
+    Returns:
+        (bytes): zlib compressed RGB data.
+    """
+    if DEBUG: print("modFTKandinsky.getRegionData()")
+
+    img = bmp.GetSubBitmap(r).ConvertToImage()
+    return zlib.compress(bytes(img.GetData()), 1)
+
+#-----------------------------------------------------------------------
+
+def putRegionData(bmp, r, data):
+    """ Put compressed RGB pixel data (from getRegionData) in a rect of
+    a bitmap.
+
+    Args:
+        bmp (wx.Bitmap): Bitmap.
+        r (wx.Rect): Rect in the bitmap.
+        data (bytes): zlib compressed RGB data.
+
+    Returns:
+        None
+    """
+    if DEBUG: print("modFTKandinsky.putRegionData()")
+
+    sub = wx.Bitmap.FromBuffer(r.width, r.height, zlib.decompress(data))
+    memDC = wx.MemoryDC(bmp)
+    memDC.DrawBitmap(sub, r.x, r.y)
+    memDC.SelectObject(wx.NullBitmap)
+
+#=======================================================================
+
+class KDisplayList:
+    """ Display list of Kandinsky mode drawings on the tile.
+    Bitmaps of the tile are made from the initial tile image and
+    the drawing operations, and cached per size.
+
+    Args:
+        baseImg (wx.Image): Initial tile image.
+        maxCache (int, optional): Number of tile sizes to cache.
+
+    Attributes:
+        ops (list): Drawing operations with coordinates relative to
+          the tile size (see normalizeKShape).
+        cache (OrderedDict): Tile size -> wx.Bitmap,
+          least recently used first.
+
+    Examples:
+        >>> kDL = KDisplayList(load_img("tile_init.png"))
+        >>> canvas = kDL.getBitmap(600)
+        >>> kDL.add(kD, 600)
+        >>> tileImg = kDL.getImage(100)
+    """
+    def __init__(self, baseImg, maxCache=4):
+        if DEBUG: print("KDisplayList.__init__()")
+
+        self.baseImg = baseImg
+        self.maxCache = maxCache
+        self.ops = []
+        self.cache = OrderedDict()
+
+    #-------------------------------------------------------------------
+
+    def add(self, kD, sz):
+        """ Add a drawing operation and draw it on cached bitmaps.
+
+        Args:
+            kD (dict): Drawing info. (same as in drawKShape)
+              in pixels of the given tile size.
+            sz (int): Tile size, where the shape was drawn.
+
+        Returns:
+            op (dict): Added operation.
+            rect (None/ wx.Rect): Rect of changed pixels on the cached 
+              bitmap of size sz, for 'fill' (see drawKShape).
+        """
+        if DEBUG: print("KDisplayList.add()")
+
+        op = normalizeKShape(kD, sz)
+        self.ops.append(op)
+        rect = None
+        for cSz in self.cache.keys():
+            memDC = wx.MemoryDC(self.cache[cSz])
+            r = drawKShape(memDC, op, cSz)
+            memDC.SelectObject(wx.NullBitmap)
+            if cSz == sz: rect = r
+        return op, rect
+
+    #-------------------------------------------------------------------
+
+    def rasterize(self, sz):
+        """ Make a bitmap of the tile with all drawings.
+
+        Args:
+            sz (int): Tile size.
+
+        Returns:
+            bmp (wx.Bitmap): Tile bitmap.
+        """
+        if DEBUG: print("KDisplayList.rasterize()")
+
+        img = self.baseImg
+        if img.GetSize()[0] != sz:
+            img = img.Scale(sz, sz, wx.IMAGE_QUALITY_HIGH)
+        bmp = wx.Bitmap(img)
+        if len(self.ops) > 0:
+            memDC = wx.MemoryDC(bmp)
+            for op in self.ops: drawKShape(memDC, op, sz)
+            memDC.SelectObject(wx.NullBitmap)
+        return bmp
+
+    #-------------------------------------------------------------------
+
+    def getBitmap(self, sz):
+        """ Return cached tile bitmap, make it if it's not cached.
+        Returned bitmap is updated when a drawing is added.
+
+        Args:
+            sz (int): Tile size.
+
+        Returns:
+            (wx.Bitmap): Tile bitmap.
+        """
+        if DEBUG: print("KDisplayList.getBitmap()")
+
+        if sz in self.cache:
+            self.cache.move_to_end(sz)
+        else:
+            self.cache[sz] = self.rasterize(sz)
+            while len(self.cache) > self.maxCache:
+                self.cache.popitem(last=False)
+        return self.cache[sz]
+
+    #-------------------------------------------------------------------
+
+    def getImage(self, sz):
+        """ Return tile image of the given size.
+
+        Args:
+            sz (int): Tile size.
+
+        Returns:
+            (wx.Image): Tile image.
+        """
+        if DEBUG: print("KDisplayList.getImage()")
+
+        return self.getBitmap(sz).ConvertToImage()
+
+    #-------------------------------------------------------------------
+
+    def clearCache(self, keepSz=None):
+        """ Remove cached bitmaps.
+
+        Args:
+            keepSz (None/ int): Size of bitmap to keep.
+
+        Returns:
+            None
+        """
+        if DEBUG: print("KDisplayList.clearCache()")
+
+        for cSz in list(self.cache.keys()):
+            if cSz != keepSz: del self.cache[cSz]
+
+#=======================================================================
+
+class KUndoStack:
+    """ Undo/redo of drawings in a KDisplayList.
+    For each drawing, only pixels in its bounding rect on the bitmap of
+    the size, where it was drawn, are stored (compressed)
+    before and after drawing it. Undo/redo put those pixels back
+    and remove/add the drawing operation in the display list,
+    so they take time proportional to the changed area.
+    Bitmaps of other sizes are made again from the display list,
+    when they're needed.
+
+    Args:
+        kDL (KDisplayList): Display list to draw in.
+        maxBytes (int, optional): Maximum size of stored pixel data.
+          Oldest steps are removed (can't be undone anymore),
+          when it's exceeded.
+
+    Attributes:
+        undoSteps (list): Steps to undo, oldest first.
+        redoSteps (list): Steps to redo, most recently undone last.
+        nBytes (int): Size of stored pixel data.
+
+    Examples:
+        >>> kUndo = KUndoStack(kDL)
+        >>> kUndo.add(kD, 600)
+        >>> kUndo.undo(600)
+        (10, 10, 50, 50)
+    """
+    def __init__(self, kDL, maxBytes=32*1024*1024):
+        if DEBUG: print("KUndoStack.__init__()")
+
+        self.kDL = kDL
+        self.maxBytes = maxBytes
+        self.undoSteps = []
+        self.redoSteps = []
+        self.nBytes = 0
+
+    #-------------------------------------------------------------------
+
+    def add(self, kD, sz):
+        """ Draw a shape in display list and store a step to undo it.
+
+        Args:
+            kD (dict): Drawing info. (same as in drawKShape)
+              in pixels of the given tile size.
+            sz (int): Tile size, where the shape was drawn.
+
+        Returns:
+            None
+        """
+        if DEBUG: print("KUndoStack.add()")
+
+        bmp = self.kDL.getBitmap(sz)
+        r = getKShapeRect(normalizeKShape(kD, sz), sz)
+        before = None
+        if r == None:
+        # fill; filled rect is known after filling, 
+        #   so its pixels are cut from a copy of the bitmap
+            w, h = bmp.GetSize()
+            prev = np.zeros((h, w, 3), dtype=np.uint8)
+            bmp.CopyToBuffer(prev)
+        elif not r.IsEmpty():
+            before = getRegionData(bmp, r)
+        op, fillR = self.kDL.add(kD, sz)
+        if r == None:
+            r = wx.Rect() if fillR == None else fillR
+            if not r.IsEmpty():
+                sub = prev[r.y:r.y+r.height,r.x:r.x+r.width]
+                before = zlib.compress(sub.tobytes(), 1)
+        after = None
+        if not r.IsEmpty(): after = getRegionData(bmp, r)
+        step = dict(op=op, sz=sz, rect=r, before=before, after=after)
+        self.undoSteps.append(step)
+        self.nBytes += self.stepBytes(step)
+        ### new drawing; steps undone so far can't be redone
+        for step in self.redoSteps: self.nBytes -= self.stepBytes(step)
+        self.redoSteps = []
+        ### remove oldest steps, if there's too much data
+        while self.nBytes > self.maxBytes and len(self.undoSteps) > 1:
+            self.nBytes -= self.stepBytes(self.undoSteps.pop(0))
+
+    #-------------------------------------------------------------------
+
+    def stepBytes(self, step):
+        """ Size of pixel data of a step.
+
+        Args:
+            step (dict): Undo/redo step.
+
+        Returns:
+            (int): Number of bytes.
+        """
+        n = 0
+        if step["before"] != None: n += len(step["before"])
+        if step["after"] != None: n += len(step["after"])
+        return n
+
+    #-------------------------------------------------------------------
+
+    def undo(self, sz):
+        """ Undo the last drawing.
+
+        Args:
+            sz (int): Current tile size (of canvas).
+
+        Returns:
+            (None/ wx.Rect): Changed rect on canvas. 
+              None, if there was no step to undo.
+        """
+        if DEBUG: print("KUndoStack.undo()")
+
+        if len(self.undoSteps) == 0: return None
+        step = self.undoSteps.pop()
+        self.kDL.ops.pop() # last operation is the one of this step
+        self.redoSteps.append(step)
+        self.restore(step, "before", sz)
+        return step["rect"]
+
+    #-------------------------------------------------------------------
+
+    def redo(self, sz):
+        """ Redo the last undone drawing.
+
+        Args:
+            sz (int): Current tile size (of canvas).
+
+        Returns:
+            (None/ wx.Rect): Changed rect on canvas. 
+              None, if there was no step to redo.
+        """
+        if DEBUG: print("KUndoStack.redo()")
+
+        if len(self.redoSteps) == 0: return None
+        step = self.redoSteps.pop()
+        self.kDL.ops.append(step["op"])
+        self.undoSteps.append(step)
+        self.restore(step, "after", sz)
+        return step["rect"]
+
+    #-------------------------------------------------------------------
+
+    def restore(self, step, key, sz):
+        """ Put stored pixels of a step back on canvas.
+
+        Args:
+            step (dict): Undo/redo step.
+            key (str): 'before' or 'after'.
+            sz (int): Current tile size (of canvas).
+
+        Returns:
+            None
+        """
+        if DEBUG: print("KUndoStack.restore()")
+
+        if step["sz"] == sz and step["sz"] in self.kDL.cache:
+            if step[key] != None:
+                putRegionData(self.kDL.cache[sz], step["rect"], step[key])
+            self.kDL.clearCache(sz)
+        else:
+            # pixels were stored in another size;
+            #   bitmaps will be made again from display list
+            self.kDL.clearCache()
+
+#=======================================================================
+
+if __name__ == '__main__':
+    pass
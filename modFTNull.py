@@ -0,0 +1,519 @@
+# coding: UTF-8
+"""
+Monte Carlo null distributions of analysis values of final states.
+Large batches of random boards are analyzed with the array based
+functions of modFTAnalysis (spread over a pool of processes),
+and the distributions are cached on disk per grid size, so that
+percentiles and p-values of a session's analysis values can be
+reported against boards without any intention behind them.
+
+Null models:
+    uniform: each tile has a random orientation.
+    exact: same as uniform, but all states of a small grid are 
+      counted (see modFTEnum); used instead of uniform, when the table
+      of the grid is in the cache folder.
+    ratio: the tiles of a final state in random positions;
+      the orientation ratio of the final state is kept. 
+      Its distributions depend on the orientation counts of each 
+      final state, so they are smaller, kept only in memory (a few 
+      recent ones) and not reported for entropy and translational 
+      symmetry, which are fixed by the orientation counts.
+
+Dependency:
+    Numpy (1.17),
+
+------------------------------------------------------------------------
+Copyright (C) 2020 Jinook Oh & Tecumseh Fitch
+- Contact: jinook0707@gmail.com, tecumseh.fitch@univie.ac.at
+
+This program is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by the
+Free Software Foundation, either version 3 of the License, or (at your
+option) any later version.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program.  If not, see <http://www.gnu.org/licenses/>.
+------------------------------------------------------------------------
+"""
+
+import os
+from os import path, cpu_count
+from time import time
+from collections import OrderedDict
+from threading import Event
+from multiprocessing import Pool
+
+import numpy as np
+
+import modFTAnalysis as ftA
+
+DEBUG = False
+# analysis values with null distributions
+#   (names are same as in modFTBatch.COLUMNS)
+METRICS = ["entropy", "symHor", "symVer", "sym1Dia", "sym2Dia",
+           "translationalSym", "tileMakerSym", "rotSym180", "rotSym90"]
+# METRICS which are same in all boards of the ratio model
+RATIO_FIXED_METRICS = ["entropy", "translationalSym"]
+# analysis values (-1.0 ~ 2.0) in thousandths + VALUE_OFFSET are
+#   column indices of exact tables
+VALUE_OFFSET = 1000
+N_VALUES = 3001
+
+#-----------------------------------------------------------------------
+
+def roundArr(x, places=3, flagClean=True):
+    """ Round values as the built-in round (modFTAnalysis.roundArray),
+    which can differ from numpy.round at halves.
+    With flagClean, values are first rounded to 9 places, because 
+    computing a stack of final states at once can leave tiny errors, 
+    which would move halves such as 0.1875 to the other side.
+    Analysis values have few distinct values, so only those are rounded.
+
+    Args:
+        x (numpy.ndarray): Values.
+        places (int): Number of decimal places.
+        flagClean (bool): Remove tiny errors before rounding.
+
+    Returns:
+        (numpy.ndarray): Rounded values.
+    """
+    uniq, inv = np.unique(x, return_inverse=True)
+    if flagClean: uniq = [round(float(v), 9) for v in uniq]
+    uniq = np.array([round(float(v), places) for v in uniq])
+    return uniq[inv].reshape(x.shape)
+
+#-----------------------------------------------------------------------
+
+def getMetricsArr(a):
+    """ Analysis values of METRICS of a stack of final states,
+    rounded as in modFTAnalysis.getFinalStateAnalysis. Values 
+    exactly at a half (such as 0.1875) can differ by 0.001, because
+    getFinalStateAnalysis rounds them with its floating point errors;
+    values of a session to compare with null distributions should be 
+    computed here too (getMetricsArr(a[None])[0]).
+
+    Args:
+        a (numpy.ndarray): Stack of angle layers (n x rows x columns).
+
+    Returns:
+        vals (numpy.ndarray): n x len(METRICS)
+    """
+    if DEBUG: print("modFTNull.getMetricsArr()")
+
+    a = ftA.toAngleArr(a)
+    n = len(a)
+    codes = ((a%360)//90).reshape(n, -1)
+    counts = np.stack([(codes == i).sum(axis=1) for i in range(4)], axis=1)
+    p = counts / float(codes.shape[1])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        entropy = -np.where(p > 0, p*np.log2(p), 0).sum(axis=1)
+    vals = np.empty((n, len(METRICS)))
+    vals[:,0] = entropy
+    vals[:,1:5] = ftA.getSymmetryValuesArr(a)
+    vals[:,6] = ftA.getTileMakerSymmetryArr(a)
+    vals[:,7:9] = ftA.getRotationalSymmetriesArr(a)
+    vals = roundArr(vals)
+    # from the rounded entropy, as in getFinalStateAnalysis
+    vals[:,5] = roundArr(1-vals[:,0]/2, 3, False)
+    return vals
+
+#-----------------------------------------------------------------------
+
+def sampleBoards(rng, n, rows, cols, counts=None):
+    """ Random boards of a null model.
+
+    Args:
+        rng (numpy.random.Generator): Random number generator.
+        n (int): Number of boards.
+        rows (int): Number of rows.
+        cols (int): Number of columns.
+        counts (None/ list): Number of tiles of [0, 90, 180, 270]
+          orientations for 'ratio' model. None means 'uniform' model.
+
+    Returns:
+        (numpy.ndarray): Angles (n x rows x columns).
+    """
+    if counts == None:
+        return rng.integers(0, 4, (n, rows, cols)) * 90
+    tiles = np.repeat(np.arange(4)*90, counts)
+    order = np.argsort(rng.random((n, rows*cols)), axis=1)
+    return tiles[order].reshape(n, rows, cols)
+
+#-----------------------------------------------------------------------
+
+def sampleMetrics(args):
+    """ Analysis values of a batch of random boards.
+    This runs in worker processes of the pool.
+
+    Args:
+        args (tuple): rows, columns, number of boards,
+          counts (see sampleBoards) and seed of the batch.
+
+    Returns:
+        (numpy.ndarray): Analysis values in thousandths
+          (number of boards x len(METRICS)), int16.
+    """
+    rows, cols, n, counts, seed = args
+    rng = np.random.default_rng(seed)
+    vals = getMetricsArr(sampleBoards(rng, n, rows, cols, counts))
+    return np.round(vals*1000).astype(np.int16)
+
+#-----------------------------------------------------------------------
+
+def makeNullDist(rows, cols, n=100000, counts=None, nProc=1,
+                 batchSz=10000, seed=None, cancelEvent=None):
+    """ Make null distributions of METRICS.
+
+    Args:
+        rows (int): Number of rows.
+        cols (int): Number of columns.
+        n (int): Number of random boards.
+        counts (None/ list): See sampleBoards.
+        nProc (None/ int): Number of processes.
+          None means number of CPU cores.
+        batchSz (int): Number of boards analyzed at once.
+        seed (None/ int): Seed of random numbers.
+        cancelEvent (None/ threading.Event): When it's set, 
+          making the distributions stops after the current batch.
+
+    Returns:
+        dist (None/ numpy.ndarray): Sorted analysis values in 
+          thousandths of each metric (len(METRICS) x n), int16.
+          None, if it was cancelled.
+    """
+    if DEBUG: print("modFTNull.makeNullDist()")
+
+    nBatches = int(np.ceil(n/float(batchSz)))
+    seeds = np.random.SeedSequence(seed).spawn(nBatches)
+    args = []
+    for i in range(nBatches):
+        bn = min(batchSz, n-i*batchSz)
+        args.append((rows, cols, bn, counts, seeds[i]))
+    if nProc == None: nProc = cpu_count()
+    nProc = max(1, min(nProc, nBatches))
+    if nProc == 1:
+        rslts = map(sampleMetrics, args)
+    else:
+        pool = Pool(nProc)
+        rslts = pool.imap(sampleMetrics, args)
+    vals = []
+    for v in rslts:
+        if cancelEvent != None and cancelEvent.is_set(): break
+        vals.append(v)
+    if nProc > 1:
+        if len(vals) < nBatches: pool.terminate()
+        else: pool.close()
+        pool.join()
+    if len(vals) < nBatches: return None
+    dist = np.ascontiguousarray(np.concatenate(vals).T)
+    dist.sort(axis=1)
+    return dist
+
+#-----------------------------------------------------------------------
+
+def getNullStats(dist, vals):
+    """ Percentiles and p-values of analysis values.
+    Percentile counts half of the ties of the null distribution;
+    p-value is one-sided (null boards with values at least as large),
+    as (1 + count) / (1 + n).
+
+    Args:
+        dist (numpy.ndarray): Null distributions (see makeNullDist).
+        vals (list): Analysis values in the order of METRICS.
+
+    Returns:
+        stats (list): [percentile, p-value] of each metric.
+    """
+    n = dist.shape[1]
+    stats = []
+    for i, v in enumerate(vals):
+        v = int(round(v*1000))
+        nLess = np.searchsorted(dist[i], v, 'left')
+        nGreater = n - np.searchsorted(dist[i], v, 'right')
+        pct = 100.0 * (nLess + 0.5*(n-nLess-nGreater)) / n
+        pVal = (1.0 + n - nLess) / (1.0 + n)
+        stats.append([round(float(pct), 2), round(float(pVal), 5)])
+    return stats
+
+#-----------------------------------------------------------------------
+
+def getExactTableFileName(rows, cols):
+    """ File name of the exact table of a grid (see modFTEnum).
+
+    Args:
+        rows (int): Number of rows.
+        cols (int): Number of columns.
+
+    Returns:
+        (str): File name.
+    """
+    return "exact_%ix%i.npy"%(rows, cols)
+
+#-----------------------------------------------------------------------
+
+def getTableStats(cdf, vals):
+    """ Percentiles and p-values of analysis values from an exact table;
+    same definitions as getNullStats, without the added random board
+    in p-value, because all states are counted.
+
+    Args:
+        cdf (numpy.ndarray): Table of cumulative counts 
+          (see modFTEnum.makeExactTable).
+        vals (list): Analysis values in the order of METRICS.
+
+    Returns:
+        stats (list): [percentile, p-value] of each metric.
+    """
+    stats = []
+    for i, v in enumerate(vals):
+        idx = int(round(v*1000)) + VALUE_OFFSET
+        n = int(cdf[i,-1])
+        nLE = int(cdf[i,idx]) # less than or equal
+        nLess = 0
+        if idx > 0: nLess = int(cdf[i,idx-1])
+        pct = 100.0 * (nLess + 0.5*(nLE-nLess)) / n
+        pVal = float(n - nLess) / n
+        stats.append([round(pct, 2), round(pVal, 5)])
+    return stats
+
+#=======================================================================
+
+class NullDistCache:
+    """ Null distributions; uniform ones are cached in .npy files, 
+    one per grid size, and loaded with mmap. Ratio model distributions
+    (one per grid size and orientation counts) are smaller and kept 
+    only in memory, for the most recent maxRatio ones.
+    Missing distributions are made when they are requested.
+    Exact tables (see modFTEnum) are only loaded, not made.
+
+    Args:
+        dirPath (str): Folder of the cache files.
+        n (int): Number of random boards of each uniform distribution.
+        nProc (None/ int): Number of processes to make distributions.
+        seed (None/ int): Seed of random numbers.
+        nRatio (int): Number of random boards of each ratio model
+          distribution.
+        maxRatio (int): Maximum number of ratio model distributions
+          in memory.
+
+    Attributes:
+        mem (dict): Uniform distributions and exact tables (memory-mapped);
+          file name -> array.
+        ratioMem (OrderedDict): Ratio model distributions, least recently
+          used first; (rows, columns, counts) -> array.
+        cancelEvent (threading.Event): Set by cancel.
+
+    Examples:
+        >>> nullCache = NullDistCache('output/null')
+        >>> nullCache.getSessionStats(ftArr[:,:,0])['stats']
+        {'entropy': [12.3, 0.877, None, None], ...}
+    """
+    def __init__(self, dirPath, n=100000, nProc=1, seed=None, 
+                 nRatio=10000, maxRatio=16):
+        if DEBUG: print("NullDistCache.__init__()")
+
+        self.dirPath = dirPath
+        self.n = n
+        self.nProc = nProc
+        self.seed = seed
+        self.nRatio = nRatio
+        self.maxRatio = maxRatio
+        self.mem = {}
+        self.ratioMem = OrderedDict()
+        self.cancelEvent = Event()
+        if not path.isdir(dirPath): os.makedirs(dirPath)
+
+    #-------------------------------------------------------------------
+
+    def getFileName(self, rows, cols):
+        """ File name of a uniform distribution.
+
+        Args:
+            rows (int): Number of rows.
+            cols (int): Number of columns.
+
+        Returns:
+            (str): File name.
+        """
+        return "null_%ix%i_uniform_%i.npy"%(rows, cols, self.n)
+
+    #-------------------------------------------------------------------
+
+    def get(self, rows, cols):
+        """ Get a uniform null distribution; load or make it.
+
+        Args:
+            rows (int): Number of rows.
+            cols (int): Number of columns.
+
+        Returns:
+            (None/ numpy.memmap): Null distributions (see makeNullDist).
+              None, if making it was cancelled.
+        """
+        if DEBUG: print("NullDistCache.get()")
+
+        fn = self.getFileName(rows, cols)
+        if fn in self.mem: return self.mem[fn]
+        fp = path.join(self.dirPath, fn)
+        if not path.isfile(fp):
+            dist = makeNullDist(rows, cols, self.n, None, self.nProc,
+                                seed=self.seed, cancelEvent=self.cancelEvent)
+            if dist is None: return None
+            tmpFP = fp + ".tmp"
+            fh = open(tmpFP, 'wb')
+            np.save(fh, dist)
+            fh.close()
+            os.replace(tmpFP, fp) # complete files only
+        self.mem[fn] = np.load(fp, mmap_mode='r')
+        return self.mem[fn]
+
+    #-------------------------------------------------------------------
+
+    def getRatio(self, rows, cols, counts):
+        """ Get a ratio model null distribution; make it, 
+        if it's not one of the recent ones in memory.
+
+        Args:
+            rows (int): Number of rows.
+            cols (int): Number of columns.
+            counts (list): See sampleBoards.
+
+        Returns:
+            (None/ numpy.ndarray): Null distributions (see makeNullDist).
+              None, if making it was cancelled.
+        """
+        if DEBUG: print("NullDistCache.getRatio()")
+
+        key = (rows, cols, tuple(counts))
+        if key in self.ratioMem:
+            self.ratioMem.move_to_end(key)
+            return self.ratioMem[key]
+        dist = makeNullDist(rows, cols, self.nRatio, list(counts), 
+                            self.nProc, seed=self.seed, 
+                            cancelEvent=self.cancelEvent)
+        if dist is None: return None
+        self.ratioMem[key] = dist
+        if len(self.ratioMem) > self.maxRatio:
+            self.ratioMem.popitem(last=False)
+        return dist
+
+    #-------------------------------------------------------------------
+
+    def getExact(self, rows, cols):
+        """ Get the exact table of a grid, if it's in the cache folder.
+
+        Args:
+            rows (int): Number of rows.
+            cols (int): Number of columns.
+
+        Returns:
+            (None/ numpy.memmap): Table of cumulative counts.
+        """
+        if DEBUG: print("NullDistCache.getExact()")
+
+        fn = getExactTableFileName(rows, cols)
+        if not fn in self.mem:
+            fp = path.join(self.dirPath, fn)
+            if not path.isfile(fp): return None
+            self.mem[fn] = np.load(fp, mmap_mode='r')
+        return self.mem[fn]
+
+    #-------------------------------------------------------------------
+
+    def cancel(self):
+        """ Stop making distributions (such as when the program is
+        closing); getSessionStats returns None afterwards.
+
+        Args: None
+
+        Returns: None
+        """
+        if DEBUG: print("NullDistCache.cancel()")
+
+        self.cancelEvent.set()
+
+    #-------------------------------------------------------------------
+
+    def getSessionStats(self, a):
+        """ Percentiles and p-values of a final state under
+        uniform (or exact, if its table is there) and ratio null models.
+
+        Args:
+            a (numpy.ndarray): Angle layer of ftArr (rows x columns).
+
+        Returns:
+            nullRslt (None/ dict): None, if it was cancelled.
+              'models' (list): Names of null models.
+              'n' (list): Number of random boards (or all states)
+                of each model.
+              'metrics' (list): METRICS.
+              'values' (list): Analysis values of METRICS 
+                (from getMetricsArr, as the null distributions).
+              'stats' (dict): Metric -> [percentile, p-value] of
+                each model (concatenated); None for 
+                RATIO_FIXED_METRICS in ratio model.
+        """
+        if DEBUG: print("NullDistCache.getSessionStats()")
+
+        if self.cancelEvent.is_set(): return None
+        a = ftA.toAngleArr(a)
+        rows, cols = a.shape
+        counts = np.bincount(((a%360)//90).ravel(), minlength=4).tolist()
+        vals = getMetricsArr(a[None])[0].tolist()
+        cdf = self.getExact(rows, cols)
+        if cdf is None:
+            dist = self.get(rows, cols)
+            if dist is None: return None
+            models = ["uniform", "ratio"]
+            n = [self.n, self.nRatio]
+            stats = [getNullStats(dist, vals)]
+        else:
+            models = ["exact", "ratio"]
+            n = [int(cdf[0,-1]), self.nRatio]
+            stats = [getTableStats(cdf, vals)]
+        dist = self.getRatio(rows, cols, counts)
+        if dist is None: return None
+        stats.append(getNullStats(dist, vals))
+        for i, k in enumerate(METRICS):
+            if k in RATIO_FIXED_METRICS: stats[1][i] = [None, None]
+        stats = dict([(k, stats[0][i]+stats[1][i]) for i, k in \
+                                                    enumerate(METRICS)])
+        return dict(models=models, n=n, metrics=list(METRICS), 
+                    values=vals, stats=stats)
+
+#=======================================================================
+
+def precomputeNullDist(dirPath, rows, cols, n=100000, nProc=None):
+    """ Make the uniform null distribution of a grid size in
+    the cache folder, with a pool of processes.
+
+    Args:
+        dirPath (str): Folder of the cache files.
+        rows (int): Number of rows.
+        cols (int): Number of columns.
+        n (int): Number of random boards.
+        nProc (None/ int): Number of processes.
+
+    Returns:
+        fp (str): File path of the distribution.
+    """
+    if DEBUG: print("modFTNull.precomputeNullDist()")
+
+    startTime = time()
+    nullCache = NullDistCache(dirPath, n, nProc)
+    nullCache.get(rows, cols)
+    fp = path.join(dirPath, nullCache.getFileName(rows, cols))
+    msg = "Null distribution of %i random %ix%i boards "%(n, rows, cols)
+    msg += "was made in %.3f seconds.\n%s"%(time()-startTime, fp)
+    print(msg)
+    return fp
+
+#-----------------------------------------------------------------------
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,887 @@
+# coding: UTF-8
+"""
+Reading and writing FlexTiles session files (ft_*.csv) 
+in output folder, and binary session files (ft_*.npz) which hold 
+the same data for fast (memory-mapped) loading in batch pipelines.
+
+Dependency:
+    Numpy (1.17),
+
+------------------------------------------------------------------------
+Copyright (C) 2020 Jinook Oh & Tecumseh Fitch
+- Contact: jinook0707@gmail.com, tecumseh.fitch@univie.ac.at
+
+This program is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by the
+Free Software Foundation, either version 3 of the License, or (at your
+option) any later version.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program.  If not, see <http://www.gnu.org/licenses/>.
+------------------------------------------------------------------------
+"""
+
+import os, struct, json, zipfile
+from glob import glob
+from threading import Thread, Lock, Event
+
+import numpy as np
+from numpy.lib import format as npFormat
+
+import modFTAnalysis as ftA
+
+DEBUG = False
+JOURNAL_MAGIC = b"FTJ1" # beginning of click journal file
+JOURNAL_HEADER = struct.Struct("<4sHHd") # magic, rows, columns, 
+  # starting time (seconds since the epoch)
+JOURNAL_REC = struct.Struct("<HHdH") # row, column, click-time, 
+  # resulting angle
+JOURNAL_DTYPE = np.dtype([("row", "<u2"), ("col", "<u2"), 
+                          ("time", "<f8"), ("angle", "<u2")])
+JOURNAL_END = 0xFFFF # row & column of closing record
+JOURNAL_LOCK_EXT = ".lock" # lock file of an active journal, with its PID
+SECTION_HEADERS = [("state", "# Final state"), 
+                   ("clicks", "# Number of clicks"),
+                   ("analysis", "# Analysis"),
+                   ("null", "# Null model"),
+                   ("seq", "# Sequence")] # headers of sections in CSV
+SEQ_DTYPE = np.dtype([("seq", "<u4"), ("row", "<u2"), ("col", "<u2"),
+                      ("time", "<f8")]) # click sequence
+NPZ_VERSION = 1 # format version of binary session file
+
+#-----------------------------------------------------------------------
+
+def parseNumBlock(txt, nCols, dtype):
+    """ Parse a block of comma separated numbers at once.
+
+    Args:
+        txt (str): Text of the block; comment lines are not allowed.
+        nCols (None/ int): Number of columns. 
+          None means number of values in the first line.
+        dtype (numpy.dtype): Data type of values.
+
+    Returns:
+        (numpy.ndarray): Values (lines x columns).
+    """
+    txt = txt.strip()
+    if txt == "": return np.zeros((0, 0 if nCols == None else nCols), 
+                                  dtype=dtype)
+    if nCols == None: nCols = txt.split("\n", 1)[0].count(",") + 1
+    vals = np.array(txt.replace(",", " ").split(), dtype=np.float64)
+    return vals.reshape((-1, nCols)).astype(dtype)
+
+#-----------------------------------------------------------------------
+
+def parseAnalysisBlock(txt):
+    """ Parse analysis results lines.
+
+    Args:
+        txt (str): Text of analysis results block.
+
+    Returns:
+        aRslt (dict): Analysis results with the same keys as 
+          modFTAnalysis.getFinalStateAnalysis. 
+          Values, which are not in the text, are not included.
+    """
+    keys = [("The Entropy", "entropy"), 
+            ("Orientation ratio", "orientationRatio"),
+            ("Symmetries", "symmetries"),
+            ("Translational Symmetry", "translationalSymmetry"),
+            ("Tile Maker Symmetry", "tileMakerSymmetry"),
+            ("Rotational Symmetries", "rotationalSymmetries")]
+    aRslt = {}
+    for line in txt.split("\n"):
+        for prefix, k in keys:
+            if not line.startswith(prefix): continue
+            v = line[line.rfind(", ")+2:].strip()
+            if v.startswith("["): 
+                aRslt[k] = [float(x) for x in v.strip("[]").split("/")]
+            else:
+                aRslt[k] = float(v)
+            break
+    return aRslt
+
+#-----------------------------------------------------------------------
+
+def parseNullBlock(txt):
+    """ Parse null model results lines.
+
+    Args:
+        txt (str): Text of null model results block.
+
+    Returns:
+        nullRslt (dict): Metric -> [percentile, p-value] of 
+          each null model (see modFTNull.NullDistCache.getSessionStats;
+          only 'stats' are in the text). Empty cells are None.
+    """
+    stats = {}
+    for line in txt.split("\n"):
+        items = [x.strip() for x in line.split(",")]
+        if len(items) < 4: continue
+        stats[items[0]] = [None if x == "" else float(x) for x in items[2:]]
+    return dict(stats=stats)
+
+#-----------------------------------------------------------------------
+
+def loadSessionCSV(fp):
+    """ Load a session CSV file, written by FlexTilesFrame.onSave.
+    The file is read at once, split into sections by their header lines
+    and numbers of each section are parsed in bulk.
+
+    Args:
+        fp (str): File path of the session CSV file.
+
+    Returns:
+        sess (dict): Session data.
+          'ftArr' (numpy.ndarray): Same as FlexTilesFrame.ftArr;
+            rows x columns x [angle, number of clicks].
+          'ftSeq' (numpy.ndarray): Click sequence (SEQ_DTYPE).
+          'nSeq' (int): Number of clicks in the click sequence.
+          'analysis' (dict): Analysis results (see parseAnalysisBlock).
+          'null' (dict): Null model results (see parseNullBlock);
+            only when the file has them.
+
+    Examples:
+        >>> sess = loadSessionCSV('output/ft_20200501120000.csv')
+        >>> sess['ftArr'].shape
+        (8, 8, 2)
+
+    Raises:
+        ValueError: When the file doesn't have the final state block.
+    """
+    if DEBUG: print("modFTSession.loadSessionCSV()")
+
+    fh = open(fp, 'r')
+    txt = fh.read()
+    fh.close()
+
+    ### find sections 
+    pos = []
+    for k, header in SECTION_HEADERS:
+        idx = txt.find(header)
+        if idx != -1: pos.append((idx, k))
+    pos.sort()
+    sections = {}
+    for i, (idx, k) in enumerate(pos):
+        end = len(txt)
+        if i+1 < len(pos): end = pos[i+1][0]
+        # remove comment lines at the beginning of the section
+        lines = txt[idx:end].split("\n")
+        n = 0
+        while n < len(lines) and lines[n].startswith("#"): n += 1
+        sections[k] = "\n".join(lines[n:])
+
+    if not "state" in sections or sections["state"].strip() == "":
+        raise ValueError("No final state found in %s"%(fp))
+    state = parseNumBlock(sections["state"], None, np.uint16)
+    ftArr = np.zeros((state.shape[0], state.shape[1], 2), dtype=np.uint16)
+    ftArr[:,:,0] = state
+    if "clicks" in sections:
+        clicks = parseNumBlock(sections["clicks"], state.shape[1], np.uint16)
+        if clicks.shape == state.shape: ftArr[:,:,1] = clicks
+    aRslt = {}
+    if "analysis" in sections: aRslt = parseAnalysisBlock(sections["analysis"])
+    seq = np.zeros(0, dtype=SEQ_DTYPE)
+    if "seq" in sections:
+        vals = parseNumBlock(sections["seq"], 4, np.float64)
+        seq = np.zeros(len(vals), dtype=SEQ_DTYPE)
+        for i, k in enumerate(SEQ_DTYPE.names): seq[k] = vals[:,i]
+    sess = dict(ftArr=ftArr, ftSeq=seq, nSeq=len(seq), analysis=aRslt)
+    if "null" in sections: sess["null"] = parseNullBlock(sections["null"])
+    return sess
+
+#-----------------------------------------------------------------------
+
+def readSessionCSV(fp):
+    """ Read final state, number of clicks in each tile and
+    number of clicks in the click sequence from a session CSV file,
+    written by FlexTilesFrame.onSave.
+
+    Args:
+        fp (str): File path of the session CSV file.
+
+    Returns:
+        sess (dict): Session data (see loadSessionCSV).
+
+    Examples:
+        >>> sess = readSessionCSV('output/ft_20200501120000.csv')
+        >>> sess['ftArr'].shape
+        (8, 8, 2)
+
+    Raises:
+        ValueError: When the file doesn't have the final state block.
+    """
+    if DEBUG: print("modFTSession.readSessionCSV()")
+
+    return loadSessionCSV(fp)
+
+#-----------------------------------------------------------------------
+
+def makeSessionCSVText(ftArr, ftSeq, aRslt, nullRslt=None):
+    """ Make text of a session CSV file.
+
+    Args:
+        ftArr (numpy.ndarray): Same as FlexTilesFrame.ftArr;
+          rows x columns x [angle, number of clicks].
+        ftSeq (list): Click sequence; [row, column, click-time].
+        aRslt (dict): Analysis results 
+          (from modFTAnalysis.getFinalStateAnalysis).
+        nullRslt (None/ dict): Percentiles and p-values of 
+          analysis results (from modFTNull.NullDistCache.getSessionStats).
+
+    Returns:
+        (str): Text of the CSV file.
+    """
+    if DEBUG: print("modFTSession.makeSessionCSVText()")
+
+    lines = []
+    hLine = "# -----------------------------------------------------"
+    rowNote = "# - rows and columns match with FlexTiles shown in UI"
+    
+    ### final states of tiles; 
+    ###   as a blank padded number, such as ' 90', '180', ...
+    lines += ["# Final state of each tile", rowNote, hLine]
+    for row in ftArr[:,:,0].tolist():
+        lines.append(", ".join([str(x).rjust(3, ' ') for x in row]))
+    lines.append("")
+
+    ### number of clicks in each tile
+    lines += ["# Number of clicks in each tile", rowNote, hLine]
+    for row in ftArr[:,:,1].tolist():
+        lines.append(", ".join([str(x).rjust(3, ' ') for x in row]))
+    lines.append("")
+
+    ### analysis results
+    def joinVals(vals): return "/".join([str(x) for x in vals])
+    lines += ["# Analysis results", hLine]
+    lines.append("The Entropy of this final state, %s"%(str(aRslt["entropy"])))
+    lines.append("Orientation ratio [0/90/180/270], [%s]"%(
+                                        joinVals(aRslt["orientationRatio"])))
+    lines.append("Symmetries [hor/ver/1dia/2dia], [%s]"%(
+                                        joinVals(aRslt["symmetries"])))
+    lines.append("Translational Symmetry, %s"%(
+                                        str(aRslt["translationalSymmetry"])))
+    lines.append("Tile Maker Symmetry, %s"%(
+                                        str(aRslt["tileMakerSymmetry"])))
+    lines.append("Rotational Symmetries [180/90], [%s]"%(
+                                        joinVals(aRslt["rotationalSymmetries"])))
+    lines.append("")
+
+    ### percentiles and p-values of analysis results in null models
+    if nullRslt != None:
+        models = nullRslt["models"]
+        nInfo = ["%s: N=%i"%(m, n) for m, n in zip(models, nullRslt["n"])]
+        cols = ["[percentile (%s)], [p-value (%s)]"%(m, m) for m in models]
+        lines += ["# Null model results",
+                  "# - random boards; %s"%(", ".join(nInfo)),
+                  "# - p-value is ratio of random boards with the same " + \
+                    "or larger value.",
+                  "# - empty, where all boards of the model have " + \
+                    "the same value.",
+                  "# [metric], [value], %s"%(", ".join(cols)),
+                  hLine]
+        for k, v in zip(nullRslt["metrics"], nullRslt["values"]):
+            stats = ["" if x == None else str(x) for x in nullRslt["stats"][k]]
+            lines.append("%s, %s, %s"%(k, str(v), ", ".join(stats)))
+        lines.append("")
+
+    ### sequence of tile-clicks
+    lines += ["# Sequence of FlexTile-Clicks",
+              "# - click-time is seconds after program-start-time.",
+              "# [sequence], [row-index], [column-index], [click-time]",
+              hLine]
+    for i, (ri, ci, eT) in enumerate(ftSeq):
+        lines.append("%i, %i, %i, %.3f"%(i+1, ri, ci, eT))
+    lines.append("")
+    return "\n".join(lines) + "\n"
+
+#-----------------------------------------------------------------------
+
+def writeSessionCSV(fp, ftArr, ftSeq, aRslt, nullRslt=None):
+    """ Write a session CSV file at once.
+
+    Args:
+        fp (str): File path of the CSV file.
+        ftArr (numpy.ndarray): Same as FlexTilesFrame.ftArr.
+        ftSeq (list): Click sequence; [row, column, click-time].
+        aRslt (dict): Analysis results.
+        nullRslt (None/ dict): Null model results 
+          (see makeSessionCSVText).
+
+    Returns:
+        None
+    """
+    if DEBUG: print("modFTSession.writeSessionCSV()")
+
+    txt = makeSessionCSVText(ftArr, ftSeq, aRslt, nullRslt)
+    fh = open(fp, 'w')
+    fh.write(txt)
+    fh.close()
+
+#-----------------------------------------------------------------------
+
+def seqToArr(ftSeq):
+    """ Convert click sequence list to structured array.
+
+    Args:
+        ftSeq (list): Click sequence; [row, column, click-time].
+
+    Returns:
+        seq (numpy.ndarray): Click sequence (SEQ_DTYPE).
+    """
+    seq = np.zeros(len(ftSeq), dtype=SEQ_DTYPE)
+    if len(ftSeq) > 0:
+        vals = np.asarray(ftSeq, dtype=np.float64)
+        seq["seq"] = np.arange(1, len(ftSeq)+1)
+        seq["row"] = vals[:,0]
+        seq["col"] = vals[:,1]
+        seq["time"] = vals[:,2]
+    return seq
+
+#-----------------------------------------------------------------------
+
+def writeSessionNPZ(fp, ftArr, ftSeq, aRslt, meta={}):
+    """ Write a binary session file (uncompressed .npz).
+    Members are 'ftArr', 'ftSeq' (SEQ_DTYPE), 'analysis' and 'meta'
+    (JSON strings). Members can be memory-mapped in loadSessionNPZ,
+    because the file is not compressed.
+
+    Args:
+        fp (str): File path of the npz file.
+        ftArr (numpy.ndarray): Same as FlexTilesFrame.ftArr.
+        ftSeq (list/ numpy.ndarray): Click sequence; 
+          list of [row, column, click-time] or SEQ_DTYPE array.
+        aRslt (dict): Analysis results.
+        meta (dict, optional): Metadata, such as tile size and version.
+          Grid size and format version are always added.
+
+    Returns:
+        None
+
+    Examples:
+        >>> writeSessionNPZ('output/ft_20200501120000.npz', ftArr, ftSeq,
+                            aRslt, dict(tileSz=100, version='0.1.1'))
+    """
+    if DEBUG: print("modFTSession.writeSessionNPZ()")
+
+    if not isinstance(ftSeq, np.ndarray): ftSeq = seqToArr(ftSeq)
+    meta = dict(meta)
+    meta["rows"], meta["cols"] = [int(x) for x in ftArr.shape[:2]]
+    meta["formatVersion"] = NPZ_VERSION
+    np.savez(fp, 
+             ftArr=np.ascontiguousarray(ftArr, dtype=np.uint16),
+             ftSeq=np.ascontiguousarray(ftSeq, dtype=SEQ_DTYPE),
+             analysis=np.array(json.dumps(aRslt)),
+             meta=np.array(json.dumps(meta)))
+
+#-----------------------------------------------------------------------
+
+def getNPZMemberOffsets(fh):
+    """ Find where data of each (uncompressed) array in an npz file is.
+    Zip directory and npy headers are read from the given file object.
+
+    Args:
+        fh (file object): npz file opened in binary mode; 
+          it's not closed here.
+
+    Returns:
+        offsets (dict): Member name -> (offset of data in the file,
+          dtype, shape, fortran_order). Compressed members are 
+          not included.
+    """
+    if DEBUG: print("modFTSession.getNPZMemberOffsets()")
+
+    offsets = {}
+    zf = zipfile.ZipFile(fh, 'r') # reads zip directory from fh
+    infos = zf.infolist()
+    zf.close() # fh is not closed by ZipFile, because it was passed
+    for info in infos:
+        if info.compress_type != zipfile.ZIP_STORED: continue
+        if not info.filename.endswith(".npy"): continue
+        ### skip local file header of zip
+        fh.seek(info.header_offset)
+        lh = fh.read(30)
+        nameLen, extraLen = struct.unpack("<HH", lh[26:30])
+        fh.seek(info.header_offset + 30 + nameLen + extraLen)
+        ### read npy header
+        version = npFormat.read_magic(fh)
+        if version == (1, 0):
+            shape, fortran, dtype = npFormat.read_array_header_1_0(fh)
+        else:
+            shape, fortran, dtype = npFormat.read_array_header_2_0(fh)
+        offsets[info.filename[:-4]] = (fh.tell(), dtype, shape, fortran)
+    return offsets
+
+#-----------------------------------------------------------------------
+
+def loadSessionNPZ(fp, mmap=False):
+    """ Load a binary session file, written by writeSessionNPZ.
+    The file is opened once; arrays are read (or memory-mapped) at 
+    their offsets, found in getNPZMemberOffsets.
+
+    Args:
+        fp (str): File path of the npz file.
+        mmap (bool): Memory-map 'ftArr' and 'ftSeq' (read-only) 
+          instead of reading them.
+
+    Returns:
+        sess (dict): Session data; 'ftArr', 'ftSeq' (SEQ_DTYPE), 
+          'nSeq', 'analysis' (dict) and 'meta' (dict).
+
+    Examples:
+        >>> sess = loadSessionNPZ('output/ft_20200501120000.npz', True)
+        >>> sess['ftSeq']['time'][-1]
+        123.456
+    """
+    if DEBUG: print("modFTSession.loadSessionNPZ()")
+
+    sess = {}
+    fh = open(fp, 'rb')
+    offsets = getNPZMemberOffsets(fh)
+    npz = None # for compressed members (not written by writeSessionNPZ)
+    for k in ["ftArr", "ftSeq", "analysis", "meta"]:
+        if not k in offsets:
+            if npz == None: npz = np.load(fh, allow_pickle=False)
+            sess[k] = npz[k]
+            continue
+        offset, dtype, shape, fortran = offsets[k]
+        order = 'F' if fortran else 'C'
+        cnt = int(np.prod(shape))
+        if mmap and k in ["ftArr", "ftSeq"] and cnt > 0:
+            sess[k] = np.memmap(fh, dtype=dtype, mode='r', offset=offset, 
+                                shape=shape, order=order)
+        else:
+            fh.seek(offset)
+            arr = np.frombuffer(fh.read(cnt*dtype.itemsize), dtype=dtype,
+                                count=cnt)
+            sess[k] = arr.reshape(shape, order=order).copy()
+    fh.close()
+    sess["analysis"] = json.loads(str(sess["analysis"]))
+    sess["meta"] = json.loads(str(sess["meta"]))
+    sess["nSeq"] = len(sess["ftSeq"])
+    return sess
+
+#-----------------------------------------------------------------------
+
+def csv2npz(csvFP, npzFP=""):
+    """ Convert a session CSV file to a binary session file.
+
+    Args:
+        csvFP (str): File path of the CSV file.
+        npzFP (str, optional): File path of the npz file. 
+          Same as csvFP with .npz extension, if it's empty.
+
+    Returns:
+        npzFP (str): File path of the written npz file.
+    """
+    if DEBUG: print("modFTSession.csv2npz()")
+
+    if npzFP == "": npzFP = os.path.splitext(csvFP)[0] + ".npz"
+    sess = loadSessionCSV(csvFP)
+    writeSessionNPZ(npzFP, sess["ftArr"], sess["ftSeq"], sess["analysis"])
+    return npzFP
+
+#-----------------------------------------------------------------------
+
+def npz2csv(npzFP, csvFP=""):
+    """ Convert a binary session file to a session CSV file.
+
+    Args:
+        npzFP (str): File path of the npz file.
+        csvFP (str, optional): File path of the CSV file. 
+          Same as npzFP with .csv extension, if it's empty.
+
+    Returns:
+        csvFP (str): File path of the written CSV file.
+    """
+    if DEBUG: print("modFTSession.npz2csv()")
+
+    if csvFP == "": csvFP = os.path.splitext(npzFP)[0] + ".csv"
+    sess = loadSessionNPZ(npzFP)
+    aRslt = sess["analysis"]
+    if len(aRslt) < 6: # analysis results are missing
+        aRslt = ftA.getFinalStateAnalysis(sess["ftArr"][:,:,0])
+    seq = sess["ftSeq"]
+    ftSeq = [[int(r), int(c), float(t)] for r, c, t in zip(
+                                        seq["row"], seq["col"], seq["time"])]
+    writeSessionCSV(csvFP, sess["ftArr"], ftSeq, aRslt)
+    return csvFP
+
+#-----------------------------------------------------------------------
+
+def saveWorker(jobQ, rsltQ, aCache=None, nullCache=None):
+    """ Save sessions in a separate thread. 
+    Runs until it receives None from jobQ.
+
+    Args:
+        jobQ (queue.Queue): Queue to receive saving jobs from; 
+          dict with 'img' (image object with SaveFile method, 
+          such as wx.Image), 'imgType' (image type for SaveFile),
+          'imgFP', 'csvFP', 'ftArr' and 'ftSeq'. 
+          With 'npzFP' (and optional 'meta'), binary session file is 
+          also written.
+        rsltQ (queue.Queue): Queue to send results to; 
+          dict with 'imgFP', 'csvFP', 'npzFP', 'nClicks' (number of 
+          saved clicks) and 'error' (empty string, if there was 
+          no error).
+        aCache (None/ modFTCache.AnalysisCache): Analysis cache, 
+          used only in this thread.
+        nullCache (None/ modFTNull.NullDistCache): Null distributions
+          for percentiles and p-values in the CSV file, 
+          used only in this thread. After its cancel is called,
+          CSV files are written without null model results.
+
+    Returns:
+        None
+    """
+    if DEBUG: print("modFTSession.saveWorker()")
+
+    while True:
+        job = jobQ.get()
+        if job == None: break
+        rslt = dict(imgFP=job["imgFP"], csvFP=job["csvFP"], 
+                    npzFP=job.get("npzFP", ""), nClicks=len(job["ftSeq"]),
+                    error="")
+        try:
+            job["img"].SaveFile(job["imgFP"], job["imgType"])
+            a = job["ftArr"][:,:,0]
+            if aCache == None: aRslt = ftA.getFinalStateAnalysis(a)
+            else: aRslt = aCache.getFinalStateAnalysis(a)
+            nullRslt = None
+            if nullCache != None: nullRslt = nullCache.getSessionStats(a)
+            writeSessionCSV(job["csvFP"], job["ftArr"], job["ftSeq"], aRslt,
+                            nullRslt)
+            if rslt["npzFP"] != "":
+                writeSessionNPZ(job["npzFP"], job["ftArr"], job["ftSeq"], 
+                                aRslt, job.get("meta", {}))
+        except Exception as e:
+            rslt["error"] = str(e)
+        rsltQ.put(rslt, True, None)
+
+#=======================================================================
+
+class ClickJournal:
+    """ Append-only binary journal of tile clicks, 
+    so that a session can be recovered after a crash.
+    Records are buffered in memory and written to the file by 
+    a flushing thread, when flushInterval passed or flushCount records 
+    are buffered, so that clicks don't wait for disk I/O.
+    A closing record is written, when the journal is closed.
+
+    File format: 
+        header (JOURNAL_HEADER), 
+        records (JOURNAL_REC; row, column, click-time, resulting angle),
+        closing record (row & column are JOURNAL_END).
+    While the journal is open, a lock file (journal file path + 
+    JOURNAL_LOCK_EXT) holds the process ID of the writing program, 
+    so that other instances of the program don't take it as interrupted.
+
+    Args:
+        fp (str): File path of the journal.
+        rows (int): Number of rows of FlexTiles.
+        cols (int): Number of columns of FlexTiles.
+        initTime (float): Starting time of the session 
+          (seconds since the epoch). Click-times are seconds after it.
+        flushInterval (float, optional): Maximum seconds to keep 
+          records in buffer.
+        flushCount (int, optional): Maximum number of records 
+          to keep in buffer.
+
+    Examples:
+        >>> journal = ClickJournal('output/journal_20200501120000.ftj', 
+                                   8, 8, time())
+        >>> journal.append(0, 1, 1.234, 90)
+        >>> journal.close(flagRemove=True)
+    """
+    def __init__(self, fp, rows, cols, initTime, 
+                 flushInterval=1.0, flushCount=20):
+        if DEBUG: print("ClickJournal.__init__()")
+
+        self.fp = fp
+        self.flushInterval = flushInterval
+        self.flushCount = flushCount
+        self.buf = bytearray() # records to write
+        self.nBuf = 0 # number of records in buffer
+        self.lock = Lock()
+        self.flushEvent = Event() # set to flush right away
+        self.flagRun = True
+        fh = open(fp + JOURNAL_LOCK_EXT, 'w')
+        fh.write(str(os.getpid()))
+        fh.close()
+        self.fh = open(fp, 'wb')
+        self.fh.write(JOURNAL_HEADER.pack(JOURNAL_MAGIC, rows, cols, 
+                                          initTime))
+        self.fh.flush()
+        self.th = Thread(target=self.run)
+        self.th.daemon = True
+        self.th.start()
+
+    #-------------------------------------------------------------------
+
+    def append(self, ri, ci, t, angle):
+        """ Add a click record to buffer.
+
+        Args:
+            ri (int): Row index of clicked tile.
+            ci (int): Column index of clicked tile.
+            t (float): Click-time.
+            angle (int): Angle of the tile after the click.
+
+        Returns:
+            None
+        """
+        if DEBUG: print("ClickJournal.append()")
+
+        with self.lock:
+            self.buf += JOURNAL_REC.pack(ri, ci, t, angle)
+            self.nBuf += 1
+            if self.nBuf >= self.flushCount: self.flushEvent.set()
+
+    #-------------------------------------------------------------------
+
+    def run(self):
+        """ Flush buffer periodically (runs in the flushing thread).
+
+        Args: None
+
+        Returns: None
+        """
+        if DEBUG: print("ClickJournal.run()")
+
+        while self.flagRun:
+            self.flushEvent.wait(self.flushInterval)
+            self.flushEvent.clear()
+            self.flush()
+
+    #-------------------------------------------------------------------
+
+    def flush(self):
+        """ Write buffered records to the file.
+
+        Args: None
+
+        Returns: None
+        """
+        with self.lock:
+            if self.nBuf == 0: return
+            data = bytes(self.buf)
+            self.buf = bytearray()
+            self.nBuf = 0
+        self.fh.write(data)
+        self.fh.flush()
+        os.fsync(self.fh.fileno())
+
+    #-------------------------------------------------------------------
+
+    def close(self, flagRemove=False):
+        """ Write remaining records and closing record, 
+        then close the file and remove the lock file.
+
+        Args:
+            flagRemove (bool, optional): Remove also the journal file;
+              when its clicks don't need recovery anymore (saved, 
+              closed properly or written in a new journal).
+
+        Returns:
+            None
+        """
+        if DEBUG: print("ClickJournal.close()")
+
+        if self.fh == None: return
+        self.flagRun = False
+        self.flushEvent.set()
+        self.th.join()
+        with self.lock:
+            self.buf += JOURNAL_REC.pack(JOURNAL_END, JOURNAL_END, 0.0, 0)
+            self.nBuf += 1
+        self.flush()
+        self.fh.close()
+        self.fh = None
+        if flagRemove: removeJournalFile(self.fp)
+        elif os.path.isfile(self.fp + JOURNAL_LOCK_EXT):
+            os.remove(self.fp + JOURNAL_LOCK_EXT)
+
+#-----------------------------------------------------------------------
+
+def readClickJournal(fp):
+    """ Read a click journal file. 
+    Incomplete record at the end (interrupted writing) is ignored.
+
+    Args:
+        fp (str): File path of the journal.
+
+    Returns:
+        jData (dict): Journal data.
+          'rows', 'cols' (int): Size of FlexTiles.
+          'initTime' (float): Starting time of the session.
+          'recs' (numpy.ndarray): Click records (JOURNAL_DTYPE).
+          'isClosed' (bool): Whether the journal was closed properly.
+
+    Raises:
+        ValueError: When the file is not a click journal.
+    """
+    if DEBUG: print("modFTSession.readClickJournal()")
+
+    fh = open(fp, 'rb')
+    data = fh.read()
+    fh.close()
+    hSz = JOURNAL_HEADER.size
+    if len(data) < hSz or data[:4] != JOURNAL_MAGIC:
+        raise ValueError("%s is not a click journal"%(fp))
+    __, rows, cols, initTime = JOURNAL_HEADER.unpack(data[:hSz])
+    n = int((len(data)-hSz) / JOURNAL_DTYPE.itemsize)
+    recs = np.frombuffer(data, dtype=JOURNAL_DTYPE, count=n, offset=hSz)
+    isClosed = False
+    if n > 0 and recs["row"][-1] == JOURNAL_END:
+        isClosed = True
+        recs = recs[:-1]
+    jData = dict(rows=rows, cols=cols, initTime=initTime, 
+                 recs=recs, isClosed=isClosed)
+    return jData
+
+#-----------------------------------------------------------------------
+
+def recoverFromJournal(fp):
+    """ Rebuild ftArr and ftSeq of a session from its click journal.
+
+    Args:
+        fp (str): File path of the journal.
+
+    Returns:
+        sess (dict): Session data.
+          'ftArr' (numpy.ndarray): Same as FlexTilesFrame.ftArr.
+          'ftSeq' (list): Same as FlexTilesFrame.ftSeq.
+          'initTime' (float): Starting time of the session.
+
+    Examples:
+        >>> sess = recoverFromJournal('output/journal_20200501120000.ftj')
+        >>> sess['ftArr'].shape
+        (8, 8, 2)
+    """
+    if DEBUG: print("modFTSession.recoverFromJournal()")
+
+    jData = readClickJournal(fp)
+    recs = jData["recs"]
+    ftArr = np.zeros((jData["rows"], jData["cols"], 2), dtype=np.uint16)
+    # resulting angle of the last click on each tile
+    ftArr[recs["row"],recs["col"],0] = recs["angle"] 
+    np.add.at(ftArr[:,:,1], (recs["row"], recs["col"]), 1)
+    ftSeq = [[int(r["row"]), int(r["col"]), float(r["time"])] for r in recs]
+    sess = dict(ftArr=ftArr, ftSeq=ftSeq, initTime=jData["initTime"])
+    return sess
+
+#-----------------------------------------------------------------------
+
+def isProcessAlive(pid):
+    """ Whether a process is running.
+
+    Args:
+        pid (int): Process ID.
+
+    Returns:
+        (bool): True if the process is running.
+    """
+    if DEBUG: print("modFTSession.isProcessAlive()")
+
+    if pid <= 0: return False
+    if os.name == 'nt':
+    # os.kill would terminate the process on Windows
+        import ctypes
+        k32 = ctypes.windll.kernel32
+        # PROCESS_QUERY_LIMITED_INFORMATION
+        h = k32.OpenProcess(0x1000, False, pid)
+        if not h: return False
+        code = ctypes.c_ulong()
+        ret = k32.GetExitCodeProcess(h, ctypes.byref(code))
+        k32.CloseHandle(h)
+        return bool(ret) and code.value == 259 # STILL_ACTIVE
+    try: os.kill(pid, 0)
+    except ProcessLookupError: return False
+    except PermissionError: return True # running as other user
+    return True
+
+#-----------------------------------------------------------------------
+
+def isJournalActive(fp):
+    """ Whether a journal is being written by a running program;
+    its lock file exists and has the ID of a running process.
+
+    Args:
+        fp (str): File path of the journal.
+
+    Returns:
+        (bool): True if the journal is active.
+    """
+    if DEBUG: print("modFTSession.isJournalActive()")
+
+    try:
+        fh = open(fp + JOURNAL_LOCK_EXT, 'r')
+        pid = int(fh.read().strip())
+        fh.close()
+    except (OSError, ValueError):
+        return False # no lock file or unreadable
+    return isProcessAlive(pid)
+
+#-----------------------------------------------------------------------
+
+def findInterruptedJournals(dirPath):
+    """ Find click journals, which were not closed properly 
+    and are not active in another running program.
+    Only the header and the last record of each file are read.
+
+    Args:
+        dirPath (str): Folder with journal_*.ftj files.
+
+    Returns:
+        fps (list): File paths of interrupted journals, 
+          most recent last.
+    """
+    if DEBUG: print("modFTSession.findInterruptedJournals()")
+
+    hSz = JOURNAL_HEADER.size
+    rSz = JOURNAL_DTYPE.itemsize
+    fps = []
+    for fp in sorted(glob(os.path.join(dirPath, "journal_*.ftj"))):
+        try:
+            fh = open(fp, 'rb')
+            header = fh.read(hSz)
+            n = int((os.fstat(fh.fileno()).st_size-hSz) / rSz)
+            lastRec = b""
+            if n > 0:
+                fh.seek(hSz + (n-1)*rSz)
+                lastRec = fh.read(rSz)
+            fh.close()
+        except OSError:
+            continue
+        if len(header) < hSz or header[:4] != JOURNAL_MAGIC: continue
+        if lastRec != b"" and \
+          JOURNAL_REC.unpack(lastRec)[0] == JOURNAL_END: continue # closed
+        if isJournalActive(fp): continue
+        fps.append(fp)
+    return fps
+
+#-----------------------------------------------------------------------
+
+def removeJournalFile(fp):
+    """ Remove a journal file and its lock file.
+
+    Args:
+        fp (str): File path of the journal.
+
+    Returns:
+        None
+    """
+    if DEBUG: print("modFTSession.removeJournalFile()")
+
+    for _fp in [fp, fp + JOURNAL_LOCK_EXT]:
+        if os.path.isfile(_fp): os.remove(_fp)
+
+#-----------------------------------------------------------------------
+
+if __name__ == '__main__':
+    pass
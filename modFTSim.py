@@ -0,0 +1,357 @@
+# coding: UTF-8
+"""
+Headless simulation of FlexTiles sessions.
+Many boards are held in one array with the same layout as
+FlexTilesFrame.ftArr (boards x rows x columns x [angle, clicks]).
+A click policy (synthetic participant) chooses one tile of every board
+in each step, and the clicks are applied to all boards at once.
+Click sequences are logged in the same form as FlexTilesFrame.ftSeq,
+so simulated sessions can be written as session CSV files or
+appended to a modFTCorpus.CorpusStore.
+
+Dependency:
+    Numpy (1.17),
+
+------------------------------------------------------------------------
+Copyright (C) 2020 Jinook Oh & Tecumseh Fitch
+- Contact: jinook0707@gmail.com, tecumseh.fitch@univie.ac.at
+
+This program is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by the
+Free Software Foundation, either version 3 of the License, or (at your
+option) any later version.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program.  If not, see <http://www.gnu.org/licenses/>.
+------------------------------------------------------------------------
+"""
+
+from os import path
+
+import numpy as np
+
+import modFTAnalysis as ftA
+from modFTSession import SEQ_DTYPE, writeSessionCSV
+
+DEBUG = False
+# offsets to 8 neighbouring tiles (row, column)
+NEIGHBOURS = np.array([(-1,-1), (-1,0), (-1,1), (0,-1), (0,1),
+                       (1,-1), (1,0), (1,1)], dtype=np.int64)
+# (angle + angle of mirrored partner) % 360 of matching tiles;
+#   key is axis (see modFTAnalysis.invertByAxisArr)
+MIRROR_SUMS = {0:90, 1:180, 2:270, 3:0}
+
+#-----------------------------------------------------------------------
+
+def randomPolicy(sim):
+    """ Click a random tile on every board.
+
+    Args:
+        sim (BoardSim): Simulator.
+
+    Returns:
+        (numpy.ndarray): Flat tile indices (row*columns + column)
+          of clicked tiles; one per board.
+    """
+    return sim.rng.integers(0, sim.rows*sim.cols, sim.nBoards)
+
+#-----------------------------------------------------------------------
+
+def neighbourPolicy(sim, pNeighbour=0.8):
+    """ Click a neighbour (8-connected) of the last clicked tile with
+    probability pNeighbour, otherwise a random tile.
+    Neighbours outside of the board are reflected back into it.
+
+    Args:
+        sim (BoardSim): Simulator.
+        pNeighbour (float): Probability to click a neighbour.
+
+    Returns:
+        (numpy.ndarray): Flat tile indices of clicked tiles.
+    """
+    fi = randomPolicy(sim)
+    if sim.nSteps == 0: return fi
+    off = NEIGHBOURS[sim.rng.integers(0, len(NEIGHBOURS), sim.nBoards)]
+    lastR, lastC = np.divmod(sim.lastClick, sim.cols)
+    nr = lastR + off[:,0]
+    out = (nr < 0) | (nr >= sim.rows)
+    nr[out] = lastR[out] - off[out,0]
+    nc = lastC + off[:,1]
+    out = (nc < 0) | (nc >= sim.cols)
+    nc[out] = lastC[out] - off[out,1]
+    flag = sim.rng.random(sim.nBoards) < pNeighbour
+    fi[flag] = (nr*sim.cols + nc)[flag]
+    return fi
+
+#-----------------------------------------------------------------------
+
+def mirrorArr(a, axis):
+    """ Mirrored view of boards; each tile is moved to the position of
+    its mirrored partner (values are not inverted).
+
+    Args:
+        a (numpy.ndarray): Array of values (rows x columns),
+          or a stack of them (n x rows x columns).
+        axis (int): Axis of symmetry, same definition as in
+          modFTAnalysis.invertByAxis; 2: horizontal, 0: vertical,
+          1: 1st diagonal, 3: 2nd diagonal (square boards only).
+
+    Returns:
+        (numpy.ndarray): View of a.
+    """
+    if axis == 2: return a[...,::-1,:]
+    elif axis == 0: return a[...,:,::-1]
+    elif axis == 1: return np.swapaxes(a[...,::-1,::-1], -1, -2)
+    else: return np.swapaxes(a, -1, -2)
+
+#-----------------------------------------------------------------------
+
+def symmetryPolicy(sim, axis=2, pSeek=0.9):
+    """ Symmetry-seeking clicker. With probability pSeek, click a random
+    tile which doesn't match its mirrored partner (mirrored at the axis,
+    angle inverted as in modFTAnalysis.getSymmetryValuesArr),
+    otherwise (or if the board is already symmetric) a random tile.
+    Tiles on the axis are not chosen, because they can't match
+    themselves.
+
+    Args:
+        sim (BoardSim): Simulator.
+        axis (int): Axis of symmetry (see mirrorArr).
+        pSeek (float): Probability to click a mismatched tile.
+
+    Returns:
+        (numpy.ndarray): Flat tile indices of clicked tiles.
+    """
+    fi = randomPolicy(sim)
+    ### a tile matches its partner, when the partner's angle is
+    ###   invertByAxis(angle), that is (angle + partner's angle) % 360
+    ###   is a constant of the axis; sums are compared without modulo
+    c = MIRROR_SUMS[axis%4]
+    a = sim.ftArr[:,:,:,0]
+    s = a + mirrorArr(a, axis)
+    mismatch = (s != c) & (s != c+360)
+    idx = np.arange(sim.rows*sim.cols).reshape(sim.rows, sim.cols)
+    mismatch[:, mirrorArr(idx, axis) == idx] = False # tiles on the axis
+    score = mismatch.reshape(sim.nBoards, -1) * \
+            sim.rng.random((sim.nBoards, sim.rows*sim.cols), dtype=np.float32)
+    seekIdx = np.argmax(score, axis=1)
+    flag = (score[np.arange(sim.nBoards), seekIdx] > 0) & \
+           (sim.rng.random(sim.nBoards) < pSeek)
+    fi[flag] = seekIdx[flag]
+    return fi
+
+#-----------------------------------------------------------------------
+
+POLICIES = dict(random=randomPolicy, neighbour=neighbourPolicy,
+                symmetry=symmetryPolicy)
+
+#=======================================================================
+
+class BoardSim:
+    """ Simulator of many FlexTiles boards.
+
+    Args:
+        nBoards (int): Number of boards.
+        rows (int): Number of rows.
+        cols (int): Number of columns.
+        seed (None/ int): Seed of the random number generator.
+        meanInterval (float): Mean interval between clicks (seconds).
+          Intervals are exponentially distributed after
+          minInterval.
+        minInterval (float): Minimum interval between clicks (seconds).
+
+    Attributes:
+        ftArr (numpy.ndarray): Boards (boards x rows x columns x 2);
+          angle and number of clicks of each tile, as in
+          FlexTilesFrame.ftArr.
+        nSteps (int): Number of clicks on each board.
+        seqIdx (numpy.ndarray): Flat tile index of clicks
+          (steps x boards).
+        seqTime (numpy.ndarray): Click-times (steps x boards).
+
+    Examples:
+        >>> sim = BoardSim(10000, 8, 8, seed=1)
+        >>> sim.run(100, 'neighbour', pNeighbour=0.7)
+        >>> ftArr, ftSeq = sim.getSession(0)
+    """
+    def __init__(self, nBoards, rows=8, cols=8, seed=None,
+                 meanInterval=1.0, minInterval=0.2):
+        if DEBUG: print("BoardSim.__init__()")
+
+        self.nBoards = nBoards
+        self.rows = rows
+        self.cols = cols
+        self.rng = np.random.default_rng(seed)
+        self.meanInterval = meanInterval
+        self.minInterval = minInterval
+        self.ftArr = np.zeros((nBoards, rows, cols, 2), dtype=np.uint16)
+        # flat view; [board*rows*cols + tile index, angle/clicks]
+        self.ftFlat = self.ftArr.reshape(-1, 2)
+        self.boardOffset = np.arange(nBoards, dtype=np.int64) * (rows*cols)
+        self.nSteps = 0
+        self.lastClick = np.zeros(nBoards, dtype=np.int64)
+        self.clickTime = np.zeros(nBoards, dtype=np.float64)
+        self.seqIdx = np.zeros((0, nBoards), dtype=np.uint16)
+        self.seqTime = np.zeros((0, nBoards), dtype=np.float64)
+
+    #-------------------------------------------------------------------
+
+    def reserve(self, nSteps):
+        """ Make room for more steps in the click logs.
+
+        Args:
+            nSteps (int): Number of steps to be added.
+
+        Returns:
+            None
+        """
+        if DEBUG: print("BoardSim.reserve()")
+
+        need = self.nSteps + nSteps
+        if need <= len(self.seqIdx): return
+        cap = max(need, 2*len(self.seqIdx))
+        seqIdx = np.zeros((cap, self.nBoards), dtype=np.uint16)
+        seqTime = np.zeros((cap, self.nBoards), dtype=np.float64)
+        seqIdx[:self.nSteps] = self.seqIdx[:self.nSteps]
+        seqTime[:self.nSteps] = self.seqTime[:self.nSteps]
+        self.seqIdx = seqIdx
+        self.seqTime = seqTime
+
+    #-------------------------------------------------------------------
+
+    def click(self, fi):
+        """ Click one tile of every board.
+
+        Args:
+            fi (numpy.ndarray): Flat tile indices (row*columns + column),
+              one per board.
+
+        Returns:
+            None
+        """
+        self.reserve(1)
+        self.clickTime += self.minInterval + self.rng.exponential(
+                        self.meanInterval-self.minInterval, self.nBoards)
+        idx = self.boardOffset + fi
+        self.ftFlat[idx,0] = (self.ftFlat[idx,0] + 90) % 360
+        self.ftFlat[idx,1] += 1
+        self.seqIdx[self.nSteps] = fi
+        self.seqTime[self.nSteps] = self.clickTime
+        self.lastClick = fi
+        self.nSteps += 1
+
+    #-------------------------------------------------------------------
+
+    def run(self, nClicks, policy="random", **kwargs):
+        """ Simulate clicks on all boards.
+
+        Args:
+            nClicks (int): Number of clicks on each board.
+            policy (str/ function): Name of policy in POLICIES or
+              a function, which receives this simulator (and kwargs)
+              and returns flat tile indices.
+            **kwargs: Parameters of the policy.
+
+        Returns:
+            None
+        """
+        if DEBUG: print("BoardSim.run()")
+
+        if isinstance(policy, str): policy = POLICIES[policy]
+        self.reserve(nClicks)
+        for i in range(nClicks):
+            self.click(policy(self, **kwargs))
+
+    #-------------------------------------------------------------------
+
+    def getSeqArr(self, b):
+        """ Click sequence of a board.
+
+        Args:
+            b (int): Index of the board.
+
+        Returns:
+            seq (numpy.ndarray): Click sequence (SEQ_DTYPE).
+        """
+        seq = np.zeros(self.nSteps, dtype=SEQ_DTYPE)
+        seq["seq"] = np.arange(1, self.nSteps+1)
+        seq["row"], seq["col"] = np.divmod(self.seqIdx[:self.nSteps,b],
+                                           self.cols)
+        seq["time"] = self.seqTime[:self.nSteps,b]
+        return seq
+
+    #-------------------------------------------------------------------
+
+    def getSession(self, b):
+        """ Session data of a board, in the same form as
+        FlexTilesFrame.ftArr and FlexTilesFrame.ftSeq.
+
+        Args:
+            b (int): Index of the board.
+
+        Returns:
+            ftArr (numpy.ndarray): rows x columns x 2 (uint16).
+            ftSeq (list): Click sequence; [row, column, click-time].
+        """
+        if DEBUG: print("BoardSim.getSession()")
+
+        r, c = np.divmod(self.seqIdx[:self.nSteps,b].astype(int), self.cols)
+        ftSeq = [[ri, ci, t] for ri, ci, t in zip(r.tolist(), c.tolist(),
+                                        self.seqTime[:self.nSteps,b].tolist())]
+        return self.ftArr[b].copy(), ftSeq
+
+    #-------------------------------------------------------------------
+
+    def writeSessions(self, dirPath, prefix="ft_sim", boards=None):
+        """ Write session CSV files of boards (as onSave writes them).
+
+        Args:
+            dirPath (str): Folder to write files in.
+            prefix (str): Prefix of file names; [prefix]_[board index].csv
+              It should start with 'ft_' for modFTBatch and modFTIndex,
+              which read ft_*.csv files.
+            boards (None/ list): Indices of boards. None means all.
+
+        Returns:
+            fps (list): File paths of written files.
+        """
+        if DEBUG: print("BoardSim.writeSessions()")
+
+        if boards == None: boards = range(self.nBoards)
+        fps = []
+        for b in boards:
+            ftArr, ftSeq = self.getSession(b)
+            aRslt = ftA.getFinalStateAnalysis(ftArr[:,:,0])
+            fp = path.join(dirPath, "%s_%i.csv"%(prefix, b))
+            writeSessionCSV(fp, ftArr, ftSeq, aRslt)
+            fps.append(fp)
+        return fps
+
+    #-------------------------------------------------------------------
+
+    def appendToStore(self, store, labelPrefix="ft_sim"):
+        """ Append final states and click sequences of all boards to
+        a corpus store.
+
+        Args:
+            store (modFTCorpus.CorpusStore): Store opened with mode 'a'.
+            labelPrefix (str): Prefix of labels; [prefix]_[board index]
+
+        Returns:
+            None
+        """
+        if DEBUG: print("BoardSim.appendToStore()")
+
+        seqs = [self.getSeqArr(b) for b in range(self.nBoards)]
+        labels = ["%s_%i"%(labelPrefix, b) for b in range(self.nBoards)]
+        store.append(self.ftArr[:,:,:,0], seqs, labels)
+
+#=======================================================================
+
+if __name__ == '__main__':
+    pass